@@ -9,7 +9,13 @@ from flask_cors import CORS
 import sqlite3
 import os
 from pathlib import Path
-from .db_utils import close_db, get_db
+from .db_utils import close_db, get_db, get_pool
+from .migrations import apply_migrations
+from .cache import get_catalog_cache, get_cache_coherency, init_cache_epoch
+from .housekeeping import start_session_sweeper
+from .sql_profiler import get_sql_profiler, init_sql_profiler
+from .metrics import init_metrics
+from .slow_query_log import init_slow_query_log
 
 def create_app(test_config=None):
     """Application factory function."""
@@ -19,14 +25,55 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY='dev', 
         DATABASE=Path(app.root_path) / 'db' / 'fitness.db',
+        DB_POOL_SIZE=16,       # max connections checked out at once
+        DB_POOL_TIMEOUT=10.0,  # seconds to wait for a free connection
+        DB_PRAGMAS={},         # per-connection PRAGMA overrides, e.g. {"busy_timeout": 1000}
+        CATALOG_CACHE_SIZE=512,  # cached catalog responses (0 disables)
+        CATALOG_CACHE_TTL=30.0,  # seconds before a cached response expires
+        CATALOG_CACHE_CONTROL="public, no-cache",  # browsers/CDNs revalidate via ETag
+        IDEMPOTENCY_KEY_TTL_HOURS=24,  # how long POST /api/orders replays are kept
+        SESSION_CACHE_SIZE=4096,  # validated sessions kept in memory per worker
+        SESSION_CACHE_TTL=30.0,   # seconds before a cached session is re-checked
+        AUTH_TOKEN_MODE="session",     # "session" (DB-backed) or "signed" (stateless HMAC)
+        SIGNED_TOKEN_TTL_MINUTES=60,   # lifetime of signed tokens
+        SIGNED_TOKEN_CHECK_TTL=5.0,    # seconds a user's token_version/status is cached for signed tokens
+        SESSION_SWEEP_INTERVAL=300,    # seconds between expired-session sweeps when serving (0 disables)
+        SESSION_SWEEP_BATCH_SIZE=500,  # sessions deleted per sweeper transaction
+        PASSWORD_HASH_WORKERS=2,       # hashing processes (0 hashes on the request thread)
+        PASSWORD_HASH_MAX_PENDING=8,   # queued + running hashes before returning 503
+        PASSWORD_HASH_TIMEOUT=10.0,    # seconds a request waits for its hash
+        LOGIN_RATE_PER_EMAIL=(5, 1 / 12),  # failed-login token bucket: burst, refill per second
+        LOGIN_RATE_PER_IP=(30, 1.0),       # shared by everyone behind one NAT/proxy address
+        SQL_PROFILING=False,           # record every statement per request (see sql_profiler.py)
+        SQL_PROFILING_HEADERS=False,   # X-SQL-* response headers even outside debug mode
+        SQL_PROFILING_N_PLUS_ONE=5,    # repeats of one statement shape flagged as N+1
+        METRICS_ENABLED=True,          # per-route latency/status metrics at /metrics
+        METRICS_DB_TIME=False,         # per-route DB time via sql_profiler's proxy (costs every query)
+        METRICS_DIR=None,              # shared dir to merge metrics across worker processes
+        SLOW_QUERY_THRESHOLD_MS=None,  # log statements at least this slow (None disables)
+        SLOW_QUERY_LOG=None,           # default: backend/logs/slow_queries.log (rotating)
+        WRITE_QUEUE_ENABLED=False,     # funnel small writes through one writer thread (write_queue.py)
+        WRITE_QUEUE_MAX_BATCH=64,      # write units group-committed per transaction
+        WRITE_QUEUE_TIMEOUT=10.0,      # seconds a request waits for its unit to commit
+        SESSION_BATCHING=False,        # group-commit login session inserts (write_queue.py)
+        SESSION_BATCH_LINGER_MS=3.0,   # max wait after a login for others to share its commit
+        SESSION_BATCH_MAX=256,         # session inserts per commit
+        SESSION_BATCH_SYNCHRONOUS="FULL",  # session commits are fsynced before logins return
     )
     
     if test_config:
         app.config.from_mapping(test_config)
+
+    if app.config["AUTH_TOKEN_MODE"] == "signed" and app.config["SECRET_KEY"] == "dev":
+        # Anyone could forge tokens signed with the default key.
+        raise RuntimeError("AUTH_TOKEN_MODE='signed' requires a real SECRET_KEY")
         
     # 2. CORS and Context Setup
     CORS(app) 
-    app.teardown_appcontext(close_db) # CRITICAL: Close DB connection after each request
+    app.teardown_appcontext(close_db) # CRITICAL: Return DB connection to the pool after each request
+    init_sql_profiler(app)
+    init_metrics(app)
+    init_slow_query_log(app)
 
     # 2b. Initialize database schema on first run
     def init_db():
@@ -43,6 +90,9 @@ def create_app(test_config=None):
     
     with app.app_context():
         init_db()
+        # Upgrade existing databases in place (indexes, derived tables, ...)
+        applied = apply_migrations(get_db())
+        init_cache_epoch(get_db(), renew=bool(applied))
 
     # 3. Import and Register Blueprints (Routes)
     # 3. Import and Register Blueprints (Routes)
@@ -56,6 +106,7 @@ def create_app(test_config=None):
         (".routes.products", "products_bp"),
         (".routes.wishlist", "wishlist_bp"),
         (".routes.vendor_dashboard", "vendor_bp"),
+        (".routes.vendor_analytics", "vendor_analytics_bp"),  # needs numpy
     ]
 
     for module_path, bp_name in route_modules:
@@ -85,7 +136,28 @@ def create_app(test_config=None):
             conn = get_db()
             row = conn.execute("SELECT COUNT(*) AS count FROM products").fetchone()
             count = row["count"] if row is not None else 0
-            return jsonify({"status": "ok", "product_count": count}), 200
+            return jsonify({
+                "status": "ok",
+                "product_count": count,
+                "db_pool": get_pool().stats(),
+                "catalog_cache": get_catalog_cache().stats(),
+                "cache_coherency": get_cache_coherency().stats(),
+                "sql_profiler": (
+                    get_sql_profiler().stats() if app.config["SQL_PROFILING"] else None
+                ),
+                "session_sweeper": (
+                    app.extensions["session_sweeper"].stats()
+                    if "session_sweeper" in app.extensions else None
+                ),
+                "write_queue": (
+                    app.extensions["write_queue"].stats()
+                    if "write_queue" in app.extensions else None
+                ),
+                "session_queue": (
+                    app.extensions["session_queue"].stats()
+                    if "session_queue" in app.extensions else None
+                ),
+            }), 200
         except Exception as e:
             return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -110,6 +182,10 @@ def create_app(test_config=None):
 
 if __name__ == "__main__":
     app = create_app()
+    # Purge expired sessions in the background, only in the process that
+    # serves (not the reloader's file watcher, tests or benchmarks)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_session_sweeper(app)
     app.run(debug=True)
     
 
@@ -0,0 +1,6 @@
+"""
+benchmarks
+----------
+Endpoint benchmarks over the Flask test client, against datasets generated by
+datagen.py. Run with `python -m backend.benchmarks --help`.
+"""
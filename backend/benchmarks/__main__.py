@@ -0,0 +1,5 @@
+import sys
+
+from .endpoints import main
+
+sys.exit(main())
@@ -0,0 +1,487 @@
+"""
+contention.py
+-------------
+Concurrent write load against a real database file, to tune WAL and busy
+handling with numbers instead of guesses.
+
+Worker processes (each with its own create_app() and connection pool) run
+several threads apiece. Every thread logs in as its own customer and, until
+the deadline, picks operations from a weighted mix:
+
+    checkout  POST /api/orders                  (BEGIN IMMEDIATE, stock decrement)
+    stock     PUT  /api/vendor/products/<id>    (vendor stock edit)
+    review    POST /api/products/<id>/reviews
+    wishlist  POST/DELETE /api/wishlist/<id>    (toggle)
+
+Per operation we report throughput, latency, `database is locked` errors,
+lock wait (time in the statement that takes the write lock: BEGIN IMMEDIATE
+or the first INSERT/UPDATE/DELETE of the request, where SQLite's busy
+handler sleeps) and commit latency. With --write-queue, writes routed through
+the queue wait and commit on its writer thread, so for those operations
+that time shows up in latency only. Afterwards the database is checked for
+correctness: no negative stock, stock conserved across checkouts, one order
+and one review per success, trigger-maintained rollups matching a recount,
+wishlists matching what the clients saw, and PRAGMA quick_check.
+
+    python -m backend.benchmarks.contention --processes 2 --threads 4 --duration 10
+    python -m backend.benchmarks.contention --busy-timeout 100 --synchronous FULL
+    python -m backend.benchmarks.contention --write-queue
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from flask import g
+
+from ..app import create_app
+from ..db_utils import get_pool
+from ..write_queue import get_write_queue
+from .endpoints import PASSWORD, prepare_dataset
+
+DEFAULT_MIX = {"checkout": 4, "stock": 2, "review": 2, "wishlist": 2}
+VENDOR_ID = 2  # get_current_vendor() stub
+WISHLIST_POOL = 20  # products each thread toggles
+
+_WRITE_PREFIXES = ("BEGIN IMMEDIATE", "BEGIN EXCLUSIVE", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _is_locked(text) -> bool:
+    text = str(text).lower()
+    return "database is locked" in text or "database is busy" in text
+
+
+def _lock_timing(response):
+    """after_request hook: expose lock wait and commit time of this request as headers."""
+    profile = g.get("sql_profile")
+    if profile is None:
+        return response
+    lock_wait = 0.0
+    for record in profile.statements:
+        if record.sql.lstrip().upper().startswith(_WRITE_PREFIXES):
+            lock_wait = record.duration
+            break
+    response.headers["X-Lock-Wait-ms"] = f"{lock_wait * 1000:.3f}"
+    response.headers["X-Commit-ms"] = f"{profile.commit_time * 1000:.3f}"
+    return response
+
+
+class Workload:
+    """Product ids each operation draws from, fixed before the run starts."""
+
+    def __init__(self, conn):
+        self.vendor_products = [r[0] for r in conn.execute(
+            "SELECT id FROM products WHERE vendor_id = ? AND is_active = 1 ORDER BY id LIMIT 200", (VENDOR_ID,)
+        )]
+        # Checkouts avoid the vendor's products so their stock is only ever
+        # changed by orders, which makes conservation checkable afterwards.
+        self.checkout_products = [r[0] for r in conn.execute(
+            "SELECT id FROM products WHERE vendor_id != ? AND is_active = 1 AND stock > 0 ORDER BY id LIMIT 200",
+            (VENDOR_ID,),
+        )]
+        self.review_products = [r[0] for r in conn.execute(
+            "SELECT id FROM products WHERE is_active = 1 ORDER BY id LIMIT 500"
+        )]
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        workload = cls.__new__(cls)
+        workload.__dict__.update(data)
+        return workload
+
+
+class ClientThread(threading.Thread):
+    """One simulated user sending a weighted mix of writes until the deadline."""
+
+    def __init__(self, app, index, workload, mix, seed, barrier, duration):
+        super().__init__(daemon=True)
+        self.app = app
+        self.duration = duration
+        self.index = index
+        self.workload = workload
+        self.ops, self.weights = zip(*mix.items())
+        self.rng = random.Random(seed * 1000 + index)
+        self.barrier = barrier
+        self.deadline = None
+        self.email = f"customer{index + 1}@example.com"
+        self.token = None
+        self.user_id = None
+        self.wishlist = set()  # harness users start with an empty wishlist
+        self.wishlist_pool = self.rng.sample(workload.review_products,
+                                             min(WISHLIST_POOL, len(workload.review_products)))
+        self.records = []  # (op, outcome, latency, lock_wait, commit)
+        self.ordered = {}  # product_id -> units in successful checkouts
+        self.error = None
+
+    def _request(self, client, op):
+        rng, w = self.rng, self.workload
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if op == "checkout":
+            items = [{"product_id": pid, "quantity": rng.randint(1, 3)}
+                     for pid in rng.sample(w.checkout_products, rng.randint(1, 2))]
+            return client.post("/api/orders", json={"items": items}), items
+        if op == "stock":
+            return client.put(f"/api/vendor/products/{rng.choice(w.vendor_products)}",
+                              json={"stock": rng.randint(0, 100)}), None
+        if op == "review":
+            return client.post(f"/api/products/{rng.choice(w.review_products)}/reviews",
+                               json={"rating": rng.randint(1, 5), "comment": "load test"},
+                               headers=headers), None
+        product_id = rng.choice(self.wishlist_pool)
+        if product_id in self.wishlist:
+            return client.delete(f"/api/wishlist/{product_id}", headers=headers), ("remove", product_id)
+        return client.post(f"/api/wishlist/{product_id}", headers=headers), ("add", product_id)
+
+    def run(self):
+        try:
+            with self.app.test_client() as client:
+                response = client.post("/api/login", json={"email": self.email, "password": PASSWORD})
+                response_json = response.get_json() or {}
+                if response.status_code != 200:
+                    raise RuntimeError(f"login failed for {self.email}: {response_json}")
+                self.token = response_json["token"]
+                self.user_id = response_json["user"]["id"]
+                self.barrier.wait()
+                self.deadline = time.monotonic() + self.duration
+                while time.monotonic() < self.deadline:
+                    self._step(client, self.rng.choices(self.ops, self.weights)[0])
+        except Exception as e:  # reported by the parent instead of dying silently
+            self.error = repr(e)
+            self.barrier.abort()
+
+    def _step(self, client, op):
+        started = time.perf_counter()
+        try:
+            response, detail = self._request(client, op)
+        except sqlite3.Error as e:  # unhandled in the route; TESTING re-raises it
+            outcome = "locked" if _is_locked(e) else "error"
+            self.records.append((op, outcome, time.perf_counter() - started, 0.0, 0.0))
+            return
+        latency = time.perf_counter() - started
+
+        status = response.status_code
+        if status < 300:
+            outcome = "ok"
+            if op == "checkout":
+                for item in detail:
+                    self.ordered[item["product_id"]] = self.ordered.get(item["product_id"], 0) + item["quantity"]
+            elif op == "wishlist":
+                action, product_id = detail
+                (self.wishlist.add if action == "add" else self.wishlist.discard)(product_id)
+        elif status in (400, 409) and "Insufficient stock" in response.get_data(as_text=True):
+            outcome = "rejected"  # sold out: correct behaviour, not a failure
+        elif _is_locked(response.get_data(as_text=True)):
+            outcome = "locked"
+        else:
+            outcome = "error"
+        self.records.append((
+            op, outcome, latency,
+            float(response.headers.get("X-Lock-Wait-ms", 0)) / 1000,
+            float(response.headers.get("X-Commit-ms", 0)) / 1000,
+        ))
+
+    def result(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "records": self.records,
+            "ordered": self.ordered,
+            "wishlist": sorted(self.wishlist),
+            "error": self.error,
+        }
+
+
+def _worker(db_path, config, workload, mix, seed, duration, first_index, threads, barrier, results):
+    """Process entry point: one app, `threads` clients, results put on a queue."""
+    app = create_app({**config, "DATABASE": Path(db_path)})
+    app.after_request(_lock_timing)
+    workload = Workload.from_dict(workload)
+    clients = [ClientThread(app, first_index + i, workload, mix, seed, barrier, duration)
+               for i in range(threads)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    write_queue = get_write_queue(app)
+    if write_queue is not None:
+        write_queue.close()
+    get_pool(app).close()
+    results.put([client.result() for client in clients])
+
+
+def app_config(busy_timeout=None, synchronous=None, journal_mode=None, pool_size=None,
+               write_queue=False) -> dict:
+    pragmas = {}
+    if busy_timeout is not None:
+        pragmas["busy_timeout"] = busy_timeout
+    if synchronous:
+        pragmas["synchronous"] = synchronous
+    if journal_mode:
+        pragmas["journal_mode"] = journal_mode
+    config = {
+        "TESTING": True,
+        "SQL_PROFILING": True,  # per-statement timings for _lock_timing
+        "METRICS_ENABLED": False,
+        "CATALOG_CACHE_SIZE": 0,
+        "PASSWORD_HASH_WORKERS": 0,
+        "LOGIN_RATE_PER_EMAIL": (10**9, 10**9),
+        "LOGIN_RATE_PER_IP": (10**9, 10**9),
+        "DB_PRAGMAS": pragmas,
+        "WRITE_QUEUE_ENABLED": write_queue,
+    }
+    if pool_size:
+        config["DB_POOL_SIZE"] = pool_size
+    return config
+
+
+def _percentiles(values) -> dict:
+    if not len(values):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(values * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "max_ms": round(float(values.max() * 1000), 3)}
+
+
+def summarize(clients, duration) -> dict:
+    by_op = {}
+    for client in clients:
+        for op, outcome, latency, lock_wait, commit in client["records"]:
+            by_op.setdefault(op, []).append((outcome, latency, lock_wait, commit))
+
+    ops = {}
+    for op, rows in sorted(by_op.items()):
+        outcomes = [r[0] for r in rows]
+        latency = np.array([r[1] for r in rows])
+        lock_wait = np.array([r[2] for r in rows])
+        commits = np.array([r[3] for r in rows if r[0] == "ok"])
+        ops[op] = {
+            "requests": len(rows),
+            **{name: outcomes.count(name) for name in ("ok", "rejected", "locked", "error")},
+            "throughput_rps": round(len(rows) / duration, 1),
+            "latency": _percentiles(latency),
+            "lock_wait": {**_percentiles(lock_wait), "total_s": round(float(lock_wait.sum()), 3)},
+            "commit": _percentiles(commits),
+        }
+    total = sum(op["requests"] for op in ops.values())
+    return {
+        "requests": total,
+        "throughput_rps": round(total / duration, 1),
+        "locked_errors": sum(op["locked"] for op in ops.values()),
+        "other_errors": sum(op["error"] for op in ops.values()),
+        "ops": ops,
+    }
+
+
+def snapshot(conn, workload) -> dict:
+    """State the invariants are checked against; taken before the run."""
+    placeholders = ",".join("?" for _ in workload.checkout_products)
+    return {
+        "max_order_id": conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0],
+        "max_review_id": conn.execute("SELECT COALESCE(MAX(id), 0) FROM reviews").fetchone()[0],
+        "stock": dict(conn.execute(
+            f"SELECT id, stock FROM products WHERE id IN ({placeholders})", workload.checkout_products
+        ).fetchall()),
+    }
+
+
+def check_invariants(conn, before, clients, summary) -> dict:
+    """Name -> None when the invariant holds, or a description of the violation."""
+    checks = {}
+    negative = conn.execute("SELECT COUNT(*) FROM products WHERE stock < 0").fetchone()[0]
+    checks["no_negative_stock"] = f"{negative} products below zero" if negative else None
+
+    ordered = {}
+    for client in clients:
+        for pid, qty in client["ordered"].items():
+            ordered[int(pid)] = ordered.get(int(pid), 0) + qty
+    mismatched = [
+        pid for pid, stock in before["stock"].items()
+        if conn.execute("SELECT stock FROM products WHERE id = ?", (pid,)).fetchone()[0]
+        != stock - ordered.get(pid, 0)
+    ]
+    checks["stock_conserved"] = f"products {mismatched[:10]}" if mismatched else None
+
+    new_orders, bad_totals = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(abs(o.total_amount - (
+            SELECT COALESCE(SUM(quantity * price_at_purchase), 0)
+            FROM order_items WHERE order_id = o.id)) > 0.01), 0)
+        FROM orders o WHERE o.id > ?
+    """, (before["max_order_id"],)).fetchone()
+    checkouts = summary["ops"].get("checkout", {}).get("ok", 0)
+    checks["one_order_per_checkout"] = (
+        None if new_orders == checkouts else f"{new_orders} orders for {checkouts} successful checkouts"
+    )
+    checks["order_totals"] = f"{bad_totals} orders" if bad_totals else None
+
+    new_reviews = conn.execute("SELECT COUNT(*) FROM reviews WHERE id > ?", (before["max_review_id"],)).fetchone()[0]
+    reviews = summary["ops"].get("review", {}).get("ok", 0)
+    checks["one_review_per_success"] = (
+        None if new_reviews == reviews else f"{new_reviews} reviews for {reviews} successes"
+    )
+    drift = conn.execute("""
+        SELECT COUNT(*) FROM product_stats ps
+        WHERE ps.review_count != (SELECT COUNT(*) FROM reviews r WHERE r.product_id = ps.product_id)
+           OR ps.on_order_qty != (
+                SELECT COALESCE(SUM(oi.quantity), 0) FROM order_items oi JOIN orders o ON o.id = oi.order_id
+                WHERE oi.product_id = ps.product_id AND o.status IN ('placed', 'processing', 'shipped'))
+    """).fetchone()[0]
+    checks["product_stats_consistent"] = f"{drift} products drifted" if drift else None
+    vendor = conn.execute("""
+        SELECT vs.total_products = COUNT(p.id),
+               vs.low_stock_count = COALESCE(SUM(COALESCE(p.stock, 0) <= COALESCE(p.low_stock_threshold, 0)
+                                                AND p.low_stock_threshold > 0), 0)
+        FROM vendor_stats vs LEFT JOIN products p ON p.vendor_id = vs.vendor_id
+        WHERE vs.vendor_id = ?
+    """, (VENDOR_ID,)).fetchone()
+    checks["vendor_stats_consistent"] = None if vendor is None or all(vendor) else "vendor_stats drifted"
+
+    wrong = [
+        client["user_id"] for client in clients
+        if sorted(r[0] for r in conn.execute(
+            "SELECT product_id FROM wishlist WHERE user_id = ?", (client["user_id"],)
+        )) != sorted(client["wishlist"])
+    ]
+    checks["wishlists_match_clients"] = f"users {wrong[:10]}" if wrong else None
+
+    quick = conn.execute("PRAGMA quick_check").fetchone()[0]
+    checks["quick_check"] = None if quick == "ok" else quick
+    return checks
+
+
+def run_contention(db_path, processes=2, threads=4, duration=5.0, mix=None, seed=0, **settings) -> dict:
+    """Run the mixed workload on `db_path` (modified in place); returns summary + invariants."""
+    mix = mix or DEFAULT_MIX
+    conn = sqlite3.connect(db_path)
+    workload = Workload(conn)
+    before = snapshot(conn, workload)
+    total_threads = processes * threads
+    users = [r[0] for r in conn.execute(
+        "SELECT id FROM users WHERE email IN ({})".format(",".join("?" * total_threads)),
+        [f"customer{i + 1}@example.com" for i in range(total_threads)],
+    )]
+    if len(users) < total_threads:
+        raise ValueError(f"dataset has fewer than {total_threads} customers; use a larger --scale")
+    conn.execute("DELETE FROM wishlist WHERE user_id IN ({})".format(",".join("?" * len(users))), users)
+    conn.commit()
+    conn.close()
+
+    # Migrations, WAL switch and the like happen once here, not in every worker
+    config = app_config(**settings)
+    get_pool(create_app({**config, "DATABASE": db_path})).close()
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(total_threads)
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(str(db_path), config, workload.to_dict(), mix, seed, duration,
+                                          p * threads, threads, barrier, results))
+        for p in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    clients = []
+    pending = len(workers)
+    while pending:
+        try:
+            clients.extend(results.get(timeout=1.0))
+            pending -= 1
+        except queue.Empty:
+            if any(worker.exitcode not in (None, 0) for worker in workers):
+                for worker in workers:
+                    worker.terminate()
+                raise RuntimeError("a load worker exited early; see its traceback above")
+    for worker in workers:
+        worker.join()
+
+    errors = [c["error"] for c in clients if c["error"]]
+    if errors:
+        raise RuntimeError(f"client threads failed: {errors[:3]}")
+
+    summary = summarize(clients, duration)
+    conn = sqlite3.connect(db_path)
+    invariants = check_invariants(conn, before, clients, summary)
+    conn.close()
+    return {
+        "config": {"processes": processes, "threads": threads, "duration": duration, "mix": mix, **settings},
+        "summary": summary,
+        "invariants": invariants,
+    }
+
+
+def format_report(report) -> str:
+    s = report["summary"]
+    header = (f"{'op':<10} {'req':>7} {'ok':>7} {'sold':>5} {'locked':>7} {'err':>5} {'req/s':>8} "
+              f"{'p50 ms':>8} {'p99 ms':>8} {'wait p99':>9} {'wait max':>9} {'commit p99':>11}")
+    lines = [header, "-" * len(header)]
+    for op, o in s["ops"].items():
+        lines.append(
+            f"{op:<10} {o['requests']:>7} {o['ok']:>7} {o['rejected']:>5} {o['locked']:>7} {o['error']:>5} "
+            f"{o['throughput_rps']:>8.1f} {o['latency']['p50_ms']:>8.2f} {o['latency']['p99_ms']:>8.2f} "
+            f"{o['lock_wait']['p99_ms']:>9.2f} {o['lock_wait']['max_ms']:>9.2f} "
+            f"{(o['commit']['p99_ms'] or 0):>11.2f}"
+        )
+    lines.append(f"\n{s['requests']} requests, {s['throughput_rps']} req/s, "
+                 f"{s['locked_errors']} 'database is locked' errors, {s['other_errors']} other errors")
+    lines.append("\nInvariants:")
+    for name, problem in report["invariants"].items():
+        lines.append(f"  {'ok  ' if problem is None else 'FAIL'} {name}" + (f": {problem}" if problem else ""))
+    return "\n".join(lines)
+
+
+def _parse_mix(text) -> dict:
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent write load and invariant checks.")
+    parser.add_argument("--scale", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="run against a copy of this database instead of a generated one")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="client threads per process")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="weights, e.g. checkout=4,stock=2,review=2,wishlist=2")
+    parser.add_argument("--busy-timeout", type=int, help="PRAGMA busy_timeout in ms (default 5000)")
+    parser.add_argument("--synchronous", help="PRAGMA synchronous (default NORMAL)")
+    parser.add_argument("--journal-mode", help="PRAGMA journal_mode (default WAL)")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--write-queue", action="store_true",
+                        help="route wishlist, review and session writes through the write queue")
+    parser.add_argument("--json", help="also write the full report here")
+    args = parser.parse_args(argv)
+
+    source = Path(args.db) if args.db else prepare_dataset(args.scale, args.seed)
+    with tempfile.TemporaryDirectory(prefix="contention-") as tmp:
+        db_path = Path(tmp) / "load.db"
+        shutil.copy(source, db_path)
+        report = run_contention(
+            db_path, args.processes, args.threads, args.duration, args.mix, args.seed,
+            busy_timeout=args.busy_timeout, synchronous=args.synchronous,
+            journal_mode=args.journal_mode, pool_size=args.pool_size, write_queue=args.write_queue,
+        )
+    print(format_report(report))
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+    return 1 if any(report["invariants"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
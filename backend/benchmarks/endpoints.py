@@ -0,0 +1,327 @@
+"""
+endpoints.py
+------------
+Throughput, p50/p95/p99 latency and queries per request for the main routes.
+
+Each scenario sends sequential requests through the Flask test client of an
+app built with create_app(test_config=...) on a private copy of a generated
+dataset (datagen.py, cached under backend/benchmarks/data/). SQL_PROFILING
+headers are on, so X-SQL-Queries gives the queries per request. The catalog
+cache is off unless --catalog-cache is passed, so catalog reads measure the
+database path rather than cache hits.
+
+    python -m backend.benchmarks --scale 0.01 --save-baseline
+    python -m backend.benchmarks --scale 0.01          # exit 1 on regression
+
+A scenario regresses against the stored baseline when it runs more queries
+per request, or answers with more unexpected status codes, than before; those
+checks hold on any machine and fail the run. p95 latency growing, or
+throughput dropping, by more than --tolerance (default 25%) only fails the
+run when the baseline was recorded on this host with the same Python and
+SQLite; otherwise those slowdowns are printed as advisory. For timing
+checks, keep a baseline of your own machine outside git:
+
+    python -m backend.benchmarks --baseline backend/benchmarks/data/local.json --save-baseline
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ..app import create_app
+from ..datagen import CATEGORIES, generate_database
+from ..db_utils import get_pool
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / "data"
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+SEARCH_TERMS = ("yoga", "protein", "running shoes", "kettlebell", "foam roller")
+PASSWORD = "password123"  # datagen's default
+
+# Applied on top of create_app's defaults for every run
+BENCH_CONFIG = {
+    "TESTING": True,
+    "SQL_PROFILING": True,
+    "SQL_PROFILING_HEADERS": True,
+    "PASSWORD_HASH_WORKERS": 0,  # hash inline: measures the hash, not process IPC
+    "LOGIN_RATE_PER_EMAIL": (10**9, 10**9),
+    "LOGIN_RATE_PER_IP": (10**9, 10**9),
+}
+
+
+class Scenario:
+    """A named route plus a function building (method, path, json) per request."""
+
+    def __init__(self, name, build, expect=(200,), auth=False, share=1.0):
+        self.name = name
+        self.build = build
+        self.expect = expect
+        self.auth = auth
+        self.share = share  # fraction of --requests to send (login hashes are slow)
+
+
+class BenchContext:
+    """Shared state for request builders: RNG, candidate ids, auth token."""
+
+    def __init__(self, client, conn, seed):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.active_ids = [r[0] for r in conn.execute("SELECT id FROM products WHERE is_active = 1")]
+        self.in_stock_ids = [
+            r[0] for r in conn.execute("SELECT id FROM products WHERE is_active = 1 AND stock >= 20")
+        ] or self.active_ids
+        self.wishlisted = []
+        self.token = None
+
+    def login(self):
+        response = self.client.post("/api/login", json={"email": "customer@example.com", "password": PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"benchmark login failed: {response.status_code} {response.get_data(as_text=True)}")
+        self.token = response.get_json()["token"]
+
+
+def _list_products(category, search, in_stock):
+    def build(ctx):
+        params = []
+        if category:
+            params.append(f"category={ctx.rng.choice(CATEGORIES)}")
+        if search:
+            params.append(f"search={ctx.rng.choice(SEARCH_TERMS).replace(' ', '+')}")
+        if in_stock:
+            params.append("in_stock=true")
+        return "GET", "/api/products" + ("?" + "&".join(params) if params else ""), None
+    return build
+
+
+def _wishlist_add(ctx):
+    product_id = ctx.rng.choice(ctx.active_ids)
+    while product_id in ctx.wishlisted:  # each add is later matched by one remove
+        product_id = ctx.rng.choice(ctx.active_ids)
+    ctx.wishlisted.append(product_id)
+    return "POST", f"/api/wishlist/{product_id}", None
+
+
+def _wishlist_remove(ctx):
+    product_id = ctx.wishlisted.pop() if ctx.wishlisted else ctx.rng.choice(ctx.active_ids)
+    return "DELETE", f"/api/wishlist/{product_id}", None
+
+
+def _create_order(ctx):
+    picks = ctx.rng.sample(ctx.in_stock_ids, min(ctx.rng.randint(1, 3), len(ctx.in_stock_ids)))
+    return "POST", "/api/orders", {"items": [{"product_id": pid, "quantity": 1} for pid in picks]}
+
+
+def default_scenarios():
+    scenarios = []
+    for category, search, in_stock in itertools.product((False, True), repeat=3):
+        flags = [name for name, on in (("category", category), ("search", search), ("in_stock", in_stock)) if on]
+        name = "list_products" + (f"[{'+'.join(flags)}]" if flags else "")
+        scenarios.append(Scenario(name, _list_products(category, search, in_stock)))
+    scenarios += [
+        Scenario("get_product", lambda ctx: ("GET", f"/api/products/{ctx.rng.choice(ctx.active_ids)}", None)),
+        Scenario("create_order", _create_order, expect=(201,)),
+        Scenario("list_orders", lambda ctx: ("GET", "/api/orders", None)),
+        Scenario("vendor_overview", lambda ctx: ("GET", "/api/vendor/overview", None)),
+        Scenario("wishlist", lambda ctx: ("GET", "/api/wishlist", None), auth=True),
+        Scenario("wishlist_add", _wishlist_add, expect=(201,), auth=True),
+        Scenario("wishlist_remove", _wishlist_remove, auth=True),
+        Scenario("login", lambda ctx: ("POST", "/api/login",
+                                       {"email": "customer@example.com", "password": PASSWORD}),
+                 share=0.1),
+    ]
+    return scenarios
+
+
+def _send(ctx, scenario):
+    method, path, body = scenario.build(ctx)
+    headers = {"Authorization": f"Bearer {ctx.token}"} if scenario.auth else None
+    return ctx.client.open(path, method=method, json=body, headers=headers)
+
+
+def run_scenario(ctx, scenario, requests, warmup) -> dict:
+    count = max(int(requests * scenario.share), 1)
+    for _ in range(warmup):
+        _send(ctx, scenario)
+
+    latencies = np.empty(count)
+    queries = np.empty(count)
+    errors = 0
+    started = time.perf_counter()
+    for i in range(count):
+        sent = time.perf_counter()
+        response = _send(ctx, scenario)
+        latencies[i] = time.perf_counter() - sent
+        queries[i] = int(response.headers.get("X-SQL-Queries", 0))
+        errors += response.status_code not in scenario.expect
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 1),
+        "mean_ms": round(float(latencies.mean() * 1000), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "queries_per_request": round(float(queries.mean()), 2),
+    }
+
+
+def prepare_dataset(scale, seed, data_dir=DATA_DIR) -> Path:
+    """Path to the generated dataset for (scale, seed), generating it on first use."""
+    path = Path(data_dir) / f"scale-{scale:g}-seed-{seed}.db"
+    if not path.exists():
+        tmp = path.with_name(path.name + ".tmp")
+        if tmp.exists():
+            tmp.unlink()  # left over from an interrupted run
+        generate_database(tmp, scale=scale, seed=seed)
+        os.replace(tmp, path)
+    return path
+
+
+def run_benchmarks(db_path, requests=200, warmup=10, seed=0, catalog_cache=False,
+                   only=None, config=None) -> dict:
+    """Run every scenario (or those whose name contains one of `only`) on a copy of db_path."""
+    scenarios = [s for s in default_scenarios() if not only or any(o in s.name for o in only)]
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        db_copy = Path(tmp) / "bench.db"
+        shutil.copy(db_path, db_copy)  # create_order and the wishlist routes write
+        app = create_app({
+            **BENCH_CONFIG,
+            "DATABASE": db_copy,
+            **({} if catalog_cache else {"CATALOG_CACHE_SIZE": 0}),
+            **(config or {}),
+        })
+        try:
+            conn = sqlite3.connect(db_copy)
+            with app.test_client() as client:
+                ctx = BenchContext(client, conn, seed)
+                conn.close()
+                ctx.login()
+                results = {s.name: run_scenario(ctx, s, requests, warmup) for s in scenarios}
+        finally:
+            get_pool(app).close()
+
+    return {
+        "meta": {
+            "dataset": Path(db_path).name,
+            "requests": requests,
+            "catalog_cache": catalog_cache,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "host": platform.node(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "scenarios": results,
+    }
+
+
+def same_machine(results, baseline) -> bool:
+    """True if `baseline` was recorded on this host with the same Python and SQLite (timings comparable)."""
+    now, before = results.get("meta", {}), baseline.get("meta", {})
+    keys = ("host", "machine", "python", "sqlite")
+    return bool(before.get("host")) and all(now.get(k) == before.get(k) for k in keys)
+
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE) -> tuple[list[str], list[str]]:
+    """
+    Differences of `results` against `baseline` (same report shape), as
+    (regressions, slowdowns): query-count and error regressions are
+    machine-independent; p95/throughput slowdowns only mean something when
+    both runs come from the same machine.
+    """
+    regressions, slowdowns = [], []
+    for name, now in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            slowdowns.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            slowdowns.append(f"{name}: throughput {before['throughput_rps']} -> {now['throughput_rps']} req/s")
+        if now["queries_per_request"] > before["queries_per_request"] + 0.01:
+            regressions.append(
+                f"{name}: queries/request {before['queries_per_request']} -> {now['queries_per_request']}"
+            )
+        if now["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}: {now['errors']} unexpected status codes")
+    return regressions, slowdowns
+
+
+def format_report(results, baseline=None) -> str:
+    header = f"{'scenario':<40} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6} {'err':>4}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    lines = [header, "-" * len(header)]
+    for name, s in results["scenarios"].items():
+        line = (f"{name:<40} {s['throughput_rps']:>8.1f} {s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} "
+                f"{s['p99_ms']:>8.2f} {s['queries_per_request']:>6.2f} {s['errors']:>4}")
+        before = (baseline or {}).get("scenarios", {}).get(name)
+        if before and before["p95_ms"]:
+            line += f" {(s['p95_ms'] / before['p95_ms'] - 1) * 100:>+11.1f}%"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the API routes against a generated dataset.")
+    parser.add_argument("--scale", type=float, default=0.01, help="datagen scale (1.0 = ~1M products)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="benchmark a copy of this database instead of a generated one")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--only", action="append", help="only scenarios whose name contains this (repeatable)")
+    parser.add_argument("--catalog-cache", action="store_true", help="leave the catalog response cache on")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--json", help="also write the full report here")
+    args = parser.parse_args(argv)
+
+    db_path = Path(args.db) if args.db else prepare_dataset(args.scale, args.seed)
+    results = run_benchmarks(db_path, args.requests, args.warmup, args.seed, args.catalog_cache, args.only)
+
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+    print(format_report(results, baseline))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one.")
+        return 0
+    if baseline["meta"]["dataset"] != results["meta"]["dataset"]:
+        print(f"\nWarning: baseline was measured on {baseline['meta']['dataset']}", file=sys.stderr)
+
+    regressions, slowdowns = compare_to_baseline(results, baseline, args.tolerance)
+    if slowdowns and same_machine(results, baseline):
+        regressions += slowdowns
+    elif slowdowns:
+        print(f"\n{len(slowdowns)} advisory slowdown(s) beyond {args.tolerance:.0%} "
+              "(baseline is from another machine; not failing):")
+        for line in slowdowns:
+            print(f"  {line}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
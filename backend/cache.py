@@ -0,0 +1,235 @@
+"""
+cache.py
+--------
+In-process read-through caching for hot, rarely-changing catalog reads.
+
+The catalog cache holds pre-serialized JSON bodies for GET /api/products and
+GET /api/products/<id>. Entries are keyed by the catalog version plus the
+normalized request filters; every write that changes what those endpoints
+return calls bump_catalog_version(), which drops the whole cache at once.
+
+When several worker processes each hold their own caches, they also share a
+change counter: the `cache_generation` row, bumped by triggers on products
+and reviews. check_cache_coherency() reads it once per request and drops
+every registered local cache if another process has written since. The row
+also holds a random epoch, renewed whenever the app starts, which keeps
+catalog ETags from repeating after the database is rebuilt or restored and
+the counter starts over.
+"""
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+from .db_utils import get_db
+
+DEFAULT_CATALOG_CACHE_SIZE = 512
+DEFAULT_CATALOG_CACHE_TTL = 30.0  # seconds
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        # Membership only: does not count as a hit or refresh LRU order
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > self._clock()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class CatalogCache:
+    """LRU/TTL cache of catalog responses, invalidated by a version counter."""
+
+    def __init__(self, maxsize=DEFAULT_CATALOG_CACHE_SIZE, ttl=DEFAULT_CATALOG_CACHE_TTL):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get((self.version, key))
+
+    def set(self, key, value, version=None):
+        # Callers pass the version they read before querying, so a response
+        # built while a write landed is filed under the old (dead) version.
+        self.entries.set((self.version if version is None else version, key), value)
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self.entries.stats()}
+
+
+class CacheCoherency:
+    """Tracks the last shared generation seen and drops local caches when it moves."""
+
+    def __init__(self):
+        self.generation = None
+        self.caches = []
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def register(self, cache):
+        """Register a local cache; it must provide bump() or clear()."""
+        self.caches.append(cache)
+        return cache
+
+    def sync(self, generation) -> bool:
+        """Record `generation`; returns True if local caches were dropped."""
+        with self._lock:
+            if generation == self.generation:
+                return False
+            first_sync = self.generation is None
+            self.generation = generation
+            if first_sync:
+                return False
+            self.invalidations += 1
+        for cache in self.caches:
+            (getattr(cache, "bump", None) or cache.clear)()
+        return True
+
+    def stats(self) -> dict:
+        return {"generation": self.generation, "invalidations": self.invalidations}
+
+
+def get_cache_coherency(app=None) -> CacheCoherency:
+    app = app or current_app._get_current_object()
+    coherency = app.extensions.get("cache_coherency")
+    if coherency is None:
+        coherency = app.extensions.setdefault("cache_coherency", CacheCoherency())
+    return coherency
+
+
+def check_cache_coherency():
+    """
+    Read the shared change counter (once per request) and drop local caches
+    if another worker has written since we last looked. Returns the current
+    generation, or None if the database has no cache_generation table.
+    """
+    if "cache_generation" in g:
+        return g.cache_generation
+
+    try:
+        row = get_db().execute(
+            "SELECT generation, epoch FROM cache_generation WHERE id = 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    generation = row[0] if row else None
+    if generation is not None:
+        get_cache_coherency().sync(generation)
+    g.cache_generation = generation
+    g.cache_epoch = row[1] if row else ""
+    return generation
+
+
+def get_cache_epoch() -> str:
+    """The database's catalog epoch, as read by this request's check_cache_coherency()."""
+    check_cache_coherency()
+    return g.cache_epoch
+
+
+def init_cache_epoch(conn, renew=False):
+    """
+    Give the database an epoch if it has none (row missing or reset), at
+    startup. Restarts keep the epoch, so clients' ETags stay valid across
+    restarts and worker boots. renew=True picks a new one regardless: after
+    migrations changed the schema, or after restoring a backup, which brings
+    back the epoch and counter it was taken with (`init_db --renew-cache-epoch`).
+    """
+    try:
+        conn.execute("INSERT OR IGNORE INTO cache_generation (id, generation, epoch) VALUES (1, 0, '')")
+        conn.execute(
+            "UPDATE cache_generation SET epoch = lower(hex(randomblob(8))) WHERE id = 1"
+            + ("" if renew else " AND epoch = ''")
+        )
+        conn.commit()
+    except sqlite3.OperationalError:
+        conn.rollback()  # no cache_generation table (not migrated)
+
+
+def get_catalog_cache(app=None) -> CatalogCache:
+    """Return the catalog cache for `app` (default: current_app), creating it lazily."""
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get("catalog_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("catalog_cache", CatalogCache(
+            maxsize=app.config.get("CATALOG_CACHE_SIZE", DEFAULT_CATALOG_CACHE_SIZE),
+            ttl=app.config.get("CATALOG_CACHE_TTL", DEFAULT_CATALOG_CACHE_TTL),
+        ))
+        get_cache_coherency(app).register(cache)
+    return cache
+
+
+def bump_catalog_version():
+    """Invalidate cached catalog reads after a write to products, reviews or stock."""
+    get_catalog_cache().bump()
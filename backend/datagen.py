@@ -0,0 +1,319 @@
+"""
+datagen.py
+----------
+Synthetic large-catalog data for performance work (`init_db.py --scale`).
+
+At scale 1.0 this writes ~1M products, 2M reviews, 1M orders (~2.5M order
+items), 500k wishlist rows and 200k sessions across 2,000 vendors and 100k
+customers. Vendors, categories and product popularity are Zipf/skew
+distributed, so a few vendors and products dominate like in a real
+marketplace. Output is reproducible for a given seed (timestamps are
+relative to generation time).
+
+Rows are generated with NumPy in chunks, as whole columns zipped straight
+into executemany parameters, and staged through a TEMP table so each chunk
+reaches the real table in one INSERT ... SELECT. Loading happens inside large
+transactions on a fresh file with loading-time PRAGMAs (no journal, no
+fsync). Secondary indexes, full-text search and the derived tables
+(product_stats, vendor_stats, ...) are built afterwards by the regular
+migrations, whose backfills run as single set-based statements.
+
+Users 1, 2 and 3 are customer@example.com, vendor@example.com and
+admin@example.com, matching the auth stubs in models.py. Every generated
+user shares one password (default "password123").
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from .migrations import apply_migrations
+
+SCALE_1_COUNTS = {
+    "vendors": 2_000,
+    "customers": 100_000,
+    "products": 1_000_000,
+    "reviews": 2_000_000,
+    "orders": 1_000_000,
+    "wishlist": 500_000,
+    "sessions": 200_000,
+}
+
+CATEGORIES = ("equipment", "apparel", "supplement", "accessory", "nutrition", "recovery")
+CATEGORY_WEIGHTS = (0.30, 0.25, 0.20, 0.12, 0.08, 0.05)
+
+ADJECTIVES = ("Pro", "Elite", "Classic", "Ultra", "Compact", "Heavy-Duty", "Lightweight",
+              "Adjustable", "Premium", "Essential", "Performance", "Everyday")
+NOUNS = {
+    "equipment": ("Yoga Mat", "Dumbbell", "Kettlebell", "Bench", "Pull-Up Bar", "Barbell", "Jump Rope"),
+    "apparel": ("Running Shoes", "Compression Shirt", "Training Shorts", "Hoodie", "Leggings", "Sports Bra"),
+    "supplement": ("Whey Protein", "BCAA Powder", "Pre-Workout", "Creatine", "Multivitamin"),
+    "accessory": ("Lifting Straps", "Lifting Belt", "Shaker Bottle", "Gym Bag", "Wrist Wraps"),
+    "nutrition": ("Protein Bar", "Energy Gel", "Electrolyte Mix", "Oat Bites"),
+    "recovery": ("Foam Roller", "Massage Gun", "Resistance Band", "Ice Pack"),
+}
+REVIEW_COMMENTS = (None, None, "Great quality.", "Does the job.", "Would buy again!",
+                   "Not as described.", "Excellent value.", "Arrived late but works well.")
+RATING_WEIGHTS = (0.05, 0.05, 0.12, 0.30, 0.48)  # 1..5 stars
+ORDER_STATUSES = ("placed", "processing", "shipped", "delivered", "cancelled")
+
+# Fast, unsafe settings for a one-off load into a fresh file
+LOAD_PRAGMAS = (
+    ("journal_mode", "OFF"),
+    ("synchronous", "OFF"),
+    ("locking_mode", "EXCLUSIVE"),
+    ("cache_size", -262144),  # 256 MB
+    ("temp_store", "MEMORY"),
+)
+
+CHUNK_ROWS = 100_000
+HISTORY_SECONDS = 365 * 24 * 3600
+
+
+def scaled_counts(scale: float) -> dict:
+    return {name: max(1, int(round(n * scale))) for name, n in SCALE_1_COUNTS.items()}
+
+
+def zipf_weights(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def weighted_sampler(rng, p):
+    """Like rng.choice(len(p), size, p=p), but the CDF is built once instead of per call."""
+    cdf = np.cumsum(p)
+    cdf /= cdf[-1]
+
+    def sample(size):
+        return np.searchsorted(cdf, rng.random(size), side="right")
+    return sample
+
+
+def _rows(*columns):
+    """executemany parameters from equal-length columns (arrays or lists)."""
+    return list(zip(*(col.tolist() if isinstance(col, np.ndarray) else col for col in columns)))
+
+
+def _chunks(total, size=CHUNK_ROWS):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+class _Loader:
+    """
+    Loads row chunks in one transaction per table, with per-table throughput.
+
+    Each chunk goes through executemany into a plain TEMP table `stage`
+    (columns c0, c1, ...), then `sql` moves it with one INSERT ... SELECT
+    FROM stage. Inserting into the real tables row by row pays the
+    AUTOINCREMENT (sqlite_sequence) bookkeeping per row; the set-based
+    statement pays it once per chunk.
+    """
+
+    def __init__(self, conn, echo):
+        self.conn = conn
+        self.echo = echo
+        self.stats = {}
+
+    def load(self, table, sql, batches):
+        started = time.perf_counter()
+        rows = 0
+        self.conn.execute("BEGIN")
+        for batch in batches:
+            if not batch:
+                continue
+            n_cols = len(batch[0])
+            self.conn.execute(f"CREATE TEMP TABLE stage ({', '.join(f'c{i}' for i in range(n_cols))})")
+            self.conn.executemany(f"INSERT INTO stage VALUES ({', '.join('?' * n_cols)})", batch)
+            self.conn.execute(sql)
+            self.conn.execute("DROP TABLE stage")
+            rows += len(batch)
+        self.conn.commit()
+        elapsed = time.perf_counter() - started
+        self.stats[table] = {"rows": rows, "seconds": round(elapsed, 3),
+                             "rows_per_sec": int(rows / elapsed) if elapsed else rows}
+        self.echo(f"   {table:<12} {rows:>10,} rows  {self.stats[table]['rows_per_sec']:>10,} rows/s")
+
+
+def _users(counts, password_hash, now):
+    n_vendors, n_customers = counts["vendors"], counts["customers"]
+    # Vendor 2 and customer 1 are the first of their kind; the rest follow admin (3)
+    vendor_ids = np.concatenate(([2], np.arange(4, 4 + n_vendors - 1)))
+    customer_ids = np.concatenate(([1], np.arange(4 + n_vendors - 1, 4 + n_vendors - 1 + n_customers - 1)))
+    emails = (["customer@example.com", "vendor@example.com", "admin@example.com"]
+              + [f"vendor{i}@example.com" for i in range(1, n_vendors)]
+              + [f"customer{i}@example.com" for i in range(1, n_customers)])
+    roles = ["customer", "vendor", "admin"] + ["vendor"] * (n_vendors - 1) + ["customer"] * (n_customers - 1)
+    n = len(emails)
+    batch = _rows(np.arange(1, n + 1), emails, [password_hash] * n, roles, ["active"] * n, [now] * n)
+    return [batch], vendor_ids, customer_ids
+
+
+def _products(rng, n_products, vendor_ids, prices, now):
+    """Yields product row chunks; fills `prices` (indexed by id - 1) as it goes."""
+    vendor_pick = weighted_sampler(rng, zipf_weights(len(vendor_ids)))
+    # All category name lists flattened into one array, indexed via per-category offsets
+    names_by_category = [
+        [f"{adj} {noun}" for adj in ADJECTIVES for noun in NOUNS[cat]] for cat in CATEGORIES
+    ]
+    name_counts = np.array([len(names) for names in names_by_category])
+    name_offsets = np.concatenate(([0], np.cumsum(name_counts)[:-1]))
+    all_names = np.array([name for names in names_by_category for name in names], dtype=object)
+    category_names = np.array(CATEGORIES, dtype=object)
+    for start, size in _chunks(n_products):
+        ids = np.arange(start + 1, start + size + 1)
+        category = rng.choice(len(CATEGORIES), size=size, p=CATEGORY_WEIGHTS)
+        vendor = vendor_ids[vendor_pick(size)]
+        price = np.round(np.exp(rng.normal(3.4, 0.8, size)), 2) + 0.99
+        stock = rng.negative_binomial(2, 0.04, size)
+        threshold = rng.choice((0, 5, 10, 20), size=size, p=(0.1, 0.4, 0.4, 0.1))
+        active = (rng.random(size) > 0.03).astype(int)
+        created = now - rng.integers(0, HISTORY_SECONDS, size)
+        name_pick = rng.integers(0, 10_000, size)
+        prices[start:start + size] = price
+
+        name_idx = name_offsets[category] + name_pick % name_counts[category]
+        name = all_names[name_idx] + " #" + ids.astype(str).astype(object)
+        category_name = category_names[category]
+        description = name + " for " + category_name + " training"
+        yield _rows(ids, name, price, description, category_name, stock, threshold, vendor, active, created)
+
+
+def _reviews(rng, n_reviews, popularity, customer_ids, now):
+    comments = np.array(REVIEW_COMMENTS, dtype=object)
+    for start, size in _chunks(n_reviews):
+        product = popularity(size)
+        user = customer_ids[rng.integers(0, len(customer_ids), size)]
+        rating = rng.choice(5, size=size, p=RATING_WEIGHTS) + 1
+        comment = comments[rng.integers(0, len(REVIEW_COMMENTS), size)]
+        created = now - rng.integers(0, HISTORY_SECONDS, size)
+        yield _rows(np.arange(start + 1, start + size + 1), product, user, rating, comment, created)
+
+
+def _orders(rng, n_orders, popularity, prices, customer_ids, now):
+    """Yields (orders_batch, items_batch) chunk pairs; totals come from the items."""
+    item_id = 0
+    statuses = np.array(ORDER_STATUSES, dtype=object)
+    for start, size in _chunks(n_orders):
+        order_ids = np.arange(start + 1, start + size + 1)
+        user = customer_ids[rng.integers(0, len(customer_ids), size)]
+        age = rng.exponential(HISTORY_SECONDS / 4, size).clip(0, HISTORY_SECONDS - 1).astype(np.int64)
+        created = now - age
+        # Recent orders are still open; older ones delivered; ~3% cancelled
+        days = age / 86400
+        status = np.where(days < 2, 0, np.where(days < 5, 1, np.where(days < 10, 2, 3)))
+        status[rng.random(size) < 0.03] = 4
+
+        lines = rng.geometric(0.45, size)  # 1 + a long tail of larger baskets
+        item_order = np.repeat(order_ids, lines)
+        product = popularity(len(item_order))
+        quantity = rng.geometric(0.6, len(item_order))
+        price = prices[product - 1]
+        totals = np.bincount(item_order - start - 1, weights=quantity * price, minlength=size)
+
+        orders = _rows(order_ids, user, np.round(totals, 2), statuses[status], created, created)
+        ids = np.arange(item_id + 1, item_id + len(item_order) + 1)
+        item_id += len(item_order)
+        yield orders, _rows(ids, item_order, product, quantity, price)
+
+
+def generate_database(path, scale=1.0, seed=0, password="password123", echo=print) -> dict:
+    """Create a new database at `path` filled with synthetic data; returns load stats."""
+    path = Path(path)
+    if path.exists():
+        raise FileExistsError(f"{path} already exists; generate into a new file")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    from .init_db import ALL_TABLES_SQL
+
+    rng = np.random.default_rng(seed)
+    counts = scaled_counts(scale)
+    now = int(time.time())
+    echo(f"Generating scale={scale} seed={seed} into {path}")
+
+    conn = sqlite3.connect(path, isolation_level=None)  # explicit BEGIN/COMMIT below
+    for name, value in LOAD_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.executescript(ALL_TABLES_SQL)
+    loader = _Loader(conn, echo)
+    started = time.perf_counter()
+
+    password_hash = generate_password_hash(password)  # hashed once, shared by all users
+    user_batches, vendor_ids, customer_ids = _users(counts, password_hash, now)
+    loader.load("users", """INSERT INTO users (id, email, password_hash, role, status, created_at)
+        SELECT c0, c1, c2, c3, c4, datetime(c5, 'unixepoch') FROM stage""", user_batches)
+
+    n_products = counts["products"]
+    prices = np.empty(n_products)
+    loader.load("products", """INSERT INTO products
+        (id, name, price, description, category, stock, low_stock_threshold, vendor_id, is_active, created_at)
+        SELECT c0, c1, c2, c3, c4, c5, c6, c7, c8, datetime(c9, 'unixepoch') FROM stage""",
+                _products(rng, n_products, vendor_ids, prices, now))
+
+    # Popular products are scattered across ids, not clustered at the start
+    popularity_rank = weighted_sampler(rng, zipf_weights(n_products, 0.9))
+    rank_to_id = rng.permutation(n_products) + 1
+
+    def popularity(size):
+        return rank_to_id[popularity_rank(size)]
+
+    loader.load("reviews", """INSERT INTO reviews (id, product_id, user_id, rating, comment, created_at)
+        SELECT c0, c1, c2, c3, c4, datetime(c5, 'unixepoch') FROM stage""",
+                _reviews(rng, counts["reviews"], popularity, customer_ids, now))
+
+    item_batches = []
+
+    def order_batches():
+        for orders, items in _orders(rng, counts["orders"], popularity, prices, customer_ids, now):
+            item_batches.append(items)
+            yield orders
+
+    loader.load("orders", """INSERT INTO orders (id, user_id, total_amount, status, created_at, updated_at)
+        SELECT c0, c1, c2, c3, datetime(c4, 'unixepoch'), datetime(c5, 'unixepoch') FROM stage""",
+                order_batches())
+    loader.load("order_items", """INSERT INTO order_items (id, order_id, product_id, quantity, price_at_purchase)
+        SELECT c0, c1, c2, c3, c4 FROM stage""", item_batches)
+    item_batches.clear()
+
+    # (user, product) must be unique; draw extra pairs and keep distinct ones
+    n_wish = counts["wishlist"]
+    users = customer_ids[rng.integers(0, len(customer_ids), int(n_wish * 1.2) + 10)]
+    # np.unique sorts by user, so sample the distinct pairs rather than keep the first n_wish
+    distinct = np.unique(users.astype(np.int64) * (n_products + 1) + popularity(len(users)))
+    keys = distinct[rng.choice(len(distinct), min(n_wish, len(distinct)), replace=False)]
+    wish_users, wish_products = np.divmod(keys, n_products + 1)
+    loader.load("wishlist", "INSERT INTO wishlist (user_id, product_id) SELECT c0, c1 FROM stage",
+                [_rows(wish_users, wish_products)])
+
+    n_sessions = counts["sessions"]
+    token_hex = rng.bytes(16 * n_sessions).hex()
+    expires = now + rng.integers(-7 * 86400, 7 * 86400, n_sessions)  # about half already expired
+    sess_users = customer_ids[rng.integers(0, len(customer_ids), n_sessions)]
+    loader.load("sessions", """INSERT INTO sessions (user_id, token, expires_at)
+        SELECT c0, c1, strftime('%Y-%m-%dT%H:%M:%S', c2, 'unixepoch') FROM stage""", [_rows(
+        sess_users, [token_hex[i:i + 32] for i in range(0, 32 * n_sessions, 32)], expires,
+    )])
+    load_seconds = time.perf_counter() - started
+
+    # Indexes, FTS and derived tables in bulk, then back to normal settings
+    migrate_started = time.perf_counter()
+    applied = apply_migrations(conn)
+    conn.execute("ANALYZE")
+    migrate_seconds = time.perf_counter() - migrate_started
+    conn.execute("PRAGMA locking_mode = NORMAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+    total_rows = sum(s["rows"] for s in loader.stats.values())
+    echo(f"   loaded {total_rows:,} rows in {load_seconds:.1f}s "
+         f"({int(total_rows / load_seconds):,} rows/s); "
+         f"migrations {applied} + ANALYZE in {migrate_seconds:.1f}s")
+    return {
+        "tables": loader.stats,
+        "rows": total_rows,
+        "load_seconds": round(load_seconds, 3),
+        "migrate_seconds": round(migrate_seconds, 3),
+        "migrations": applied,
+    }
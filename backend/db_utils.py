@@ -52,25 +52,190 @@
 db_utils.py
 ------------
 Shared helper functions for Flask context-aware database access.
+
+Connections come from a per-app ConnectionPool instead of being opened and
+closed on every request. Pooled connections are configured once with the
+PRAGMAs below, so each request starts with a warm page cache.
 """
 from flask import g, current_app
+import os
 import sqlite3
+import threading
+import time
+from collections import deque
+
+from .sql_profiler import profile_connection, statement_timing_enabled, unwrap_connection
+
+# Applied once to every new pooled connection. journal_mode=WAL is persistent
+# in the database file; the rest are per-connection settings.
+DEFAULT_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64000),        # ~64 MB page cache (negative = KiB)
+    ("mmap_size", 268435456),      # 256 MB memory-mapped I/O
+    ("busy_timeout", 5000),        # ms to wait on a locked database
+    ("temp_store", "MEMORY"),
+)
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_POOL_TIMEOUT = 10.0
+
+_pool_init_lock = threading.Lock()
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pre-configured SQLite connections.
+
+    Idle connections are kept open and handed to whichever worker thread asks
+    next (most recently used first, so the warmest cache is reused). At most
+    `max_size` connections are checked out at once; further callers wait.
+    """
+
+    def __init__(self, database, max_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_POOL_TIMEOUT, pragmas=DEFAULT_PRAGMAS):
+        self.database = str(database)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = tuple(pragmas)
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = 0
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection, reusing an idle one when possible."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections must not cross a fork; start over in the child.
+                self._reset_state()
+
+            if self._in_use >= self.max_size:
+                started = time.perf_counter()
+                deadline = started + self.timeout
+                while self._in_use >= self.max_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise PoolTimeout("Timed out waiting for a database connection")
+                    self._available.wait(remaining)
+                waited = time.perf_counter() - started
+                self._waits += 1
+                self._wait_time += waited
+                self._max_wait = max(self._max_wait, waited)
+
+            self._in_use += 1
+            if self._idle:
+                self._hits += 1
+                return self._idle.pop()
+            self._misses += 1
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            reusable = False
+
+        with self._lock:
+            self._in_use = max(self._in_use - 1, 0)
+            if reusable and self._pid == os.getpid():
+                self._idle.append(conn)
+            else:
+                conn.close()
+            self._available.notify()
+
+    def close(self):
+        """Close every idle connection (checked-out ones close on release)."""
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage counters."""
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "size": len(self._idle) + self._in_use,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / requests, 4) if requests else 0.0,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+
+def connection_pragmas(config) -> tuple:
+    """DEFAULT_PRAGMAS with the app's DB_PRAGMAS overrides applied."""
+    return tuple({**dict(DEFAULT_PRAGMAS), **(config.get("DB_PRAGMAS") or {})}.items())
+
+
+def get_pool(app=None) -> ConnectionPool:
+    """Return the connection pool for `app` (default: current_app), creating it lazily."""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get("db_pool")
+    if pool is None:
+        with _pool_init_lock:
+            pool = app.extensions.get("db_pool")
+            if pool is None:
+                pool = ConnectionPool(
+                    app.config["DATABASE"],
+                    max_size=app.config.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE),
+                    timeout=app.config.get("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT),
+                    pragmas=connection_pragmas(app.config),
+                )
+                app.extensions["db_pool"] = pool
+    return pool
 
 def get_db() -> sqlite3.Connection:
-    """Opens a new SQLite connection if one is not already open for the current app context."""
+    """Checks out a pooled SQLite connection if one is not already held by the current app context."""
     if 'db' not in g:
-        db_path = current_app.config["DATABASE"] 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = get_pool().acquire()
+        # The proxy times statements for the SQL profiler, metrics and slow query log
+        if statement_timing_enabled(current_app.config):
+            conn = profile_connection(conn)
         g.db = conn
     return g.db
 
 def close_db(e=None):
-    """Closes the database connection stored in the application global (g) if one exists."""
+    """Returns the connection stored in the application global (g) to the pool, if one exists."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(unwrap_connection(db))
 
 def rows_to_dicts(rows) -> list[dict]:
     """Convert a list of sqlite3.Row objects into a list of regular dictionaries."""
-    return [dict(r) for r in rows]
\ No newline at end of file
+    return [dict(r) for r in rows]
@@ -0,0 +1,127 @@
+"""
+forecast.py
+-----------
+Batch stockout forecasting for the whole catalog.
+
+Sales velocity is an exponentially weighted moving average of units sold per
+day over the last HISTORY_DAYS, computed for every product at once: a
+(products x days) units matrix is multiplied by one normalized weight
+vector. Results land in `stock_forecasts`, which vendor_overview joins to
+project days-until-stockout from the live stock level.
+
+Run it periodically (e.g. hourly from cron):
+
+    python -m backend.forecast --db backend/db/fitness.db
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .migrations import apply_migrations
+
+DEFAULT_HISTORY_DAYS = 56
+DEFAULT_HALFLIFE_DAYS = 7.0
+
+
+def ewma_weights(history_days=DEFAULT_HISTORY_DAYS, halflife_days=DEFAULT_HALFLIFE_DAYS) -> np.ndarray:
+    """Weights for ages 0..history_days-1 (0 = today), decaying by half every halflife and summing to 1."""
+    ages = np.arange(history_days)
+    weights = 0.5 ** (ages / halflife_days)
+    return weights / weights.sum()
+
+
+def compute_velocities(product_ids, sales, history_days=DEFAULT_HISTORY_DAYS,
+                       halflife_days=DEFAULT_HALFLIFE_DAYS) -> np.ndarray:
+    """
+    EWMA units/day for each of `product_ids` (sorted) from `sales`, an
+    (n, 3) array of (product_id, age_in_days, units) rows.
+    """
+    units = np.zeros((len(product_ids), history_days))
+    if len(sales) and len(product_ids):
+        rows = np.searchsorted(product_ids, sales[:, 0])
+        known = (rows < len(product_ids)) & (product_ids[np.minimum(rows, len(product_ids) - 1)] == sales[:, 0])
+        ages = sales[:, 1].astype(np.int64)
+        known &= (ages >= 0) & (ages < history_days)
+        np.add.at(units, (rows[known], ages[known]), sales[known, 2])
+    return units @ ewma_weights(history_days, halflife_days)
+
+
+def refresh_stock_forecasts(conn: sqlite3.Connection, history_days=DEFAULT_HISTORY_DAYS,
+                            halflife_days=DEFAULT_HALFLIFE_DAYS, now: datetime | None = None) -> dict:
+    """Recompute stock_forecasts for every product in one pass; returns counts and timing."""
+    started = time.perf_counter()
+    # orders.created_at is CURRENT_TIMESTAMP (UTC); let SQLite supply "now" too
+    ref = now.isoformat(" ") if now else "now"
+    cur = conn.cursor()
+    cur.row_factory = None
+
+    products = np.array(
+        cur.execute("SELECT id, COALESCE(stock, 0) FROM products ORDER BY id").fetchall(),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    sales = np.array(
+        cur.execute(
+            """
+            SELECT oi.product_id,
+                   CAST(julianday(?) - julianday(o.created_at) AS INTEGER) AS age,
+                   SUM(oi.quantity)
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.created_at >= datetime(?, ?)
+              AND o.status != 'cancelled'
+            GROUP BY oi.product_id, age
+            """,
+            (ref, ref, f"-{history_days} days"),
+        ).fetchall(),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+    product_ids, stock = products[:, 0], products[:, 1]
+    velocity = compute_velocities(product_ids, sales, history_days, halflife_days)
+    # Only divide where there were sales; np.where would still evaluate 0/0
+    days_left = np.divide(stock, velocity, out=np.full_like(stock, np.nan), where=velocity > 0)
+
+    computed_at = conn.execute("SELECT datetime(?)", (ref,)).fetchone()[0]
+    rows = [
+        (int(pid), round(float(v), 4), None if np.isnan(d) else round(float(d), 1), computed_at)
+        for pid, v, d in zip(product_ids, velocity, days_left)
+    ]
+    conn.execute("DELETE FROM stock_forecasts")
+    conn.executemany(
+        """
+        INSERT INTO stock_forecasts (product_id, daily_velocity, days_until_stockout, computed_at)
+        VALUES (?, ?, ?, ?)
+        """,
+        rows,
+    )
+    conn.commit()
+    return {
+        "products": len(rows),
+        "selling": int((velocity > 0).sum()),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def main():
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Recompute stockout forecasts for every product.")
+    parser.add_argument("--db", default=str(Path(__file__).resolve().parent / "db" / "fitness.db"))
+    parser.add_argument("--history-days", type=int, default=DEFAULT_HISTORY_DAYS)
+    parser.add_argument("--halflife-days", type=float, default=DEFAULT_HALFLIFE_DAYS)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    apply_migrations(conn)
+    result = refresh_stock_forecasts(conn, args.history_days, args.halflife_days)
+    conn.close()
+    print(f"Forecast {result['products']} products ({result['selling']} selling) "
+          f"in {result['duration_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+hashing.py
+----------
+Password hashing off the request thread, plus login rate limiting.
+
+generate_password_hash / check_password_hash are deliberately slow. Running
+them inline lets a burst of logins tie up every request thread, so they are
+sent to a small process pool instead. At most `max_pending` hashes may be
+queued or running at once; past that, callers get HashingUnavailable right
+away (503) rather than waiting in line.
+
+Per-email and per-IP token buckets run in front of the pool so a single
+client (credential stuffing, a retry loop) cannot monopolize it (429). An
+attempt takes a token up front, and a successful login gives it back, so
+only failed attempts count: users sharing one NAT or proxy address are not
+limited by each other's successful logins.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+import multiprocessing
+import math
+import os
+import threading
+import time
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_HASH_WORKERS = 2
+DEFAULT_HASH_MAX_PENDING = 8
+DEFAULT_HASH_TIMEOUT = 10.0  # seconds a request waits for its hash
+
+# (capacity, refill per second)
+DEFAULT_LOGIN_RATE_PER_EMAIL = (5, 1 / 12)  # 5 failed attempts, then 5/minute
+DEFAULT_LOGIN_RATE_PER_IP = (30, 1.0)       # 30 failed attempts, then 1/second (shared behind a NAT)
+
+
+class HashingUnavailable(Exception):
+    """Raised when a hash cannot be computed now; maps to a fast 429/503."""
+    def __init__(self, message, status_code=503, retry_after=1):
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    """
+    Bounded executor for password hashing.
+
+    workers=0 hashes inline on the calling thread (still bounded by
+    max_pending); otherwise a ProcessPoolExecutor is started on first use.
+    """
+
+    def __init__(self, workers=DEFAULT_HASH_WORKERS, max_pending=DEFAULT_HASH_MAX_PENDING,
+                 timeout=DEFAULT_HASH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = os.getpid()
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # "spawn": forking a multi-threaded server process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        """Run fn(*args) in the pool; raises HashingUnavailable if it is saturated."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:  # request threads race; += is not atomic
+                self.rejected += 1
+            raise HashingUnavailable("Server busy, please retry shortly")
+        if self.workers <= 0:
+            try:
+                result = fn(*args)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot stays taken until the hash really stops: a timed-out
+            # hash that is already running cannot be cancelled.
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                result = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise HashingUnavailable("Server busy, please retry shortly")
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+class RateLimiter:
+    """Token buckets keyed by an arbitrary string (email, IP), LRU-bounded."""
+
+    def __init__(self, capacity, refill_rate, max_keys=10000, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, last_refill)
+        self._lock = threading.Lock()
+
+    def consume(self, key) -> float:
+        """Take one token for `key`; returns 0 if allowed, else seconds until the next token."""
+        now = self._clock()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.refill_rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / self.refill_rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+    def refund(self, key):
+        """Give back a token taken by consume() (the attempt turned out fine)."""
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                tokens, last = entry
+                self._buckets[key] = (min(self.capacity, tokens + 1), last)
+
+
+def get_hashing_pool(app=None) -> HashingPool:
+    """Return the hashing pool for `app` (default: current_app), creating it lazily."""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get("hashing_pool")
+    if pool is None:
+        pool = app.extensions.setdefault("hashing_pool", HashingPool(
+            workers=app.config.get("PASSWORD_HASH_WORKERS", DEFAULT_HASH_WORKERS),
+            max_pending=app.config.get("PASSWORD_HASH_MAX_PENDING", DEFAULT_HASH_MAX_PENDING),
+            timeout=app.config.get("PASSWORD_HASH_TIMEOUT", DEFAULT_HASH_TIMEOUT),
+        ))
+    return pool
+
+
+def get_login_limiters(app=None) -> dict:
+    """Return the {"email": RateLimiter, "ip": RateLimiter} pair for `app`."""
+    app = app or current_app._get_current_object()
+    limiters = app.extensions.get("login_limiters")
+    if limiters is None:
+        email_rate = app.config.get("LOGIN_RATE_PER_EMAIL", DEFAULT_LOGIN_RATE_PER_EMAIL)
+        ip_rate = app.config.get("LOGIN_RATE_PER_IP", DEFAULT_LOGIN_RATE_PER_IP)
+        limiters = app.extensions.setdefault("login_limiters", {
+            "email": RateLimiter(*email_rate),
+            "ip": RateLimiter(*ip_rate),
+        })
+    return limiters
+
+
+def check_login_rate(email: str | None, ip: str | None):
+    """Raise HashingUnavailable(429) if this email or IP is out of attempts."""
+    limiters = get_login_limiters()
+    waits = [limiters["ip"].consume(ip or "unknown")]
+    if email:
+        waits.append(limiters["email"].consume(email))
+    retry_after = max(waits)
+    if retry_after > 0:
+        raise HashingUnavailable("Too many attempts, please retry later",
+                                 status_code=429, retry_after=math.ceil(retry_after))
+
+
+def refund_login_rate(email: str | None, ip: str | None):
+    """Return the tokens check_login_rate took, after a successful login or registration."""
+    limiters = get_login_limiters()
+    limiters["ip"].refund(ip or "unknown")
+    if email:
+        limiters["email"].refund(email)
+
+
+def hash_password(password: str) -> str:
+    return get_hashing_pool().run(generate_password_hash, password)
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return get_hashing_pool().run(check_password_hash, password_hash, password)
@@ -0,0 +1,138 @@
+"""
+housekeeping.py
+---------------
+Background maintenance for tables that only ever grow on the request path.
+
+The session sweeper deletes expired rows from `sessions` in small batches
+(one short write transaction each, so it never holds the write lock for
+long) on a fixed interval. create_app() does not start it, so throwaway apps
+(tests, benchmarks) get no thread; the serving entry point (`python -m
+backend.app`, used by launch_app.py) calls start_session_sweeper(). It can
+also be run once from the command line:
+
+    python -m backend.housekeeping --db backend/db/fitness.db
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .db_utils import get_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SWEEP_INTERVAL = 300   # seconds between sweeps
+DEFAULT_SWEEP_BATCH_SIZE = 500  # rows deleted per transaction
+
+
+def purge_expired_sessions(conn: sqlite3.Connection, batch_size=DEFAULT_SWEEP_BATCH_SIZE,
+                           now: datetime | None = None) -> dict:
+    """Delete expired sessions batch by batch; returns rows purged, batches and time taken."""
+    cutoff = (now or datetime.now()).isoformat()
+    started = time.perf_counter()
+    purged = batches = 0
+    while True:
+        cur = conn.execute(
+            """
+            DELETE FROM sessions
+            WHERE id IN (
+                SELECT id FROM sessions WHERE expires_at < ? LIMIT ?
+            )
+            """,
+            (cutoff, batch_size),
+        )
+        conn.commit()
+        batches += 1
+        purged += cur.rowcount
+        if cur.rowcount < batch_size:
+            break
+    return {
+        "purged": purged,
+        "batches": batches,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+class SessionSweeper(threading.Thread):
+    """Daemon thread that runs purge_expired_sessions every `interval` seconds."""
+
+    def __init__(self, app, interval=DEFAULT_SWEEP_INTERVAL, batch_size=DEFAULT_SWEEP_BATCH_SIZE):
+        super().__init__(name="session-sweeper", daemon=True)
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.runs = 0
+        self.total_purged = 0
+        self.last_result = None
+        self._stopped = threading.Event()
+
+    def sweep(self) -> dict:
+        pool = get_pool(self.app)
+        conn = pool.acquire()
+        try:
+            result = purge_expired_sessions(conn, self.batch_size)
+        finally:
+            pool.release(conn)
+        self.runs += 1
+        self.total_purged += result["purged"]
+        self.last_result = result
+        logger.info(
+            "session sweep: purged %d expired sessions in %d batches (%.1f ms)",
+            result["purged"], result["batches"], result["duration_ms"],
+        )
+        return result
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+            except sqlite3.Error:
+                logger.exception("session sweep failed; retrying next interval")
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "total_purged": self.total_purged,
+            "last_result": self.last_result,
+        }
+
+
+def start_session_sweeper(app):
+    """Start the sweeper for `app` unless SESSION_SWEEP_INTERVAL is 0 / None."""
+    interval = app.config.get("SESSION_SWEEP_INTERVAL", DEFAULT_SWEEP_INTERVAL)
+    if not interval:
+        return None
+    sweeper = SessionSweeper(
+        app,
+        interval=interval,
+        batch_size=app.config.get("SESSION_SWEEP_BATCH_SIZE", DEFAULT_SWEEP_BATCH_SIZE),
+    )
+    app.extensions["session_sweeper"] = sweeper
+    sweeper.start()
+    return sweeper
+
+
+def main():
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Purge expired sessions once.")
+    parser.add_argument("--db", default=str(Path(__file__).resolve().parent / "db" / "fitness.db"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_SWEEP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    result = purge_expired_sessions(conn, args.batch_size)
+    conn.close()
+    print(f"Purged {result['purged']} expired sessions in {result['batches']} batches "
+          f"({result['duration_ms']} ms)")
+
+
+if __name__ == "__main__":
+    main()
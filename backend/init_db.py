@@ -3,12 +3,23 @@ init_db.py
 ----------
 Rebuilds the entire SQLite database with the correct schema
 (fixed UNIQUE constraints so SQLite accepts all tables).
+
+    python -m backend.init_db                      # small demo seed
+    python -m backend.init_db --scale 0.1 --seed 7 --db /tmp/big.db
+                                                   # synthetic data, see datagen.py
+    python -m backend.init_db --renew-cache-epoch  # after restoring a backup
 """
 
+import argparse
 import sqlite3
 import hashlib
+import sys
 from pathlib import Path
 
+if __package__ in (None, ""):
+    # Allow `python init_db.py` from backend/ as well as `python -m backend.init_db`.
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
 DB_PATH = Path(__file__).resolve().parent / "db" / "fitness.db"
 
 def hash_password(password: str) -> str:
@@ -149,6 +160,8 @@ CREATE TABLE IF NOT EXISTS sessions (
 # ============================
 
 def init_database():
+    from backend.migrations import apply_migrations
+
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     VENDOR_HASH   = hash_password("vendor123")
@@ -238,13 +251,46 @@ def init_database():
                 (customer_id, 4, 1)
             )
 
+            # --------------------------
+            # Indexes & schema upgrades
+            # --------------------------
+            conn.commit()
+            applied = apply_migrations(conn)
+
             print("✅ Database initialized successfully!")
             print(f"   Path: {DB_PATH}")
             print("   Users, products, and reviews seeded.")
+            print(f"   Schema migrations applied: {applied or 'none (already current)'}")
 
     except sqlite3.Error as e:
         print(f"❌ Database initialization error: {e}")
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and seed the marketplace database.")
+    parser.add_argument("--scale", type=float,
+                        help="generate synthetic data instead (1.0 = ~1M products, 2M reviews, 1M orders)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --scale")
+    parser.add_argument("--db", help="output file for --scale (must not exist), or the database to renew")
+    parser.add_argument("--renew-cache-epoch", action="store_true",
+                        help="invalidate catalog ETags of the database (e.g. a restored backup) and exit")
+    args = parser.parse_args(argv)
+
+    if args.renew_cache_epoch:
+        from backend.cache import init_cache_epoch
+
+        with sqlite3.connect(args.db or DB_PATH) as conn:
+            init_cache_epoch(conn, renew=True)
+        return
+
+    if args.scale is None:
+        init_database()
+        return
+    from backend.datagen import generate_database
+
+    generate_database(args.db or DB_PATH.with_name(f"scale-{args.scale:g}-seed-{args.seed}.db"),
+                      scale=args.scale, seed=args.seed)
+
+
 if __name__ == "__main__":
-    init_database()
+    main()
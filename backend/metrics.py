@@ -0,0 +1,316 @@
+"""
+metrics.py
+----------
+Route-level request metrics, exposed in Prometheus text format at /metrics.
+
+For every request we record, per blueprint/endpoint/method:
+- a latency histogram (http_request_duration_seconds),
+- status-code counters (http_requests_total),
+- an in-flight gauge (http_requests_in_flight),
+- time spent in SQLite (http_request_db_seconds_total), from the statement
+  timings collected by sql_profiler's connection proxy. Off by default
+  (METRICS_DB_TIME): the proxy wraps every cursor and keeps each statement's
+  parameters for the rest of the request.
+
+p50/p99 estimates per route are exported as gauges as well, so capacity
+planning doesn't need a Prometheus server to read them.
+
+With several worker processes, set METRICS_DIR to a directory shared by
+them: each process periodically writes its counters to metrics-<pid>.json,
+and /metrics merges every file it finds there. Files not rewritten for
+STALE_FLUSHES flush intervals belong to exited (or idle) workers: their
+counters are kept but their in-flight gauges are dropped.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+# Upper bounds in seconds; the implicit last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds between writes to METRICS_DIR
+STALE_FLUSHES = 10  # a worker file this many flush intervals old counts as exited
+
+
+class MetricsRegistry:
+    """Counters for one process; JSON-serializable so workers can share them."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.routes = {}     # "blueprint|endpoint|method" -> histogram + sums
+        self.statuses = {}   # "endpoint|method|status" -> count
+        self.in_flight = {}  # "endpoint" -> gauge
+        self._lock = threading.Lock()
+
+    def start(self, endpoint):
+        with self._lock:
+            self.in_flight[endpoint] = self.in_flight.get(endpoint, 0) + 1
+
+    def finish(self, endpoint):
+        with self._lock:
+            self.in_flight[endpoint] = max(self.in_flight.get(endpoint, 0) - 1, 0)
+
+    def observe(self, blueprint, endpoint, method, status, duration, db_time=0.0):
+        key = f"{blueprint}|{endpoint}|{method}"
+        with self._lock:
+            route = self.routes.get(key)
+            if route is None:
+                route = self.routes[key] = {
+                    "counts": [0] * (len(self.buckets) + 1),
+                    "count": 0, "sum": 0.0, "db_sum": 0.0,
+                }
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    index = i
+                    break
+            route["counts"][index] += 1
+            route["count"] += 1
+            route["sum"] += duration
+            route["db_sum"] += db_time
+            status_key = f"{endpoint}|{method}|{status}"
+            self.statuses[status_key] = self.statuses.get(status_key, 0) + 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "buckets": list(self.buckets),
+                "routes": {k: {**v, "counts": list(v["counts"])} for k, v in self.routes.items()},
+                "statuses": dict(self.statuses),
+                "in_flight": dict(self.in_flight),
+            }
+
+
+def merge_snapshots(snapshots) -> dict:
+    """Sum counters from several to_dict() snapshots (same bucket layout)."""
+    merged = {"buckets": list(DEFAULT_BUCKETS), "routes": {}, "statuses": {}, "in_flight": {}}
+    for snap in snapshots:
+        merged["buckets"] = snap["buckets"]
+        for key, route in snap["routes"].items():
+            into = merged["routes"].get(key)
+            if into is None:
+                merged["routes"][key] = {**route, "counts": list(route["counts"])}
+                continue
+            into["counts"] = [a + b for a, b in zip(into["counts"], route["counts"])]
+            for field in ("count", "sum", "db_sum"):
+                into[field] += route[field]
+        for key, n in snap["statuses"].items():
+            merged["statuses"][key] = merged["statuses"].get(key, 0) + n
+        for key, n in snap["in_flight"].items():
+            merged["in_flight"][key] = merged["in_flight"].get(key, 0) + n
+    return merged
+
+
+def histogram_quantile(q, buckets, counts):
+    """Estimate the q-quantile from per-bucket counts (linear within a bucket)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(list(buckets) + [None], counts):
+        if seen + n >= rank and n:
+            if bound is None:  # +Inf bucket: best we can say is "above the last bound"
+                return float(buckets[-1])
+            return lower + (bound - lower) * (rank - seen) / n
+        seen += n
+        if bound is not None:
+            lower = bound
+    return float(buckets[-1])
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus(snapshot, db_time=True) -> str:
+    """Prometheus text exposition (format 0.0.4) for a merged snapshot."""
+    buckets = snapshot["buckets"]
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    quantile_lines = []
+    db_lines = []
+    ratio_lines = []
+    for key in sorted(snapshot["routes"]):
+        route = snapshot["routes"][key]
+        blueprint, endpoint, method = key.split("|")
+        base = dict(blueprint=blueprint, endpoint=endpoint, method=method)
+        cumulative = 0
+        for bound, n in zip(buckets, route["counts"]):
+            cumulative += n
+            lines.append(f"http_request_duration_seconds_bucket{_labels(**base, le=bound)} {cumulative}")
+        lines.append(f"http_request_duration_seconds_bucket{_labels(**base, le='+Inf')} {route['count']}")
+        lines.append(f"http_request_duration_seconds_sum{_labels(**base)} {route['sum']:.6f}")
+        lines.append(f"http_request_duration_seconds_count{_labels(**base)} {route['count']}")
+
+        for q in (0.5, 0.99):
+            value = histogram_quantile(q, buckets, route["counts"])
+            if value is not None:
+                quantile_lines.append(
+                    f"http_request_duration_quantile_seconds{_labels(**base, quantile=q)} {value:.6f}"
+                )
+        if db_time:
+            db_lines.append(f"http_request_db_seconds_total{_labels(**base)} {route['db_sum']:.6f}")
+            if route["sum"] > 0:
+                ratio_lines.append(
+                    f"http_request_db_time_ratio{_labels(**base)} {route['db_sum'] / route['sum']:.4f}"
+                )
+
+    lines += [
+        "# HELP http_request_duration_quantile_seconds Estimated latency quantiles by route.",
+        "# TYPE http_request_duration_quantile_seconds gauge",
+        *quantile_lines,
+    ]
+    if db_time:
+        lines += [
+            "# HELP http_request_db_seconds_total Time spent in SQLite statements by route.",
+            "# TYPE http_request_db_seconds_total counter",
+            *db_lines,
+            "# HELP http_request_db_time_ratio Fraction of request time spent in SQLite.",
+            "# TYPE http_request_db_time_ratio gauge",
+            *ratio_lines,
+        ]
+    lines += [
+        "# HELP http_requests_total Requests by route and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for key in sorted(snapshot["statuses"]):
+        endpoint, method, status = key.split("|")
+        lines.append(
+            f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} "
+            f"{snapshot['statuses'][key]}"
+        )
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being served.",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    for endpoint in sorted(snapshot["in_flight"]):
+        lines.append(f"http_requests_in_flight{_labels(endpoint=endpoint)} {snapshot['in_flight'][endpoint]}")
+    return "\n".join(lines) + "\n"
+
+
+class MultiProcessStore:
+    """Shares registry snapshots through per-pid JSON files in one directory."""
+
+    def __init__(self, directory, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = str(directory)
+        self.flush_interval = flush_interval
+        self.stale_after = STALE_FLUSHES * max(flush_interval, DEFAULT_FLUSH_INTERVAL)
+        self._last_flush = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, pid) -> str:
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self, registry: MetricsRegistry, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        path = self.path_for(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(registry.to_dict(), f)
+        os.replace(tmp, path)  # readers never see a partial file
+
+    def collect(self, registry: MetricsRegistry) -> dict:
+        """Merge every worker's snapshot, using live counters for this process."""
+        snapshots = [registry.to_dict()]
+        own = self.path_for(os.getpid())
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            if path == own:
+                continue
+            try:
+                age = time.time() - os.path.getmtime(path)
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if age > self.stale_after:
+                # No signal-based liveness probe: on Windows os.kill(pid, 0)
+                # terminates the process. Counters stay; a stale worker serves nothing.
+                snap["in_flight"] = {}
+            snapshots.append(snap)
+        return merge_snapshots(snapshots)
+
+
+def get_metrics(app=None) -> MetricsRegistry:
+    """Return the metrics registry for `app` (default: current_app), creating it lazily."""
+    app = app or current_app._get_current_object()
+    registry = app.extensions.get("metrics")
+    if registry is None:
+        registry = app.extensions.setdefault(
+            "metrics", MetricsRegistry(app.config.get("METRICS_BUCKETS", DEFAULT_BUCKETS))
+        )
+    return registry
+
+
+def _endpoint_label() -> str:
+    return request.endpoint or "unmatched"
+
+
+def init_metrics(app):
+    """Register request hooks and the /metrics endpoint when METRICS_ENABLED is set."""
+    if not app.config.get("METRICS_ENABLED"):
+        return
+    registry = get_metrics(app)
+    store = None
+    if app.config.get("METRICS_DIR"):
+        store = MultiProcessStore(
+            app.config["METRICS_DIR"],
+            app.config.get("METRICS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL),
+        )
+        app.extensions["metrics_store"] = store
+
+    @app.before_request
+    def _metrics_start():
+        if request.endpoint == "metrics":
+            return
+        g.metrics_started = time.perf_counter()
+        registry.start(_endpoint_label())
+
+    @app.after_request
+    def _metrics_observe(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        profile = g.get("sql_profile")
+        registry.observe(
+            request.blueprint or "app",
+            _endpoint_label(),
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            profile.sql_time if profile is not None else 0.0,
+        )
+        g.metrics_finished = True
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc=None):
+        if request.endpoint == "metrics":
+            return
+        finished = g.pop("metrics_finished", False)
+        started = g.pop("metrics_started", None)
+        if not finished and started is None:
+            return  # _metrics_start never ran for this request
+        registry.finish(_endpoint_label())
+        if store is not None:
+            store.flush(registry)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        snapshot = store.collect(registry) if store is not None else registry.to_dict()
+        db_time = bool(app.config.get("METRICS_DB_TIME"))
+        return Response(render_prometheus(snapshot, db_time), mimetype="text/plain; version=0.0.4")
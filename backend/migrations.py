@@ -0,0 +1,535 @@
+"""
+migrations.py
+-------------
+Versioned, in-place schema upgrades for the SQLite database.
+
+Each migration is a (version, name, function) entry in MIGRATIONS. The runner
+applies every migration newer than the database's recorded version inside a
+BEGIN IMMEDIATE transaction, logs it in `schema_migrations`, and mirrors the
+latest version into PRAGMA user_version so startup can skip the work cheaply.
+"""
+import sqlite3
+
+
+def split_statements(script: str) -> list[str]:
+    """Split an SQL script into complete statements (trigger bodies stay intact)."""
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip().strip(";").strip():
+                statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+
+def run_script(conn: sqlite3.Connection, script: str):
+    """Execute a script statement by statement so it stays inside the open transaction."""
+    for statement in split_statements(script):
+        conn.execute(statement)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def create_indexes(conn: sqlite3.Connection, indexes):
+    """
+    Create (name, table, columns) indexes, skipping any whose columns are
+    missing. Older databases built from db/schema.sql use a different
+    `orders` layout, and their upgrade must not fail on it.
+    """
+    for name, table, columns in indexes:
+        existing = table_columns(conn, table)
+        wanted = [c.split()[0] for c in columns]
+        if not existing.issuperset(wanted):
+            continue
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        )
+
+
+# ============================
+# MIGRATIONS
+# ============================
+
+def _baseline_tables(conn):
+    """Make sure every table from init_db exists (no-op on existing databases)."""
+    from .init_db import ALL_TABLES_SQL
+    run_script(conn, ALL_TABLES_SQL)
+
+
+CATALOG_INDEXES = [
+    # list_products: WHERE is_active = 1 [AND category = ?] ORDER BY created_at DESC
+    ("idx_products_active_created", "products", ["is_active", "created_at DESC", "id DESC"]),
+    ("idx_products_active_category_created", "products",
+     ["is_active", "category", "created_at DESC", "id DESC"]),
+    # vendor_overview / update_vendor_product: WHERE vendor_id = ? ORDER BY created_at DESC
+    ("idx_products_vendor_created", "products", ["vendor_id", "created_at DESC"]),
+    # Rating aggregates (covering: no table lookup for AVG/COUNT)
+    ("idx_reviews_product_rating", "reviews", ["product_id", "rating"]),
+    # get_product review list: WHERE product_id = ? ORDER BY created_at DESC
+    ("idx_reviews_product_created", "reviews", ["product_id", "created_at DESC"]),
+    # list_orders: WHERE user_id = ? ORDER BY created_at DESC
+    ("idx_orders_user_created", "orders", ["user_id", "created_at DESC"]),
+    # Vendor on-order totals filter open orders by status
+    ("idx_orders_status", "orders", ["status"]),
+    # Order item lookups by order, plus a covering index for per-product sums
+    ("idx_order_items_order", "order_items", ["order_id"]),
+    ("idx_order_items_product", "order_items", ["product_id", "order_id", "quantity"]),
+]
+
+
+def _catalog_indexes(conn):
+    create_indexes(conn, CATALOG_INDEXES)
+
+
+PRODUCT_SEARCH_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, description, category,
+    content='products', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, name, description, category)
+    VALUES (new.id, new.name, new.description, new.category);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, name, description, category)
+    VALUES ('delete', old.id, old.name, old.description, old.category);
+END;
+
+-- Only text edits touch the index; stock/price updates skip it.
+CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description, category ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, name, description, category)
+    VALUES ('delete', old.id, old.name, old.description, old.category);
+    INSERT INTO products_fts (rowid, name, description, category)
+    VALUES (new.id, new.name, new.description, new.category);
+END;
+
+-- The hidden `rank` column becomes BM25 with name > category > description.
+INSERT INTO products_fts (products_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)');
+
+-- Index the rows that already exist.
+INSERT INTO products_fts (products_fts) VALUES ('rebuild');
+"""
+
+
+def _product_search(conn):
+    run_script(conn, PRODUCT_SEARCH_SQL)
+
+
+PRODUCT_STATS_SQL = """
+CREATE TABLE IF NOT EXISTS product_stats (
+    product_id INTEGER PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_1 INTEGER NOT NULL DEFAULT 0,
+    rating_2 INTEGER NOT NULL DEFAULT 0,
+    rating_3 INTEGER NOT NULL DEFAULT 0,
+    rating_4 INTEGER NOT NULL DEFAULT 0,
+    rating_5 INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+
+CREATE TRIGGER IF NOT EXISTS product_stats_review_ai AFTER INSERT ON reviews BEGIN
+    INSERT INTO product_stats
+        (product_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    VALUES
+        (new.product_id, 1, new.rating, new.rating = 1, new.rating = 2,
+         new.rating = 3, new.rating = 4, new.rating = 5)
+    ON CONFLICT(product_id) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_1 = rating_1 + excluded.rating_1,
+        rating_2 = rating_2 + excluded.rating_2,
+        rating_3 = rating_3 + excluded.rating_3,
+        rating_4 = rating_4 + excluded.rating_4,
+        rating_5 = rating_5 + excluded.rating_5;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_review_ad AFTER DELETE ON reviews BEGIN
+    UPDATE product_stats SET
+        review_count = review_count - 1,
+        rating_sum = rating_sum - old.rating,
+        rating_1 = rating_1 - (old.rating = 1),
+        rating_2 = rating_2 - (old.rating = 2),
+        rating_3 = rating_3 - (old.rating = 3),
+        rating_4 = rating_4 - (old.rating = 4),
+        rating_5 = rating_5 - (old.rating = 5)
+    WHERE product_id = old.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_review_au AFTER UPDATE OF rating, product_id ON reviews BEGIN
+    UPDATE product_stats SET
+        review_count = review_count - 1,
+        rating_sum = rating_sum - old.rating,
+        rating_1 = rating_1 - (old.rating = 1),
+        rating_2 = rating_2 - (old.rating = 2),
+        rating_3 = rating_3 - (old.rating = 3),
+        rating_4 = rating_4 - (old.rating = 4),
+        rating_5 = rating_5 - (old.rating = 5)
+    WHERE product_id = old.product_id;
+    INSERT INTO product_stats
+        (product_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+    VALUES
+        (new.product_id, 1, new.rating, new.rating = 1, new.rating = 2,
+         new.rating = 3, new.rating = 4, new.rating = 5)
+    ON CONFLICT(product_id) DO UPDATE SET
+        review_count = review_count + 1,
+        rating_sum = rating_sum + excluded.rating_sum,
+        rating_1 = rating_1 + excluded.rating_1,
+        rating_2 = rating_2 + excluded.rating_2,
+        rating_3 = rating_3 + excluded.rating_3,
+        rating_4 = rating_4 + excluded.rating_4,
+        rating_5 = rating_5 + excluded.rating_5;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_product_ad AFTER DELETE ON products BEGIN
+    DELETE FROM product_stats WHERE product_id = old.id;
+END;
+
+-- Backfill from the reviews already on file.
+INSERT OR REPLACE INTO product_stats
+    (product_id, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+SELECT product_id, COUNT(*), SUM(rating),
+       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+FROM reviews
+GROUP BY product_id;
+"""
+
+
+def _product_stats(conn):
+    run_script(conn, PRODUCT_STATS_SQL)
+
+
+CACHE_GENERATION_SQL = """
+-- Single-row change counter shared by every worker process. Any write that
+-- can change a catalog response bumps it (see cache.check_cache_coherency).
+CREATE TABLE IF NOT EXISTS cache_generation (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cache_generation (id, generation) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_products_ai AFTER INSERT ON products BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_products_au AFTER UPDATE ON products BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_products_ad AFTER DELETE ON products BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_reviews_ai AFTER INSERT ON reviews BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_reviews_au AFTER UPDATE ON reviews BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cache_generation_reviews_ad AFTER DELETE ON reviews BEGIN
+    UPDATE cache_generation SET generation = generation + 1 WHERE id = 1;
+END;
+"""
+
+
+def _cache_generation(conn):
+    run_script(conn, CACHE_GENERATION_SQL)
+
+
+IDEMPOTENCY_KEYS_SQL = """
+-- Stored responses for POST /api/orders retries (Idempotency-Key header)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    request_hash TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    response_body TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at);
+"""
+
+
+def _idempotency_keys(conn):
+    run_script(conn, IDEMPOTENCY_KEYS_SQL)
+
+
+def _user_token_version(conn):
+    # Bumped to revoke a user's signed tokens (secruity.revoke_user_tokens)
+    if "token_version" not in table_columns(conn, "users"):
+        conn.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+
+
+def _session_expiry_index(conn):
+    # Lets housekeeping.purge_expired_sessions find expired rows without a scan
+    create_indexes(conn, [("idx_sessions_expires", "sessions", ["expires_at"])])
+
+
+VENDOR_STATS_SQL = """
+-- Per-vendor dashboard rollup (see vendor_dashboard.vendor_overview).
+-- "On order" means order_items of orders still placed/processing/shipped.
+CREATE TABLE IF NOT EXISTS vendor_stats (
+    vendor_id INTEGER PRIMARY KEY,
+    total_products INTEGER NOT NULL DEFAULT 0,
+    low_stock_count INTEGER NOT NULL DEFAULT 0,
+    on_order_total INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from the orders and products already on file.
+INSERT INTO product_stats (product_id, on_order_qty)
+SELECT oi.product_id, SUM(oi.quantity)
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+WHERE o.status IN ('placed', 'processing', 'shipped')
+GROUP BY oi.product_id
+ON CONFLICT(product_id) DO UPDATE SET on_order_qty = excluded.on_order_qty;
+
+INSERT OR REPLACE INTO vendor_stats (vendor_id, total_products, low_stock_count, on_order_total)
+SELECT p.vendor_id,
+       COUNT(*),
+       SUM(COALESCE(p.stock, 0) <= COALESCE(p.low_stock_threshold, 0)
+           AND COALESCE(p.low_stock_threshold, 0) > 0),
+       COALESCE(SUM(ps.on_order_qty), 0)
+FROM products p
+LEFT JOIN product_stats ps ON ps.product_id = p.id
+WHERE p.vendor_id IS NOT NULL
+GROUP BY p.vendor_id;
+
+-- product_stats.on_order_qty follows order placement and status changes
+CREATE TRIGGER IF NOT EXISTS product_stats_order_item_ai AFTER INSERT ON order_items
+WHEN (SELECT status FROM orders WHERE id = new.order_id) IN ('placed', 'processing', 'shipped')
+BEGIN
+    INSERT INTO product_stats (product_id, on_order_qty) VALUES (new.product_id, new.quantity)
+    ON CONFLICT(product_id) DO UPDATE SET on_order_qty = on_order_qty + excluded.on_order_qty;
+END;
+
+-- A cascaded delete no longer sees its order; orders_bd below covers that case.
+CREATE TRIGGER IF NOT EXISTS product_stats_order_item_ad AFTER DELETE ON order_items
+WHEN (SELECT status FROM orders WHERE id = old.order_id) IN ('placed', 'processing', 'shipped')
+BEGIN
+    UPDATE product_stats SET on_order_qty = on_order_qty - old.quantity
+    WHERE product_id = old.product_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_order_item_au AFTER UPDATE OF quantity, product_id ON order_items
+WHEN (SELECT status FROM orders WHERE id = new.order_id) IN ('placed', 'processing', 'shipped')
+BEGIN
+    UPDATE product_stats SET on_order_qty = on_order_qty - old.quantity
+    WHERE product_id = old.product_id;
+    INSERT INTO product_stats (product_id, on_order_qty) VALUES (new.product_id, new.quantity)
+    ON CONFLICT(product_id) DO UPDATE SET on_order_qty = on_order_qty + excluded.on_order_qty;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_order_closed AFTER UPDATE OF status ON orders
+WHEN old.status IN ('placed', 'processing', 'shipped')
+ AND new.status NOT IN ('placed', 'processing', 'shipped')
+BEGIN
+    UPDATE product_stats SET on_order_qty = on_order_qty - (
+        SELECT SUM(quantity) FROM order_items
+        WHERE order_id = new.id AND product_id = product_stats.product_id
+    )
+    WHERE product_id IN (SELECT product_id FROM order_items WHERE order_id = new.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_order_reopened AFTER UPDATE OF status ON orders
+WHEN old.status NOT IN ('placed', 'processing', 'shipped')
+ AND new.status IN ('placed', 'processing', 'shipped')
+BEGIN
+    INSERT INTO product_stats (product_id, on_order_qty)
+    SELECT product_id, SUM(quantity) FROM order_items WHERE order_id = new.id GROUP BY product_id
+    ON CONFLICT(product_id) DO UPDATE SET on_order_qty = on_order_qty + excluded.on_order_qty;
+END;
+
+CREATE TRIGGER IF NOT EXISTS product_stats_orders_bd BEFORE DELETE ON orders
+WHEN old.status IN ('placed', 'processing', 'shipped')
+BEGIN
+    UPDATE product_stats SET on_order_qty = on_order_qty - (
+        SELECT SUM(quantity) FROM order_items
+        WHERE order_id = old.id AND product_id = product_stats.product_id
+    )
+    WHERE product_id IN (SELECT product_id FROM order_items WHERE order_id = old.id);
+END;
+
+-- vendor_stats follows product_stats.on_order_qty ...
+CREATE TRIGGER IF NOT EXISTS vendor_stats_product_stats_ai AFTER INSERT ON product_stats BEGIN
+    UPDATE vendor_stats SET on_order_total = on_order_total + new.on_order_qty
+    WHERE vendor_id = (SELECT vendor_id FROM products WHERE id = new.product_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS vendor_stats_product_stats_au AFTER UPDATE OF on_order_qty ON product_stats BEGIN
+    UPDATE vendor_stats SET on_order_total = on_order_total + new.on_order_qty - old.on_order_qty
+    WHERE vendor_id = (SELECT vendor_id FROM products WHERE id = new.product_id);
+END;
+
+-- ... and product inserts, stock / threshold changes and vendor moves
+CREATE TRIGGER IF NOT EXISTS vendor_stats_products_ai AFTER INSERT ON products
+WHEN new.vendor_id IS NOT NULL
+BEGIN
+    INSERT INTO vendor_stats (vendor_id, total_products, low_stock_count)
+    VALUES (new.vendor_id, 1,
+            COALESCE(new.stock, 0) <= COALESCE(new.low_stock_threshold, 0)
+            AND COALESCE(new.low_stock_threshold, 0) > 0)
+    ON CONFLICT(vendor_id) DO UPDATE SET
+        total_products = total_products + 1,
+        low_stock_count = low_stock_count + excluded.low_stock_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS vendor_stats_products_au
+AFTER UPDATE OF stock, low_stock_threshold, vendor_id ON products
+BEGIN
+    UPDATE vendor_stats SET
+        total_products = total_products - 1,
+        low_stock_count = low_stock_count - (
+            COALESCE(old.stock, 0) <= COALESCE(old.low_stock_threshold, 0)
+            AND COALESCE(old.low_stock_threshold, 0) > 0),
+        on_order_total = on_order_total
+            - COALESCE((SELECT on_order_qty FROM product_stats WHERE product_id = old.id), 0)
+    WHERE vendor_id = old.vendor_id;
+    INSERT INTO vendor_stats (vendor_id, total_products, low_stock_count, on_order_total)
+    SELECT new.vendor_id, 1,
+           COALESCE(new.stock, 0) <= COALESCE(new.low_stock_threshold, 0)
+           AND COALESCE(new.low_stock_threshold, 0) > 0,
+           COALESCE((SELECT on_order_qty FROM product_stats WHERE product_id = new.id), 0)
+    WHERE new.vendor_id IS NOT NULL
+    ON CONFLICT(vendor_id) DO UPDATE SET
+        total_products = total_products + 1,
+        low_stock_count = low_stock_count + excluded.low_stock_count,
+        on_order_total = on_order_total + excluded.on_order_total;
+END;
+
+-- Deletes are rare; recount the vendor's remaining products rather than
+-- depend on the order in which the products AFTER DELETE triggers run.
+CREATE TRIGGER IF NOT EXISTS vendor_stats_products_ad AFTER DELETE ON products
+WHEN old.vendor_id IS NOT NULL
+BEGIN
+    UPDATE vendor_stats SET
+        total_products = total_products - 1,
+        low_stock_count = low_stock_count - (
+            COALESCE(old.stock, 0) <= COALESCE(old.low_stock_threshold, 0)
+            AND COALESCE(old.low_stock_threshold, 0) > 0),
+        on_order_total = (
+            SELECT COALESCE(SUM(ps.on_order_qty), 0)
+            FROM products p JOIN product_stats ps ON ps.product_id = p.id
+            WHERE p.vendor_id = old.vendor_id
+        )
+    WHERE vendor_id = old.vendor_id;
+END;
+"""
+
+
+def _vendor_stats(conn):
+    if "on_order_qty" not in table_columns(conn, "product_stats"):
+        conn.execute(
+            "ALTER TABLE product_stats ADD COLUMN on_order_qty INTEGER NOT NULL DEFAULT 0"
+        )
+    run_script(conn, VENDOR_STATS_SQL)
+
+
+STOCK_FORECASTS_SQL = """
+-- Written by forecast.refresh_stock_forecasts (batch job), read by vendor_overview
+CREATE TABLE IF NOT EXISTS stock_forecasts (
+    product_id INTEGER PRIMARY KEY,
+    daily_velocity REAL NOT NULL DEFAULT 0,   -- EWMA units sold per day
+    days_until_stockout REAL,                 -- at computed_at; NULL if not selling
+    computed_at TIMESTAMP NOT NULL,
+    FOREIGN KEY(product_id) REFERENCES products(id) ON DELETE CASCADE
+);
+"""
+
+
+def _stock_forecasts(conn):
+    run_script(conn, STOCK_FORECASTS_SQL)
+
+
+def _cache_generation_epoch(conn):
+    # Random per-database value mixed into catalog ETags: a rebuilt database
+    # restarts the generation counter, and must not match ETags of the old one
+    if "epoch" not in table_columns(conn, "cache_generation"):
+        conn.execute("ALTER TABLE cache_generation ADD COLUMN epoch TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE cache_generation SET epoch = lower(hex(randomblob(8))) WHERE id = 1")
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _baseline_tables),
+    (2, "catalog secondary indexes", _catalog_indexes),
+    (3, "products_fts full-text search", _product_search),
+    (4, "product_stats rating aggregates", _product_stats),
+    (5, "cache_generation change counter", _cache_generation),
+    (6, "idempotency_keys for order retries", _idempotency_keys),
+    (7, "users.token_version for signed tokens", _user_token_version),
+    (8, "sessions.expires_at index for the sweeper", _session_expiry_index),
+    (9, "vendor_stats and product_stats.on_order_qty rollups", _vendor_stats),
+    (10, "stock_forecasts for stockout projections", _stock_forecasts),
+    (11, "cache_generation.epoch for catalog ETags", _cache_generation_epoch),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ============================
+# RUNNER
+# ============================
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> list[int]:
+    """
+    Upgrade the database to LATEST_VERSION in place.
+    Returns the versions applied by this call (empty if already current).
+    """
+    if current_version(conn) >= LATEST_VERSION:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers
+        # starting at the same time apply each migration exactly once.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = ?", (version,)
+            ).fetchone()
+            if not done:
+                migrate(conn)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                    (version, name),
+                )
+                applied.append(version)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return applied
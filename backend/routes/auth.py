@@ -189,32 +189,60 @@ auth.py
 Authentication routes (register, login, etc.)
 """
 from flask import Blueprint, request, jsonify, g
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import uuid
 import sqlite3
 from ..db_utils import get_db
+from ..hashing import (
+    HashingUnavailable,
+    check_login_rate,
+    hash_password,
+    refund_login_rate,
+    verify_password,
+)
+from ..write_queue import get_session_queue, run_write
+from ..secruity import (
+    login_required,
+    invalidate_session,
+    issue_signed_token,
+    revoke_signed_token,
+    signed_tokens_enabled,
+    SIGNED_TOKEN_PREFIX,
+)
 
 auth_bp = Blueprint("auth_bp", __name__)
 TOKEN_EXPIRY_DAYS = 7 
 
+def _insert_session(conn, user_id, token, expires_at):
+    conn.execute(
+        """INSERT INTO sessions (user_id, token, expires_at)
+        VALUES (?, ?, ?)""",
+        (user_id, token, expires_at),
+    )
+
 def create_session_token(user_id: int) -> str:
     """Generates a unique token and saves it to the 'sessions' table (T2)."""
-    conn = get_db()
     token = uuid.uuid4().hex
     expires_at = datetime.now() + timedelta(days=TOKEN_EXPIRY_DAYS)
     
     try:
-        conn.execute(
-            """INSERT INTO sessions (user_id, token, expires_at)
-            VALUES (?, ?, ?)""",
-            (user_id, token, expires_at.isoformat()),
-        )
-        conn.commit()
+        # Returns once the session row is committed, batched with concurrent logins if enabled
+        session_queue = get_session_queue()
+        if session_queue is not None:
+            session_queue.run(_insert_session, user_id, token, expires_at.isoformat())
+        else:
+            run_write(_insert_session, user_id, token, expires_at.isoformat())
         return token
     except sqlite3.Error:
         return None
 
+def _unavailable(e: HashingUnavailable):
+    """429 (rate limited) or 503 (hashing pool saturated), returned without waiting."""
+    response = jsonify({"error": e.message})
+    response.status_code = e.status_code
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
 # --- /api/register ---
 @auth_bp.route("/register", methods=["POST"])
 def register():
@@ -232,7 +260,12 @@ def register():
         return jsonify({"error": "Role must be customer, vendor, or admin"}), 400
 
     # NOTE: Using a strong hashing function is critical here.
-    password_hash = generate_password_hash(password)
+    # It is deliberately slow, so it runs in the bounded hashing pool.
+    try:
+        check_login_rate(None, request.remote_addr)
+        password_hash = hash_password(password)
+    except HashingUnavailable as e:
+        return _unavailable(e)
 
     conn = get_db()
     try:
@@ -244,7 +277,8 @@ def register():
         conn.commit()
     except sqlite3.IntegrityError:
         return jsonify({"error": "Email already exists"}), 409
-    
+    refund_login_rate(None, request.remote_addr)  # only failed attempts count
+
     return jsonify({"message": "User registered successfully"}), 201
 
 # --- /api/login ---
@@ -257,22 +291,57 @@ def login():
     email = (data.get("email") or "").strip().lower()
     password = data.get("password") or ""
 
+    try:
+        check_login_rate(email, request.remote_addr)
+    except HashingUnavailable as e:
+        return _unavailable(e)
+
     conn = get_db()
     row = conn.execute(
-        "SELECT id, email, password_hash, role, status FROM users WHERE email = ?",
+        "SELECT id, email, password_hash, role, status, token_version FROM users WHERE email = ?",
         (email,),
     ).fetchone()
+    if not row:
+        return jsonify({"error": "Invalid credentials"}), 401
 
-    if not row or not check_password_hash(row["password_hash"], password):
+    try:
+        valid = verify_password(row["password_hash"], password)
+    except HashingUnavailable as e:
+        return _unavailable(e)
+    if not valid:
         return jsonify({"error": "Invalid credentials"}), 401
+    refund_login_rate(email, request.remote_addr)  # only failed attempts count
 
     if row["status"] == 'suspended': # AD-5 Check
         return jsonify({"error": "Account suspended. Contact support."}), 403
 
-    # T2: Session Creation
-    token = create_session_token(row["id"])
+    # T2: Session Creation (or a stateless signed token, if enabled)
+    if signed_tokens_enabled():
+        token = issue_signed_token(row)
+    else:
+        token = create_session_token(row["id"])
+        if token is None:
+            response = jsonify({"error": "Could not create a session, please retry"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "1"
+            return response
 
     return jsonify({
         "token": token,
         "user": { "id": row["id"], "email": row["email"], "role": row["role"], "status": row["status"] },
     }), 200
+
+
+@auth_bp.route("/logout", methods=["POST"])
+@login_required
+def logout():
+    token = request.headers["Authorization"].split(" ", 1)[1]
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        revoke_signed_token(token)
+        return jsonify({"message": "Logged out"}), 200
+
+    conn = get_db()
+    conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
+    conn.commit()
+    invalidate_session(token)
+    return jsonify({"message": "Logged out"}), 200
@@ -1,11 +1,17 @@
 # backend/routes/orders.py
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from datetime import datetime, timedelta
+import hashlib
+import json
 from backend.db_utils import get_db
 from backend.models import get_current_user
+from backend.cache import bump_catalog_version
 
 orders_bp = Blueprint("orders", __name__)
 
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
 
 def row_to_order(row, items):
     """Convert an order row + its items into a JSON-serializable dict."""
@@ -20,6 +26,58 @@ def row_to_order(row, items):
     }
 
 
+def _load_order(db, order_id):
+    """Fetch an order and its items as the JSON shape returned by create_order."""
+    cur = db.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
+    order_row = cur.fetchone()
+
+    cur = db.execute(
+        """
+        SELECT oi.id, oi.product_id, oi.quantity, oi.price_at_purchase, p.name
+        FROM order_items oi
+        JOIN products p ON p.id = oi.product_id
+        WHERE oi.order_id = ?
+        """,
+        (order_id,),
+    )
+    item_rows = [
+        {
+            "id": r["id"],
+            "product_id": r["product_id"],
+            "quantity": r["quantity"],
+            "price": r["price_at_purchase"],
+            "name": r["name"],
+        }
+        for r in cur.fetchall()
+    ]
+    return row_to_order(order_row, item_rows)
+
+
+def _find_idempotent_response(db, user_id, key, now):
+    """Return the stored (request_hash, status_code, body) for an unexpired key, or None."""
+    return db.execute(
+        """
+        SELECT request_hash, status_code, response_body
+        FROM idempotency_keys
+        WHERE user_id = ? AND key = ? AND expires_at > ?
+        """,
+        (user_id, key, now),
+    ).fetchone()
+
+
+def _replay(stored, request_hash):
+    """Answer a retried request from its stored response."""
+    if stored["request_hash"] != request_hash:
+        return jsonify(
+            {"error": "Idempotency-Key was already used with a different request"}
+        ), 422
+    response = current_app.response_class(
+        stored["response_body"], status=stored["status_code"], mimetype="application/json"
+    )
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
 @orders_bp.route("/orders", methods=["POST"])
 def create_order():
     """
@@ -31,6 +89,9 @@ def create_order():
         {"product_id": 3, "quantity": 1}
       ]
     }
+
+    Clients may send an Idempotency-Key header. A retry with the same key
+    and body gets the original response back without placing a new order.
     """
     db = get_db()
     payload = request.get_json() or {}
@@ -43,89 +104,126 @@ def create_order():
     if not user:
         return jsonify({"error": "Authentication required"}), 401
 
-    # Fetch current product data for price + stock checks
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({"error": "Invalid Idempotency-Key"}), 400
+    request_hash = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    now = datetime.now()
+
+    if idempotency_key:
+        stored = _find_idempotent_response(db, user["id"], idempotency_key, now.isoformat())
+        if stored:
+            return _replay(stored, request_hash)
+
     product_ids = [i.get("product_id") for i in items]
     if not all(product_ids):
         return jsonify({"error": "Invalid product IDs"}), 400
 
-    placeholders = ",".join("?" for _ in product_ids)
-    cur = db.execute(
-        f"SELECT id, name, price, stock FROM products WHERE id IN ({placeholders})",
-        product_ids,
-    )
-    product_rows = {row["id"]: row for row in cur.fetchall()}
+    # Merge repeated lines so each product is checked against its total quantity
+    quantities = {}
+    first_line = {}
+    for item in items:
+        try:
+            qty = int(item.get("quantity", 0))
+        except (TypeError, ValueError):
+            qty = 0
+        if qty <= 0:
+            return jsonify({"error": f"Invalid item {item}"}), 400
+        pid = item["product_id"]
+        quantities[pid] = quantities.get(pid, 0) + qty
+        first_line.setdefault(pid, item)
 
-    order_items_to_insert = []
-    total_amount = 0.0
+    # Everything from the stock check to the stock decrement runs in one
+    # BEGIN IMMEDIATE transaction: the write lock is taken up front, so two
+    # checkouts can never both pass the check for the last unit.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if idempotency_key:
+            # A concurrent retry may have committed while we waited for the lock
+            stored = _find_idempotent_response(db, user["id"], idempotency_key, now.isoformat())
+            if stored:
+                db.rollback()
+                return _replay(stored, request_hash)
 
-    for item in items:
-        pid = item.get("product_id")
-        qty = int(item.get("quantity", 0))
+        placeholders = ",".join("?" for _ in quantities)
+        cur = db.execute(
+            f"SELECT id, name, price, stock FROM products WHERE id IN ({placeholders})",
+            list(quantities),
+        )
+        product_rows = {row["id"]: row for row in cur.fetchall()}
 
-        if qty <= 0 or pid not in product_rows:
-            return jsonify({"error": f"Invalid item {item}"}), 400
+        order_items_to_insert = []
+        total_amount = 0.0
 
-        product = product_rows[pid]
-        if product["stock"] < qty:
-            return jsonify(
-                {"error": f"Insufficient stock for product {product['name']}"}
-            ), 400
+        for pid, qty in quantities.items():
+            if pid not in product_rows:
+                db.rollback()
+                return jsonify({"error": f"Invalid item {first_line[pid]}"}), 400
 
-        price = float(product["price"])
-        line_total = price * qty
-        total_amount += line_total
+            product = product_rows[pid]
+            if product["stock"] < qty:
+                db.rollback()
+                return jsonify(
+                    {"error": f"Insufficient stock for product {product['name']}"}
+                ), 400
 
-        order_items_to_insert.append((pid, qty, price))
+            price = float(product["price"])
+            total_amount += price * qty
+            order_items_to_insert.append((pid, qty, price))
 
-    # Create order: IMPORTANT -> total_amount is NOT NULL, status must match CHECK
-    cur = db.execute(
-        "INSERT INTO orders (user_id, total_amount, status) VALUES (?, ?, ?)",
-        (user["id"], total_amount, "placed"),  # status in lowercase to match CHECK
-    )
-    order_id = cur.lastrowid
+        # Create order: IMPORTANT -> total_amount is NOT NULL, status must match CHECK
+        cur = db.execute(
+            "INSERT INTO orders (user_id, total_amount, status) VALUES (?, ?, ?)",
+            (user["id"], total_amount, "placed"),  # status in lowercase to match CHECK
+        )
+        order_id = cur.lastrowid
 
-    # Insert order_items and update product stock
-    for pid, qty, price_at_purchase in order_items_to_insert:
-        db.execute(
+        db.executemany(
             """
             INSERT INTO order_items (order_id, product_id, quantity, price_at_purchase)
             VALUES (?, ?, ?, ?)
             """,
-            (order_id, pid, qty, price_at_purchase),
+            [(order_id, pid, qty, price) for pid, qty, price in order_items_to_insert],
         )
-        db.execute(
-            "UPDATE products SET stock = stock - ? WHERE id = ?",
-            (qty, pid),
+
+        # Conditional decrement: a row only changes if it still has enough stock
+        cur = db.executemany(
+            "UPDATE products SET stock = stock - ? WHERE id = ? AND stock >= ?",
+            [(qty, pid, qty) for pid, qty, _ in order_items_to_insert],
         )
+        if cur.rowcount != len(order_items_to_insert):
+            db.rollback()
+            return jsonify({"error": "Insufficient stock to complete the order"}), 409
 
-    db.commit()
+        body = current_app.json.dumps({"order": _load_order(db, order_id)})
 
-    # Fetch the created order
-    cur = db.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
-    order_row = cur.fetchone()
+        if idempotency_key:
+            # Stored in the same transaction as the order, so a key exists
+            # if and only if its order does. Expired keys are purged here.
+            ttl = timedelta(hours=current_app.config.get("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+            db.execute(
+                "DELETE FROM idempotency_keys WHERE expires_at <= ?", (now.isoformat(),)
+            )
+            db.execute(
+                """
+                INSERT INTO idempotency_keys
+                    (key, user_id, request_hash, status_code, response_body, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (idempotency_key, user["id"], request_hash, 201, body,
+                 (now + ttl).isoformat()),
+            )
 
-    # Fetch its items
-    cur = db.execute(
-        """
-        SELECT oi.id, oi.product_id, oi.quantity, oi.price_at_purchase, p.name
-        FROM order_items oi
-        JOIN products p ON p.id = oi.product_id
-        WHERE oi.order_id = ?
-        """,
-        (order_id,),
-    )
-    item_rows = [
-        {
-            "id": r["id"],
-            "product_id": r["product_id"],
-            "quantity": r["quantity"],
-            "price": r["price_at_purchase"],
-            "name": r["name"],
-        }
-        for r in cur.fetchall()
-    ]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    bump_catalog_version()  # stock levels changed
 
-    return jsonify({"order": row_to_order(order_row, item_rows)}), 201
+    return current_app.response_class(body, status=201, mimetype="application/json")
 
 
 @orders_bp.route("/orders", methods=["GET"])
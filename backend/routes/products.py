@@ -577,68 +577,235 @@ products.py
 ------------
 Product CRUD, Listing, Filtering (T7), and Reviews (VR-3).
 """
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, current_app
+import base64
+import hashlib
+import json
+import re
 import sqlite3
 from ..db_utils import get_db, rows_to_dicts
 from ..secruity import vendor_required, login_required
+from ..cache import get_catalog_cache, bump_catalog_version, check_cache_coherency, get_cache_epoch
+from ..write_queue import run_write
 
 products_bp = Blueprint("products", __name__)
 
 # --- Helper to select core product fields ---
 PRODUCT_FIELDS = "p.id, p.name, p.price, p.description, p.category, p.stock, p.low_stock_threshold, p.image_url, p.vendor_id, p.is_active, p.created_at"
 
+# Rating aggregates read from product_stats (maintained by triggers on reviews)
+RATING_FIELDS = """
+    COALESCE(ps.rating_sum * 1.0 / NULLIF(ps.review_count, 0), 0) AS avg_rating,
+    COALESCE(ps.review_count, 0) AS review_count
+"""
+
+# --- Pagination (keyset, never OFFSET) ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _fts_query(search: str) -> str:
+    """
+    Turn free-text input into a safe FTS5 MATCH expression: every word becomes
+    a quoted prefix term ("yoga"* "mat"*), so user input can never inject FTS
+    operators and partial words still match as they type.
+    """
+    terms = re.findall(r"\w+", search)
+    return " ".join('"{}"*'.format(t.replace('"', '""')) for t in terms)
+
+def _encode_cursor(mode: str, key: list) -> str:
+    """Opaque cursor: URL-safe base64 of the last row's sort key."""
+    raw = json.dumps({"m": mode, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, mode: str) -> list:
+    """Return the sort key stored in `cursor`; raises ValueError if it is malformed or from another ordering."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key = data["k"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if data.get("m") != mode or not isinstance(key, list) or len(key) != 2:
+        raise ValueError("Invalid cursor")
+    # (rank, id) when searching, else (created_at, id); anything else would
+    # reach the query as a bad parameter
+    position, last_id = key
+    position_types = (int, float) if mode == "search" else (str,)
+    if (not isinstance(position, position_types) or isinstance(position, bool)
+            or not isinstance(last_id, int) or isinstance(last_id, bool)):
+        raise ValueError("Invalid cursor")
+    return key
+
+def _catalog_etag(generation, cache_key) -> str:
+    """
+    Strong ETag for a catalog read: changes whenever the shared catalog
+    generation does, and differs between databases (or restores of one).
+    """
+    raw = f"{get_cache_epoch()}:{generation}:{cache_key!r}".encode()
+    return hashlib.sha1(raw).hexdigest()
+
+def _not_modified(etag: str):
+    """Return a bodiless 304 if the client already holds `etag`, else None."""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = current_app.config.get("CATALOG_CACHE_CONTROL", "public, no-cache")
+    return response
+
+def _cached_json(body: str, cache_status: str, etag: str):
+    """Build a 200 JSON response from a pre-serialized (cacheable) body."""
+    response = current_app.response_class(body, mimetype="application/json")
+    response.headers["X-Cache"] = cache_status
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = current_app.config.get("CATALOG_CACHE_CONTROL", "public, no-cache")
+    return response
+
 # --- GET /api/products (Listing & Filtering - T7) ---
 @products_bp.route("/products", methods=["GET"])
 def list_products():
-    conn = get_db()
+    """
+    List active products, one page at a time.
+
+    Query params: category, search, in_stock=true, limit (default 50, max 200)
+    and cursor (the `next_cursor` of the previous page). Pages are keyset-
+    paginated on (created_at, id), or on (rank, id) when searching.
+    """
     category = request.args.get("category")
     search = request.args.get("search", "")
     in_stock_only = request.args.get("in_stock", '').lower() == 'true'
+    cursor = request.args.get("cursor")
+    match = _fts_query(search)
+    mode = "search" if match else "recent"
 
     try:
-        query = f"""
-            SELECT {PRODUCT_FIELDS}, 
-                    COALESCE(AVG(r.rating), 0) AS avg_rating,
-                    COUNT(r.id) AS review_count
-            FROM products p
-            LEFT JOIN reviews r ON p.id = r.product_id
-            WHERE p.is_active = 1 
-        """
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    try:
+        after = _decode_cursor(cursor, mode) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if search.strip() and not match:
+        return jsonify({"items": [], "next_cursor": None}), 200
+
+    # Read-through cache keyed by the normalized filter set; first make sure
+    # no other worker has changed the catalog since we filled it.
+    generation = check_cache_coherency()
+    cache = get_catalog_cache()
+    version = cache.version
+    cache_key = ("list", category or None, match, in_stock_only, limit, cursor)
+
+    # Conditional GET: answer 304 before running any query or encoding JSON
+    etag = _catalog_etag(generation, cache_key)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    body = cache.get(cache_key)
+    if body is not None:
+        return _cached_json(body, "HIT", etag)
+
+    conn = get_db()
+    try:
+        # Inner query picks one page of products straight off the index;
+        # rating aggregates are only looked up for the rows on that page.
+        page = f"SELECT {PRODUCT_FIELDS}"
         params = []
 
+        if match:
+            # Full-text search (products_fts, kept in sync by triggers);
+            # its rank column is a weighted BM25 score (see migrations.py)
+            page += """, f.rank AS search_rank
+            FROM products p
+            JOIN (
+                SELECT rowid, rank
+                FROM products_fts
+                WHERE products_fts MATCH ?
+            ) f ON f.rowid = p.id
+            """
+            params.append(match)
+        else:
+            page += " FROM products p"
+
+        page += " WHERE p.is_active = 1"
+
         if category:
-            query += " AND p.category = ?"
+            page += " AND p.category = ?"
             params.append(category)
         
-        if search:
-            search_term = f"%{search}%"
-            query += " AND (p.name LIKE ? OR p.description LIKE ?)"
-            params.extend([search_term, search_term])
-        
         if in_stock_only:
-            query += " AND p.stock > 0"
-        
-        query += " GROUP BY p.id ORDER BY p.created_at DESC"
+            page += " AND p.stock > 0"
+
+        if match:
+            if after:
+                page += " AND (f.rank, p.id) > (?, ?)"
+                params.extend(after)
+            order = "search_rank, id"
+        else:
+            if after:
+                page += " AND (p.created_at, p.id) < (?, ?)"
+                params.extend(after)
+            order = "created_at DESC, id DESC"
+
+        page += f" ORDER BY {order} LIMIT ?"
+        params.append(limit + 1)
+
+        query = f"""
+            SELECT p.*, {RATING_FIELDS}
+            FROM ({page}) p
+            LEFT JOIN product_stats ps ON ps.product_id = p.id
+            ORDER BY {", ".join("p." + col for col in order.split(", "))}
+        """
+
+        items = rows_to_dicts(conn.execute(query, params).fetchall())
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            key = [last["search_rank"], last["id"]] if match else [last["created_at"], last["id"]]
+            next_cursor = _encode_cursor(mode, key)
+        for item in items:
+            item.pop("search_rank", None)
 
-        rows = conn.execute(query, params).fetchall()
-        return jsonify({"items": rows_to_dicts(rows)}), 200
+        body = current_app.json.dumps({"items": items, "next_cursor": next_cursor})
+        cache.set(cache_key, body, version)
+        return _cached_json(body, "MISS", etag)
     except sqlite3.Error as e:
         return jsonify({"error": str(e)}), 500
 
 # --- GET /api/products/<id> (Detail & Reviews - VR-3) ---
 @products_bp.route("/products/<int:product_id>", methods=["GET"])
 def get_product(product_id):
+    generation = check_cache_coherency()
+    cache = get_catalog_cache()
+    version = cache.version
+    cache_key = ("detail", product_id)
+
+    etag = _catalog_etag(generation, cache_key)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    body = cache.get(cache_key)
+    if body is not None:
+        return _cached_json(body, "HIT", etag)
+
     conn = get_db()
     try:
         product = conn.execute(
             f"""
-            SELECT {PRODUCT_FIELDS}, 
-                   COALESCE(AVG(r.rating), 0) AS avg_rating,
-                   COUNT(r.id) AS review_count
+            SELECT {PRODUCT_FIELDS}, {RATING_FIELDS},
+                   ps.rating_1, ps.rating_2, ps.rating_3, ps.rating_4, ps.rating_5
             FROM products p
-            LEFT JOIN reviews r ON p.id = r.product_id
+            LEFT JOIN product_stats ps ON ps.product_id = p.id
             WHERE p.id = ? AND p.is_active = 1
-            GROUP BY p.id
             """,
             (product_id,)
         ).fetchone()
@@ -657,8 +824,14 @@ def get_product(product_id):
         ).fetchall()
         
         result = dict(product)
+        result["rating_histogram"] = {
+            str(star): result.pop(f"rating_{star}") or 0 for star in range(1, 6)
+        }
         result["reviews"] = rows_to_dicts(reviews)
-        return jsonify(result), 200
+
+        body = current_app.json.dumps(result)
+        cache.set(cache_key, body, version)
+        return _cached_json(body, "MISS", etag)
     except sqlite3.Error as e:
         return jsonify({"error": str(e)}), 500
 
@@ -684,6 +857,7 @@ def create_product():
             (name, float(price), data.get("description"), data.get("category"), int(stock), data.get("low_stock_threshold", 10), vendor_id, data.get("image_url"))
         )
         conn.commit()
+        bump_catalog_version()
         
         new_product = conn.execute("SELECT * FROM products WHERE id = ?", (cursor.lastrowid,)).fetchone()
         return jsonify(dict(new_product)), 201
@@ -733,6 +907,7 @@ def update_product(product_id):
         
         conn.execute(query, params)
         conn.commit()
+        bump_catalog_version()
         
         updated_product = conn.execute("SELECT * FROM products WHERE id = ?", (product_id,)).fetchone()
         return jsonify(dict(updated_product)), 200
@@ -752,12 +927,21 @@ def delete_product(product_id):
         # Soft delete: Set is_active to 0
         conn.execute("UPDATE products SET is_active = 0 WHERE id = ?", (product_id,))
         conn.commit()
+        bump_catalog_version()
         
         return jsonify({"message": "Product deactivated successfully"}), 200
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
 
 # --- POST /api/products/<id>/reviews (Add Review - VR-3) ---
+def _insert_review(conn, product_id, user_id, rating, comment) -> int:
+    cursor = conn.execute(
+        """INSERT INTO reviews (product_id, user_id, rating, comment)
+        VALUES (?, ?, ?, ?)""",
+        (product_id, user_id, rating, comment)
+    )
+    return cursor.lastrowid
+
 @products_bp.route("/products/<int:product_id>/reviews", methods=["POST"])
 @login_required
 def add_review(product_id):
@@ -774,12 +958,8 @@ def add_review(product_id):
         product = conn.execute("SELECT id FROM products WHERE id = ?", (product_id,)).fetchone()
         if not product: return jsonify({"error": "Product not found"}), 404
 
-        cursor = conn.execute(
-            """INSERT INTO reviews (product_id, user_id, rating, comment)
-            VALUES (?, ?, ?, ?)""",
-            (product_id, user_id, rating, comment)
-        )
-        conn.commit()
-        return jsonify({"message": "Review added successfully", "id": cursor.lastrowid}), 201
+        review_id = run_write(_insert_review, product_id, user_id, rating, comment)
+        bump_catalog_version()
+        return jsonify({"message": "Review added successfully", "id": review_id}), 201
     except sqlite3.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
\ No newline at end of file
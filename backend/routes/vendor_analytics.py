@@ -0,0 +1,227 @@
+# backend/routes/vendor_analytics.py
+"""
+Sales time series for the vendor dashboard.
+
+GET /api/vendor/analytics returns the vendor's revenue, units and order
+counts bucketed by day or week over a date range, plus trailing rolling sums.
+Per-product series are only returned on request - for one product
+(product_id=) or a page of products ranked by revenue (limit=, offset=) - and
+are sparse: buckets where a product has nothing to report are left out.
+Order lines are fetched once as plain tuples and all bucketing is done with
+NumPy (bincount / cumsum) rather than per-row Python loops.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+from backend.db_utils import get_db
+from backend.models import get_current_vendor
+
+vendor_analytics_bp = Blueprint("vendor_analytics", __name__)
+
+DEFAULT_RANGE_DAYS = 90
+MAX_RANGE_DAYS = 731
+DEFAULT_WINDOW = 7
+MAX_PRODUCTS_PAGE = 50
+INTERVAL_DAYS = {"day": 1, "week": 7}
+
+# Orders that never shipped/sold are left out of sales figures
+EXCLUDED_STATUSES = ("cancelled",)
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _rolling_sum(series: np.ndarray, window: int) -> np.ndarray:
+    """Trailing `window`-bucket sums along the last axis."""
+    cs = np.cumsum(series, axis=-1)
+    if window < series.shape[-1]:
+        cs[..., window:] = cs[..., window:] - cs[..., :-window]
+    return cs
+
+
+def _series(revenue, units, orders, window):
+    return {
+        "revenue": np.round(revenue, 2).tolist(),
+        "units": units.astype(np.int64).tolist(),
+        "orders": orders.astype(np.int64).tolist(),
+        "rolling_revenue": np.round(_rolling_sum(revenue, window), 2).tolist(),
+        "rolling_units": _rolling_sum(units, window).astype(np.int64).tolist(),
+    }
+
+
+def _sparse_series(labels, revenue, units, orders, window):
+    """Like _series, but only for the buckets where any of the measures is non-zero."""
+    columns = {
+        "revenue": np.round(revenue, 2),
+        "units": units.astype(np.int64),
+        "orders": orders.astype(np.int64),
+        "rolling_revenue": np.round(_rolling_sum(revenue, window), 2),
+        "rolling_units": _rolling_sum(units, window).astype(np.int64),
+    }
+    keep = np.flatnonzero(np.any([col != 0 for col in columns.values()], axis=0))
+    return {
+        "buckets": labels[keep].tolist(),
+        **{name: col[keep].tolist() for name, col in columns.items()},
+    }
+
+
+def _int_arg(name, default, minimum):
+    """Integer query parameter >= minimum; raises ValueError with the message to return."""
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+@vendor_analytics_bp.route("/vendor/analytics", methods=["GET"])
+def vendor_analytics():
+    """
+    Revenue / units / orders over time for the current vendor.
+
+    Query params: start, end (YYYY-MM-DD; default the last 90 UTC days),
+    interval (day|week), window (rolling buckets, default 7). Add
+    product_id=<id> for that product's series (totals then cover only it), or
+    limit=<n> (max 50) and offset for the vendor's products ranked by revenue;
+    `next_offset` is set while more products remain.
+    """
+    vendor = get_current_vendor()
+    if not vendor:
+        return jsonify({"error": "Vendor authentication required"}), 401
+
+    try:
+        # orders.created_at is UTC (CURRENT_TIMESTAMP), so "today" is the UTC date
+        end = _parse_date(request.args.get("end"), datetime.now(timezone.utc).date())
+        start = _parse_date(
+            request.args.get("start"), end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        )
+    except ValueError:
+        return jsonify({"error": "start and end must be YYYY-MM-DD dates"}), 400
+    if start > end:
+        return jsonify({"error": "start must not be after end"}), 400
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        return jsonify({"error": f"Date range is limited to {MAX_RANGE_DAYS} days"}), 400
+
+    interval = request.args.get("interval", "day")
+    if interval not in INTERVAL_DAYS:
+        return jsonify({"error": "interval must be 'day' or 'week'"}), 400
+    try:
+        window = _int_arg("window", DEFAULT_WINDOW, 1)
+        product_id = _int_arg("product_id", 0, 1) if "product_id" in request.args else None
+        limit = _int_arg("limit", 0, 1) if "limit" in request.args else None
+        offset = _int_arg("offset", 0, 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit is not None:
+        limit = min(limit, MAX_PRODUCTS_PAGE)
+
+    db = get_db()
+    if product_id is not None:
+        owned = db.execute(
+            "SELECT 1 FROM products WHERE id = ? AND vendor_id = ?", (product_id, vendor["id"])
+        ).fetchone()
+        if not owned:
+            return jsonify({"error": "Product not found"}), 404
+
+    step = INTERVAL_DAYS[interval]
+    n_buckets = (end - start).days // step + 1
+    labels = np.array([(start + timedelta(days=i * step)).isoformat() for i in range(n_buckets)])
+
+    # Plain tuples (no sqlite3.Row) so the result converts straight to an array
+    cur = db.cursor()
+    cur.row_factory = None
+    cur.execute(
+        f"""
+        SELECT
+            oi.product_id,
+            oi.order_id,
+            CAST(julianday(o.created_at) - julianday(?) AS INTEGER) AS day,
+            oi.quantity,
+            oi.quantity * oi.price_at_purchase AS revenue
+        FROM products p
+        JOIN order_items oi ON oi.product_id = p.id
+        JOIN orders o ON o.id = oi.order_id
+        WHERE p.vendor_id = ? {"AND p.id = ?" if product_id is not None else ""}
+          AND o.created_at >= ? AND o.created_at < ?
+          AND o.status NOT IN ({", ".join("?" * len(EXCLUDED_STATUSES))})
+        """,
+        (
+            start.isoformat(),
+            vendor["id"],
+            *([product_id] if product_id is not None else []),
+            start.isoformat(),
+            (end + timedelta(days=1)).isoformat(),
+            *EXCLUDED_STATUSES,
+        ),
+    )
+    data = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 5)
+    product_col, order_col, day_col, qty_col, revenue_col = data.T
+
+    product_ids, product_idx = np.unique(product_col.astype(np.int64), return_inverse=True)
+    order_ids = order_col.astype(np.int64)
+    bucket = day_col.astype(np.int64) // step
+
+    units = np.bincount(bucket, weights=qty_col, minlength=n_buckets)
+    revenue = np.bincount(bucket, weights=revenue_col, minlength=n_buckets)
+    # An order with several of the vendor's products still counts once
+    _, first_order_line = np.unique(order_ids, return_index=True)
+    orders = np.bincount(bucket[first_order_line], minlength=n_buckets)
+
+    result = {
+        "vendor_id": vendor["id"],
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "interval": interval,
+        "window": window,
+        "buckets": labels.tolist(),
+        "totals": _series(revenue, units, orders, window),
+    }
+    if product_id is None and limit is None:
+        return jsonify(result)
+
+    # Rank by revenue over the range (ties by id); only the requested page is bucketed
+    product_revenue = np.bincount(product_idx, weights=revenue_col, minlength=len(product_ids))
+    ranked = np.lexsort((product_ids, -product_revenue))
+    page = ranked if product_id is not None else ranked[offset:offset + limit]
+    if product_id is None:
+        result["next_offset"] = offset + limit if offset + limit < len(ranked) else None
+
+    # Map each line to its product's position on the page (-1 = not on the page)
+    position = np.full(len(product_ids), -1)
+    position[page] = np.arange(len(page))
+    line_pos = position[product_idx]
+    on_page = line_pos >= 0
+    cell = line_pos[on_page] * n_buckets + bucket[on_page]
+    size = len(page) * n_buckets
+    page_units = np.bincount(cell, weights=qty_col[on_page], minlength=size).reshape(len(page), n_buckets)
+    page_revenue = np.bincount(cell, weights=revenue_col[on_page], minlength=size).reshape(len(page), n_buckets)
+    # Orders are counted once per (order, product)
+    _, first_line = np.unique(
+        np.stack([order_ids[on_page], line_pos[on_page]]), axis=1, return_index=True
+    )
+    page_orders = np.bincount(cell[first_line], minlength=size).reshape(len(page), n_buckets)
+
+    page_ids = product_ids[page].tolist()
+    names = {}
+    if page_ids:
+        placeholders = ", ".join("?" * len(page_ids))
+        names = dict(db.execute(
+            f"SELECT id, name FROM products WHERE id IN ({placeholders})", page_ids
+        ).fetchall())
+
+    result["products"] = [
+        {
+            "product_id": pid,
+            "name": names.get(pid),
+            **_sparse_series(labels, page_revenue[i], page_units[i], page_orders[i], window),
+        }
+        for i, pid in enumerate(page_ids)
+    ]
+    return jsonify(result)
@@ -3,6 +3,8 @@
 from flask import Blueprint, jsonify, request
 from backend.db_utils import get_db
 from backend.models import get_current_vendor
+from backend.cache import bump_catalog_version
+from backend.routes.products import RATING_FIELDS
 
 vendor_bp = Blueprint("vendor", __name__)
 
@@ -28,6 +30,15 @@ def _row_to_vendor_product(row):
         "review_count": int(row["review_count"] or 0),
         "on_order_qty": int(row["on_order_qty"] or 0),
         "is_low_stock": is_low,
+        # From the forecast batch job; None until it has run / if not selling
+        "daily_velocity": (
+            round(float(row["daily_velocity"]), 2)
+            if row["daily_velocity"] is not None else None
+        ),
+        "days_until_stockout": (
+            round(float(row["days_until_stockout"]), 1)
+            if row["days_until_stockout"] is not None else None
+        ),
     }
 
 
@@ -40,7 +51,10 @@ def vendor_overview():
 
     db = get_db()
 
-    sql = """
+    # Per-product and per-vendor figures come from the trigger-maintained
+    # product_stats / vendor_stats rollups, so this reads only the vendor's
+    # own rows (idx_products_vendor_created) instead of every order and review.
+    sql = f"""
         SELECT
             p.id,
             p.name,
@@ -49,44 +63,29 @@ def vendor_overview():
             p.low_stock_threshold,
             p.category,
             p.is_active,
-            COALESCE(r.avg_rating, 0)    AS avg_rating,
-            COALESCE(r.review_count, 0)  AS review_count,
-            COALESCE(o.on_order_qty, 0)  AS on_order_qty
+            {RATING_FIELDS},
+            COALESCE(ps.on_order_qty, 0)  AS on_order_qty,
+            sf.daily_velocity,
+            -- Project from live stock so sales since the last run count
+            COALESCE(p.stock, 0) / NULLIF(sf.daily_velocity, 0) AS days_until_stockout
         FROM products p
-        LEFT JOIN (
-            SELECT
-                product_id,
-                AVG(rating)   AS avg_rating,
-                COUNT(*)      AS review_count
-            FROM reviews
-            GROUP BY product_id
-        ) r ON r.product_id = p.id
-        LEFT JOIN (
-            SELECT
-                oi.product_id,
-                SUM(oi.quantity) AS on_order_qty
-            FROM order_items oi
-            JOIN orders o ON o.id = oi.order_id
-            WHERE o.status IN ('placed', 'processing', 'shipped')
-            GROUP BY oi.product_id
-        ) o ON o.product_id = p.id
+        LEFT JOIN product_stats ps ON ps.product_id = p.id
+        LEFT JOIN stock_forecasts sf ON sf.product_id = p.id
         WHERE p.vendor_id = ?
         ORDER BY p.created_at DESC
     """
 
     cur = db.execute(sql, (vendor["id"],))
-    rows = cur.fetchall()
+    products = [_row_to_vendor_product(row) for row in cur.fetchall()]
 
-    products = []
-    low_stock_count = 0
-    on_order_total = 0
-
-    for row in rows:
-        prod = _row_to_vendor_product(row)
-        products.append(prod)
-        if prod["is_low_stock"]:
-            low_stock_count += 1
-        on_order_total += prod["on_order_qty"]
+    summary = db.execute(
+        """
+        SELECT total_products, low_stock_count, on_order_total
+        FROM vendor_stats
+        WHERE vendor_id = ?
+        """,
+        (vendor["id"],),
+    ).fetchone()
 
     return jsonify(
         {
@@ -95,10 +94,10 @@ def vendor_overview():
                 "email": vendor["email"],
             },
             "products": products,
-            "summary": {
-                "total_products": len(products),
-                "low_stock_count": low_stock_count,
-                "on_order_total": on_order_total,
+            "summary": dict(summary) if summary else {
+                "total_products": 0,
+                "low_stock_count": 0,
+                "on_order_total": 0,
             },
         }
     )
@@ -154,6 +153,7 @@ def create_vendor_product():
     )
     product_id = cur.lastrowid
     db.commit()
+    bump_catalog_version()
 
     # Fetch fresh row (without joins) and adapt to the frontend shape
     cur = db.execute(
@@ -168,7 +168,9 @@ def create_vendor_product():
             is_active,
             0 AS avg_rating,
             0 AS review_count,
-            0 AS on_order_qty
+            0 AS on_order_qty,
+            NULL AS daily_velocity,
+            NULL AS days_until_stockout
         FROM products
         WHERE id = ? AND vendor_id = ?
         """,
@@ -237,10 +239,11 @@ def update_vendor_product(product_id: int):
         return jsonify({"error": "Product not found for this vendor"}), 404
 
     db.commit()
+    bump_catalog_version()
 
     # Return updated row with metrics
     cur = db.execute(
-        """
+        f"""
         SELECT
             p.id,
             p.name,
@@ -249,22 +252,14 @@ def update_vendor_product(product_id: int):
             p.low_stock_threshold,
             p.category,
             p.is_active,
-            COALESCE(r.avg_rating, 0)    AS avg_rating,
-            COALESCE(r.review_count, 0)  AS review_count,
-            COALESCE(o.on_order_qty, 0)  AS on_order_qty
+            {RATING_FIELDS},
+            COALESCE(ps.on_order_qty, 0)  AS on_order_qty,
+            sf.daily_velocity,
+            -- Project from live stock so sales since the last run count
+            COALESCE(p.stock, 0) / NULLIF(sf.daily_velocity, 0) AS days_until_stockout
         FROM products p
-        LEFT JOIN (
-            SELECT product_id, AVG(rating) AS avg_rating, COUNT(*) AS review_count
-            FROM reviews
-            GROUP BY product_id
-        ) r ON r.product_id = p.id
-        LEFT JOIN (
-            SELECT oi.product_id, SUM(oi.quantity) AS on_order_qty
-            FROM order_items oi
-            JOIN orders o ON o.id = oi.order_id
-            WHERE o.status IN ('placed', 'processing', 'shipped')
-            GROUP BY oi.product_id
-        ) o ON o.product_id = p.id
+        LEFT JOIN product_stats ps ON ps.product_id = p.id
+        LEFT JOIN stock_forecasts sf ON sf.product_id = p.id
         WHERE p.id = ? AND p.vendor_id = ?
         """,
         (product_id, vendor["id"]),
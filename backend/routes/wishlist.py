@@ -7,15 +7,31 @@ from flask import Blueprint, jsonify, g, request
 import sqlite3
 from ..secruity import login_required
 from ..db_utils import rows_to_dicts, get_db
+from ..write_queue import run_write
 
 wishlist_bp = Blueprint("wishlist_bp", __name__)
 
+def _insert_wishlist_item(conn, user_id, product_id):
+    conn.execute(
+        """INSERT OR IGNORE INTO wishlist (user_id, product_id)
+        VALUES (?, ?)""",
+        (user_id, product_id)
+    )
+
+def _delete_wishlist_item(conn, user_id, product_id) -> int:
+    cursor = conn.execute(
+        """DELETE FROM wishlist
+        WHERE user_id = ? AND product_id = ?""",
+        (user_id, product_id)
+    )
+    return cursor.rowcount
+
 # --- GET /api/wishlist (CR-2) ---
 @wishlist_bp.route("/wishlist", methods=["GET"])
 @login_required
 def get_user_wishlist():
     user_id = g.user["id"]
-    conn = g.db
+    conn = get_db()
     
     try:
         query = """
@@ -37,18 +53,13 @@ def get_user_wishlist():
 @login_required
 def add_to_wishlist(product_id: int):
     user_id = g.user["id"]
-    conn = g.db
+    conn = get_db()
     
     try:
         product = conn.execute("SELECT id FROM products WHERE id = ? AND is_active = 1", (product_id,)).fetchone()
         if not product: return jsonify({"error": "Product not found"}), 404
 
-        conn.execute(
-            """INSERT OR IGNORE INTO wishlist (user_id, product_id)
-            VALUES (?, ?)""",
-            (user_id, product_id)
-        )
-        conn.commit()
+        run_write(_insert_wishlist_item, user_id, product_id)
         
         return jsonify({"message": "Product added to wishlist"}), 201
         
@@ -60,17 +71,11 @@ def add_to_wishlist(product_id: int):
 @login_required
 def remove_from_wishlist(product_id: int):
     user_id = g.user["id"]
-    conn = g.db
     
     try:
-        cursor = conn.execute(
-            """DELETE FROM wishlist
-            WHERE user_id = ? AND product_id = ?""",
-            (user_id, product_id)
-        )
-        conn.commit()
+        removed = run_write(_delete_wishlist_item, user_id, product_id)
         
-        if cursor.rowcount == 0:
+        if removed == 0:
             return jsonify({"error": "Item not found in your wishlist"}), 404
         
         return jsonify({"message": "Product removed from wishlist"}), 200
@@ -4,9 +4,24 @@ security.py
 Defines decorators for authentication (T2) and authorization (AD-2).
 """
 from functools import wraps
-from flask import request, jsonify, g
-from datetime import datetime
+from flask import request, jsonify, g, current_app
+from datetime import datetime, timedelta
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
 from .db_utils import get_db
+from .cache import LRUCache
+
+DEFAULT_SESSION_CACHE_SIZE = 4096
+DEFAULT_SESSION_CACHE_TTL = 30.0  # seconds; bounds staleness across workers
+
+SIGNED_TOKEN_PREFIX = "v1."
+DEFAULT_SIGNED_TOKEN_TTL_MINUTES = 60
+DEFAULT_SIGNED_TOKEN_CHECK_TTL = 5.0  # seconds a user's token_version/status is trusted
 
 class AuthError(Exception):
     """Custom exception for authentication/authorization failures."""
@@ -14,8 +29,249 @@ class AuthError(Exception):
         self.message = message
         self.status_code = status_code
 
+class SessionCache:
+    """
+    In-process LRU of validated sessions, keyed by a SHA-256 of the token so
+    raw tokens are never kept in memory. Entries expire at the earlier of the
+    cache TTL and the session's own expires_at.
+    """
+
+    def __init__(self, maxsize=DEFAULT_SESSION_CACHE_SIZE, ttl=DEFAULT_SESSION_CACHE_TTL):
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict | None:
+        cached = self.entries.get(self._key(token))
+        return dict(cached) if cached is not None else None
+
+    def put(self, token: str, user: dict, expires_at: datetime):
+        ttl = min(self.entries.ttl, (expires_at - datetime.now()).total_seconds())
+        if ttl <= 0:
+            return
+        key = self._key(token)
+        self.entries.set(key, dict(user), ttl)
+        with self._lock:
+            keys = self._keys_by_user.setdefault(user["id"], set())
+            keys.add(key)
+            # Drop keys that were evicted or expired meanwhile
+            keys.intersection_update(k for k in list(keys) if k in self.entries)
+
+    def invalidate(self, token: str):
+        self.entries.pop(self._key(token))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            keys = self._keys_by_user.pop(user_id, set())
+        for key in keys:
+            self.entries.pop(key)
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+
+def get_session_cache(app=None) -> SessionCache:
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get("session_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("session_cache", SessionCache(
+            maxsize=app.config.get("SESSION_CACHE_SIZE", DEFAULT_SESSION_CACHE_SIZE),
+            ttl=app.config.get("SESSION_CACHE_TTL", DEFAULT_SESSION_CACHE_TTL),
+        ))
+    return cache
+
+
+def invalidate_session(token: str):
+    """Forget a cached session (call on logout)."""
+    get_session_cache().invalidate(token)
+
+
+def invalidate_user_sessions(user_id: int):
+    """Forget every cached session of a user (call on suspension or role change)."""
+    get_session_cache().invalidate_user(user_id)
+
+
+# ============================
+# Stateless signed tokens (AUTH_TOKEN_MODE = "signed")
+# ============================
+
+class TokenRevocations:
+    """
+    Revocation state for signed tokens: a denylist of token ids (kept only
+    until each token would have expired anyway), a minimum accepted
+    token_version per user, and a short-TTL cache of each user's stored
+    token_version and status. The cache is what makes revocations and
+    suspensions made by other workers (or before a restart) stick: they are
+    picked up from the users table within `account_ttl` seconds.
+    """
+
+    def __init__(self, account_ttl=DEFAULT_SIGNED_TOKEN_CHECK_TTL, maxsize=DEFAULT_SESSION_CACHE_SIZE):
+        self._denied = {}        # jti -> exp (unix time)
+        self._min_version = {}   # user id -> lowest token_version still valid
+        self.accounts = LRUCache(maxsize=maxsize, ttl=account_ttl)  # user id -> token_version/status
+        self._lock = threading.Lock()
+
+    def deny(self, jti: str, exp: float):
+        now = time.time()
+        with self._lock:
+            for old_jti, old_exp in list(self._denied.items()):
+                if old_exp < now:
+                    del self._denied[old_jti]
+            self._denied[jti] = exp
+
+    def set_min_version(self, user_id: int, version: int):
+        with self._lock:
+            self._min_version[user_id] = max(version, self._min_version.get(user_id, 0))
+        self.accounts.pop(user_id)
+
+    def remember_account(self, user_id: int, token_version: int, status: str):
+        self.accounts.set(user_id, {"token_version": token_version, "status": status})
+
+    def account(self, user_id: int) -> dict | None:
+        """Stored token_version and status of a user (cached for account_ttl), or None if deleted."""
+        account = self.accounts.get(user_id)
+        if account is None:
+            row = get_db().execute(
+                "SELECT token_version, status FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            account = {"token_version": row["token_version"], "status": row["status"]}
+            self.accounts.set(user_id, account)
+        return account
+
+    def is_revoked(self, payload: dict) -> bool:
+        with self._lock:
+            if (payload["jti"] in self._denied
+                    or payload["sv"] < self._min_version.get(payload["uid"], 0)):
+                return True
+        account = self.account(payload["uid"])
+        return account is None or payload["sv"] < account["token_version"]
+
+
+def get_token_revocations(app=None) -> TokenRevocations:
+    app = app or current_app._get_current_object()
+    revocations = app.extensions.get("token_revocations")
+    if revocations is None:
+        revocations = app.extensions.setdefault("token_revocations", TokenRevocations(
+            account_ttl=app.config.get("SIGNED_TOKEN_CHECK_TTL", DEFAULT_SIGNED_TOKEN_CHECK_TTL),
+            maxsize=app.config.get("SESSION_CACHE_SIZE", DEFAULT_SESSION_CACHE_SIZE),
+        ))
+    return revocations
+
+
+def signed_tokens_enabled() -> bool:
+    return current_app.config.get("AUTH_TOKEN_MODE", "session") == "signed"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload_b64: str) -> str:
+    key = str(current_app.config["SECRET_KEY"]).encode()
+    return _b64(hmac.new(key, payload_b64.encode(), hashlib.sha256).digest())
+
+
+def issue_signed_token(user) -> str:
+    """Issue an HMAC-signed token carrying the user id, role, token_version and expiry."""
+    ttl = timedelta(minutes=current_app.config.get(
+        "SIGNED_TOKEN_TTL_MINUTES", DEFAULT_SIGNED_TOKEN_TTL_MINUTES))
+    payload = {
+        "uid": user["id"],
+        "email": user["email"],
+        "role": user["role"],
+        "sv": user["token_version"],
+        "exp": int(time.time() + ttl.total_seconds()),
+        "jti": uuid.uuid4().hex,
+    }
+    # Login just read the row, so the first requests need not read it again
+    get_token_revocations().remember_account(user["id"], user["token_version"], user["status"])
+    body = _b64(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{SIGNED_TOKEN_PREFIX}{body}.{_sign(SIGNED_TOKEN_PREFIX + body)}"
+
+
+def verify_signed_token(token: str) -> dict | None:
+    """
+    Return the payload of a valid, unexpired, unrevoked signed token. The
+    user's stored token_version is read from the users table at most once per
+    SIGNED_TOKEN_CHECK_TTL seconds.
+    """
+    if not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        body, signature = token[len(SIGNED_TOKEN_PREFIX):].split(".")
+        if not hmac.compare_digest(signature, _sign(SIGNED_TOKEN_PREFIX + body)):
+            return None
+        payload = json.loads(_unb64(body))
+    except (ValueError, TypeError):
+        return None
+    if payload.get("exp", 0) < time.time():
+        return None
+    if get_token_revocations().is_revoked(payload):
+        return None
+    return payload
+
+
+def revoke_signed_token(token: str):
+    """Deny one signed token until it expires (logout)."""
+    payload = verify_signed_token(token)
+    if payload:
+        get_token_revocations().deny(payload["jti"], payload["exp"])
+
+
+def revoke_user_tokens(user_id: int):
+    """
+    Invalidate every token a user holds (suspension or role change): bumps
+    users.token_version so new logins carry the next version. This process
+    rejects older signed tokens at once; other workers (and this one after a
+    restart) within SIGNED_TOKEN_CHECK_TTL seconds.
+    """
+    conn = get_db()
+    conn.execute(
+        "UPDATE users SET token_version = token_version + 1 WHERE id = ?", (user_id,)
+    )
+    conn.commit()
+    row = conn.execute("SELECT token_version FROM users WHERE id = ?", (user_id,)).fetchone()
+    if row:
+        get_token_revocations().set_min_version(user_id, row["token_version"])
+    invalidate_user_sessions(user_id)
+
+
 def get_current_user(token: str) -> dict | None:
     """Validates a session token and retrieves the associated user data (T2)."""
+    if signed_tokens_enabled() and token.startswith(SIGNED_TOKEN_PREFIX):
+        payload = verify_signed_token(token)
+        if payload is None:
+            return None
+        account = get_token_revocations().account(payload["uid"])
+        if account is None:
+            return None
+        status = account["status"]
+        if status == 'suspended': # AD-5 check
+            raise AuthError("Account suspended", 403)
+        return {
+            "user_id": payload["uid"],
+            "id": payload["uid"],
+            "email": payload["email"],
+            "role": payload["role"],
+            "status": status,
+            "expires_at": datetime.fromtimestamp(payload["exp"]).isoformat(),
+        }
+
+    cache = get_session_cache()
+    user = cache.get(token)
+    if user is not None:
+        return user
+
     conn = get_db()
     
     session_row = conn.execute(
@@ -33,14 +289,15 @@ def get_current_user(token: str) -> dict | None:
 
     expires_at = datetime.fromisoformat(session_row["expires_at"])
     if expires_at < datetime.now():
-        conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
-        conn.commit()
+        # Left for the housekeeping sweeper; no writes on the read path
         return None
         
     if session_row["status"] == 'suspended': # AD-5 check
         raise AuthError("Account suspended", 403)
 
-    return dict(session_row)
+    user = dict(session_row)
+    cache.put(token, user, expires_at)
+    return user
 
 def login_required(f):
     """Decorator to require a valid session token (Authentication)."""
@@ -0,0 +1,150 @@
+"""
+slow_query_log.py
+-----------------
+Rotating log of statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+Statements are timed by sql_profiler's connection proxy (execute + fetch).
+At the end of each request every statement over the threshold is written as
+one JSON line with its normalized SQL, the shapes (not values) of its bound
+parameters, its duration and row count. The first time a statement shape is
+logged, its EXPLAIN QUERY PLAN is captured too, with `full_scan` set when
+SQLite scans a table without an index. Explained shapes are remembered in a
+bounded LRU, so a stream of distinct ad-hoc statements cannot grow it without
+limit, and forgotten after an hour so a plan changed by ANALYZE or a new
+index shows up.
+"""
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from flask import current_app, g, request
+
+from .cache import LRUCache
+from .sql_profiler import unwrap_connection
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_EXPLAINED_SHAPES = 1024  # statement shapes remembered as already explained
+DEFAULT_EXPLAIN_TTL = 3600.0     # seconds before a shape's plan is captured again
+
+_FULL_SCAN = re.compile(r"^SCAN (?!.*\bUSING\b)")
+
+
+def param_shapes(params, many=False):
+    """Types (and string lengths) of bound parameters, never their values."""
+    if many:
+        return "executemany"
+    if isinstance(params, dict):
+        return {name: _shape(value) for name, value in params.items()}
+    return [_shape(value) for value in params or ()]
+
+
+def _shape(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def explain_query_plan(conn, sql, params=()) -> list[str]:
+    """EXPLAIN QUERY PLAN as indented lines, like the sqlite3 shell prints it."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Writes slow statements to a rotating file, explaining each shape once."""
+
+    def __init__(self, path, threshold_ms, max_bytes=DEFAULT_MAX_BYTES,
+                 backup_count=DEFAULT_BACKUP_COUNT, explained_shapes=DEFAULT_EXPLAINED_SHAPES,
+                 explain_ttl=DEFAULT_EXPLAIN_TTL):
+        self.threshold = threshold_ms / 1000
+        self.explained = LRUCache(maxsize=explained_shapes, ttl=explain_ttl)
+        self.logged = 0
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A private logger, so several apps in one process don't share handlers
+        self.logger = logging.Logger("backend.slow_queries")
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+
+    def check(self, conn, profile, endpoint=None):
+        for record in profile.statements:
+            if record.duration >= self.threshold:
+                self.log(conn, record, endpoint)
+
+    def log(self, conn, record, endpoint=None):
+        with self._lock:
+            first_seen = self.explained.get(record.shape) is None
+            if first_seen:
+                self.explained.set(record.shape, True)
+            self.logged += 1
+
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoint": endpoint,
+            "duration_ms": round(record.duration * 1000, 3),
+            "rows": record.rows,
+            "sql": record.shape,
+            "params": param_shapes(record.params, record.many),
+        }
+        if first_seen and not record.many:
+            try:
+                plan = explain_query_plan(conn, record.sql, record.params)
+                entry["plan"] = plan
+                entry["full_scan"] = any(_FULL_SCAN.match(line.strip()) for line in plan)
+            except (sqlite3.Error, ValueError) as e:
+                entry["plan_error"] = str(e)
+        self.logger.warning(json.dumps(entry))
+
+    def close(self):
+        for handler in list(self.logger.handlers):
+            handler.close()
+            self.logger.removeHandler(handler)
+
+
+def get_slow_query_log(app=None):
+    """Return the app's SlowQueryLog, or None when SLOW_QUERY_THRESHOLD_MS is unset."""
+    app = app or current_app._get_current_object()
+    return app.extensions.get("slow_query_log")
+
+
+def init_slow_query_log(app):
+    """Create the log and its end-of-request hook when a threshold is configured."""
+    threshold = app.config.get("SLOW_QUERY_THRESHOLD_MS")
+    if threshold is None:
+        return
+    slow_log = SlowQueryLog(
+        app.config.get("SLOW_QUERY_LOG") or Path(app.root_path) / "logs" / "slow_queries.log",
+        threshold,
+        max_bytes=app.config.get("SLOW_QUERY_LOG_MAX_BYTES", DEFAULT_MAX_BYTES),
+        backup_count=app.config.get("SLOW_QUERY_LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT),
+        explained_shapes=app.config.get("SLOW_QUERY_EXPLAINED_SHAPES", DEFAULT_EXPLAINED_SHAPES),
+    )
+    app.extensions["slow_query_log"] = slow_log
+
+    @app.teardown_request
+    def _log_slow_queries(exc=None):
+        # Runs before close_db (an app-context teardown), so g.db is still ours
+        profile = g.get("sql_profile")
+        conn = g.get("db")
+        if profile is None or conn is None:
+            return
+        try:
+            slow_log.check(unwrap_connection(conn), profile, request.endpoint)
+        except Exception:
+            current_app.logger.exception("slow query log failed")
@@ -0,0 +1,308 @@
+"""
+sql_profiler.py
+---------------
+Opt-in per-request SQL instrumentation (SQL_PROFILING = True).
+
+db_utils.get_db() wraps the pooled connection in a ProfiledConnection, which
+records every statement run during the request: its SQL, normalized shape,
+duration (execute + fetch) and row count, plus time spent in COMMIT. A shape
+seen SQL_PROFILING_N_PLUS_ONE or more times in one request is flagged as a
+likely N+1 loop.
+
+In debug mode (or with SQL_PROFILING_HEADERS) each response carries
+X-SQL-* headers; otherwise per-endpoint and per-shape counters accumulate in
+the app's SqlProfiler and are reported by /api/health.
+"""
+import re
+import threading
+import time
+
+from flask import current_app, g, request
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+MAX_TRACKED_SHAPES = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement shape: literals become ?, IN-lists collapse, whitespace is squeezed."""
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class StatementRecord:
+    __slots__ = ("sql", "params", "_shape", "duration", "rows", "many")
+
+    def __init__(self, sql, params=(), many=False):
+        self.sql = sql
+        self.params = params
+        self._shape = None
+        self.duration = 0.0
+        self.rows = 0
+        self.many = many
+
+    @property
+    def shape(self) -> str:
+        # Normalized on demand: metrics only needs durations
+        if self._shape is None:
+            self._shape = normalize_sql(self.sql)
+        return self._shape
+
+
+class RequestProfile:
+    """Statements and commit time for one request (stored in g.sql_profile)."""
+
+    def __init__(self):
+        self.statements = []
+        self.commit_time = 0.0
+        self.commits = 0
+
+    @property
+    def sql_time(self) -> float:
+        return sum(s.duration for s in self.statements) + self.commit_time
+
+    def shape_counts(self) -> dict:
+        counts = {}
+        for s in self.statements:
+            counts[s.shape] = counts.get(s.shape, 0) + 1
+        return counts
+
+    def repeated_shapes(self, threshold=DEFAULT_N_PLUS_ONE_THRESHOLD) -> dict:
+        return {shape: n for shape, n in self.shape_counts().items() if n >= threshold}
+
+    def summary(self, threshold=DEFAULT_N_PLUS_ONE_THRESHOLD) -> dict:
+        return {
+            "queries": len(self.statements),
+            "rows": sum(s.rows for s in self.statements),
+            "sql_ms": round(self.sql_time * 1000, 3),
+            "commit_ms": round(self.commit_time * 1000, 3),
+            "n_plus_one": self.repeated_shapes(threshold),
+        }
+
+
+class ProfiledCursor:
+    """Cursor proxy that charges fetch time and fetched rows to its statement."""
+
+    def __init__(self, cursor, profile):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_profile", profile)
+        object.__setattr__(self, "_record", None)
+
+    def _run(self, method, sql, params, many=False):
+        record = StatementRecord(sql, params, many)
+        started = time.perf_counter()
+        try:
+            method(sql, params)
+        finally:
+            record.duration = time.perf_counter() - started
+            self._profile.statements.append(record)
+        if many or self._cursor.description is None:
+            record.rows = max(self._cursor.rowcount, 0)
+        object.__setattr__(self, "_record", record)
+        return self
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, seq_of_params, many=True)
+
+    def executescript(self, script):
+        return self._run(lambda sql, _params: self._cursor.executescript(sql), script, (), many=True)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        record = self._record
+        if record is not None:
+            record.duration += time.perf_counter() - started
+            if isinstance(result, list):
+                record.rows += len(result)
+            elif result is not None:
+                record.rows += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def fetchmany(self, size=None):
+        return self._fetch(self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class ProfiledConnection:
+    """Connection proxy handed out by get_db() while SQL_PROFILING is on."""
+
+    def __init__(self, conn, profile):
+        object.__setattr__(self, "raw", conn)
+        object.__setattr__(self, "profile", profile)
+
+    def cursor(self):
+        return ProfiledCursor(self.raw.cursor(), self.profile)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            self.profile.commit_time += time.perf_counter() - started
+            self.profile.commits += 1
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+def statement_timing_enabled(config) -> bool:
+    """True if anything consumes per-statement timings (profiler, metrics, slow log)."""
+    return bool(
+        config.get("SQL_PROFILING")
+        or (config.get("METRICS_ENABLED") and config.get("METRICS_DB_TIME"))
+        or config.get("SLOW_QUERY_THRESHOLD_MS") is not None
+    )
+
+
+def profile_connection(conn):
+    """Wrap `conn` for the current request, starting g.sql_profile."""
+    if "sql_profile" not in g:
+        g.sql_profile = RequestProfile()
+    return ProfiledConnection(conn, g.sql_profile)
+
+
+def unwrap_connection(conn):
+    return getattr(conn, "raw", conn)
+
+
+class SqlProfiler:
+    """Process-wide counters per endpoint and per statement shape."""
+
+    def __init__(self, n_plus_one_threshold=DEFAULT_N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.endpoints = {}
+        self.shapes = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, profile: RequestProfile):
+        repeated = profile.repeated_shapes(self.n_plus_one_threshold)
+        with self._lock:
+            ep = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "queries": 0, "rows": 0, "sql_ms": 0.0,
+                "commit_ms": 0.0, "max_queries": 0, "n_plus_one_requests": 0,
+            })
+            ep["requests"] += 1
+            ep["queries"] += len(profile.statements)
+            ep["rows"] += sum(s.rows for s in profile.statements)
+            ep["sql_ms"] += profile.sql_time * 1000
+            ep["commit_ms"] += profile.commit_time * 1000
+            ep["max_queries"] = max(ep["max_queries"], len(profile.statements))
+            ep["n_plus_one_requests"] += bool(repeated)
+
+            for s in profile.statements:
+                shape = self.shapes.get(s.shape)
+                if shape is None:
+                    if len(self.shapes) >= MAX_TRACKED_SHAPES:
+                        continue
+                    shape = self.shapes[s.shape] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+                ms = s.duration * 1000
+                shape["count"] += 1
+                shape["total_ms"] += ms
+                shape["max_ms"] = max(shape["max_ms"], ms)
+                shape["rows"] += s.rows
+
+    def stats(self, top=20) -> dict:
+        with self._lock:
+            endpoints = {
+                name: {
+                    **{k: round(v, 3) if isinstance(v, float) else v for k, v in ep.items()},
+                    "avg_queries": round(ep["queries"] / ep["requests"], 2),
+                }
+                for name, ep in self.endpoints.items()
+            }
+            shapes = sorted(self.shapes.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                "endpoints": endpoints,
+                "top_shapes": [
+                    {"shape": shape, **{k: round(v, 3) for k, v in counters.items()}}
+                    for shape, counters in shapes[:top]
+                ],
+            }
+
+
+def get_sql_profiler(app=None) -> SqlProfiler:
+    """Return the SqlProfiler for `app` (default: current_app), creating it lazily."""
+    app = app or current_app._get_current_object()
+    profiler = app.extensions.get("sql_profiler")
+    if profiler is None:
+        profiler = app.extensions.setdefault("sql_profiler", SqlProfiler(
+            app.config.get("SQL_PROFILING_N_PLUS_ONE", DEFAULT_N_PLUS_ONE_THRESHOLD),
+        ))
+    return profiler
+
+
+def _report(response):
+    profile = g.get("sql_profile")
+    if profile is None:
+        return response
+    app = current_app
+    threshold = app.config.get("SQL_PROFILING_N_PLUS_ONE", DEFAULT_N_PLUS_ONE_THRESHOLD)
+    if app.debug or app.config.get("SQL_PROFILING_HEADERS"):
+        summary = profile.summary(threshold)
+        response.headers["X-SQL-Queries"] = str(summary["queries"])
+        response.headers["X-SQL-Rows"] = str(summary["rows"])
+        response.headers["X-SQL-Time-ms"] = str(summary["sql_ms"])
+        response.headers["X-SQL-Commit-ms"] = str(summary["commit_ms"])
+        if summary["n_plus_one"]:
+            response.headers["X-SQL-N-Plus-One"] = "; ".join(
+                f"{n}x {shape[:200]}" for shape, n in summary["n_plus_one"].items()
+            )
+    else:
+        get_sql_profiler(app).record(request.endpoint or "unknown", profile)
+    return response
+
+
+def init_sql_profiler(app):
+    """Register the reporting hook when SQL_PROFILING is enabled."""
+    if app.config.get("SQL_PROFILING"):
+        get_sql_profiler(app)
+        app.after_request(_report)
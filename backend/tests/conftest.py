@@ -5,15 +5,64 @@ Pytest fixture setup for creating a Flask test client.
 Pytest automatically finds fixtures defined here.
 """
 
+import shutil
+from pathlib import Path
+
 import pytest
 from backend.app import create_app
+from backend.db_utils import get_pool
+from backend.slow_query_log import get_slow_query_log
+
+SEED_DB = Path(__file__).resolve().parents[1] / "db" / "fitness.db"
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    Copy the seeded database into a temp dir so tests never touch
+    (or switch the journal mode of) the checked-in fitness.db.
+    """
+    path = tmp_path / "fitness.db"
+    shutil.copy(SEED_DB, path)
+    return path
+
+@pytest.fixture
+def make_app(db_path):
+    """
+    Factory for test apps: make_app(**config) builds an app on the temp
+    database (unless DATABASE is given) and cleans it up after the test.
+    """
+    apps = []
+
+    def make(**config):
+        app = create_app({
+            "DATABASE": db_path,
+            "PASSWORD_HASH_WORKERS": 0,  # hash inline; test_auth covers the process pool
+            **config,
+        })
+        app.config.update({"TESTING": True})
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        for name in ("write_queue", "session_queue"):
+            if name in app.extensions:
+                app.extensions[name].close()
+        if get_slow_query_log(app) is not None:
+            get_slow_query_log(app).close()
+        get_pool(app).close()
+
+@pytest.fixture
+def app(make_app):
+    """
+    Create a new Flask app bound to the temp database for each test.
+    """
+    return make_app()
 
 @pytest.fixture
-def client():
+def client(app):
     """
     Create a new Flask test client for each test.
     """
-    app = create_app()
-    app.config.update({"TESTING": True})
     with app.test_client() as client:
         yield client
@@ -3,6 +3,17 @@ test_auth.py
 -------------
 Tests for /api/register and /api/login.
 """
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.db_utils import get_db
+from backend.hashing import HashingPool, HashingUnavailable, get_hashing_pool
+from backend.housekeeping import purge_expired_sessions, start_session_sweeper
+from backend.secruity import get_current_user, invalidate_user_sessions, revoke_user_tokens
 
 def test_register_success_and_duplicate(client):
     # Successful registration
@@ -26,3 +37,199 @@ def test_login_success_and_failure(client):
     # Wrong password
     res2 = client.post("/api/login", json={"email": "logintest@example.com", "password": "wrong"})
     assert res2.status_code == 401
+
+def _token(client, email="cached@example.com", password="password123"):
+    client.post("/api/register", json={"email": email, "password": password})
+    return client.post("/api/login", json={"email": email, "password": password}).get_json()["token"]
+
+def test_session_lookups_are_cached(app, client, db_path):
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+    assert client.get("/api/wishlist", headers=headers).status_code == 200
+    assert client.get("/api/wishlist", headers=headers).status_code == 200
+    stats = app.extensions["session_cache"].stats()
+    assert stats["misses"] == 1 and stats["hits"] == 1
+
+def test_logout_invalidates_cached_session(client):
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+    assert client.get("/api/wishlist", headers=headers).status_code == 200
+    assert client.post("/api/logout", headers=headers).status_code == 200
+    assert client.get("/api/wishlist", headers=headers).status_code == 401
+
+def test_suspension_takes_effect_after_invalidation(app, client, db_path):
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+    assert client.get("/api/wishlist", headers=headers).status_code == 200
+    conn = sqlite3.connect(db_path)
+    user_id = conn.execute("SELECT id FROM users WHERE email = 'cached@example.com'").fetchone()[0]
+    conn.execute("UPDATE users SET status = 'suspended' WHERE id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+    with app.app_context():
+        invalidate_user_sessions(user_id)
+    assert client.get("/api/wishlist", headers=headers).status_code == 403
+
+def test_expired_sessions_swept_in_batches(app, client):
+    token = _token(client, email="sweep@example.com")
+    with app.app_context():
+        conn = get_db()
+        user_id = conn.execute("SELECT id FROM users WHERE email = 'sweep@example.com'").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO sessions (user_id, token, expires_at) VALUES (?, ?, '2000-01-01T00:00:00')",
+            [(user_id, f"expired-{i}") for i in range(5)],
+        )
+        conn.commit()
+        # Expired rows are rejected without being deleted on the read path
+        assert get_current_user("expired-0") is None
+        assert not conn.in_transaction
+
+        result = purge_expired_sessions(conn, batch_size=2)
+        assert result["purged"] >= 5
+        assert result["batches"] >= 3
+        assert conn.execute("SELECT COUNT(*) FROM sessions WHERE token LIKE 'expired-%'").fetchone()[0] == 0
+    # Live sessions survive the sweep
+    assert client.get("/api/wishlist", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+def test_sweeper_only_runs_when_started_explicitly(app):
+    assert app.config["SESSION_SWEEP_INTERVAL"] > 0
+    assert "session_sweeper" not in app.extensions
+    assert not any(t.name == "session-sweeper" for t in threading.enumerate())
+
+    sweeper = start_session_sweeper(app)
+    try:
+        assert app.extensions["session_sweeper"] is sweeper and sweeper.is_alive()
+        assert sweeper.sweep()["purged"] >= 0
+    finally:
+        sweeper.stop()
+
+def test_login_rate_limited_per_email(client):
+    client.post("/api/register", json={"email": "limited@example.com", "password": "password123"})
+    codes = [
+        client.post("/api/login", json={"email": "limited@example.com", "password": "wrong-password"}).status_code
+        for _ in range(6)
+    ]
+    assert codes[:5] == [401] * 5
+    assert codes[5] == 429
+    res = client.post("/api/login", json={"email": "limited@example.com", "password": "password123"})
+    assert res.status_code == 429
+    assert int(res.headers["Retry-After"]) > 0
+    # Other accounts from the same client are unaffected
+    assert client.post("/api/login", json={"email": "other@example.com", "password": "x"}).status_code == 401
+
+def test_successful_logins_do_not_use_up_the_ip_bucket(app, client):
+    app.extensions.pop("login_limiters", None)  # rebuilt from the config below
+    app.config["LOGIN_RATE_PER_IP"] = (3, 1 / 3600)
+    credentials = {"email": "nat@example.com", "password": "password123"}
+    # Many users behind one address: successful registrations and logins are refunded
+    assert client.post("/api/register", json=credentials).status_code == 201
+    assert all(client.post("/api/login", json=credentials).status_code == 200 for _ in range(10))
+    assert client.post("/api/register", json=credentials).status_code == 409  # takes one IP token
+    codes = [client.post("/api/login", json={**credentials, "password": "wrong-password"}).status_code
+             for _ in range(3)]
+    assert codes == [401, 401, 429]
+
+def test_timed_out_hash_keeps_its_slot_until_it_finishes():
+    pool = HashingPool(workers=1, max_pending=1, timeout=0.3)
+    try:
+        assert pool.run(pow, 2, 10) == 1024  # start the worker process
+        with pytest.raises(HashingUnavailable):
+            pool.run(time.sleep, 1.0)
+        # Still hashing in the worker, so the pool is still full
+        with pytest.raises(HashingUnavailable):
+            pool.run(pow, 2, 10)
+        assert pool.stats()["rejected"] == 1
+        time.sleep(1.0)
+        assert pool.run(pow, 2, 10) == 1024
+    finally:
+        pool.shutdown()
+
+def test_hashing_pool_rejects_when_saturated(app, client):
+    pool = HashingPool(workers=1, max_pending=1)
+    try:
+        assert pool.run(pow, 2, 10) == 1024  # runs in a worker process
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            slow = ex.submit(pool.run, time.sleep, 0.5)
+            time.sleep(0.1)
+            started = time.perf_counter()
+            with pytest.raises(HashingUnavailable):
+                pool.run(pow, 2, 10)
+            assert time.perf_counter() - started < 0.1  # fails fast, no queueing
+            slow.result()
+        assert pool.stats()["rejected"] == 1
+    finally:
+        pool.shutdown()
+
+    app.extensions["hashing_pool"] = HashingPool(workers=0, max_pending=1)
+    with app.app_context():
+        get_hashing_pool()._slots.acquire()  # simulate a hash already in flight
+    res = client.post("/api/register", json={"email": "busy@example.com", "password": "password123"})
+    assert res.status_code == 503
+    assert "Retry-After" in res.headers
+
+SIGNED_CONFIG = {"AUTH_TOKEN_MODE": "signed", "SECRET_KEY": "test-signing-key"}
+
+@pytest.fixture
+def signed_client(make_app):
+    app = make_app(**SIGNED_CONFIG)
+    with app.test_client() as client:
+        yield app, client
+
+def test_signed_tokens_verify_without_database(signed_client):
+    app, client = signed_client
+    token = _token(client, email="signed@example.com")
+    assert token.startswith("v1.")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    pool = app.extensions["db_pool"]
+    before = pool.stats()["hits"] + pool.stats()["misses"]
+    with app.test_request_context(headers=headers):
+        user = get_current_user(token)
+    assert user["email"] == "signed@example.com" and user["role"] == "customer"
+    assert pool.stats()["hits"] + pool.stats()["misses"] == before  # no connection used
+
+    assert client.get("/api/wishlist", headers=headers).status_code == 200
+    # Tampering with the payload breaks the signature
+    forged = token.replace(token.split(".")[1], token.split(".")[1][::-1])
+    assert client.get("/api/wishlist", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+
+def test_signed_token_revocation(signed_client):
+    app, client = signed_client
+    token = _token(client, email="revoked@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/api/logout", headers=headers).status_code == 200
+    assert client.get("/api/wishlist", headers=headers).status_code == 401
+
+    token = client.post("/api/login", json={"email": "revoked@example.com", "password": "password123"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with app.app_context():
+        user_id = get_db().execute("SELECT id FROM users WHERE email = 'revoked@example.com'").fetchone()[0]
+        revoke_user_tokens(user_id)
+    assert client.get("/api/wishlist", headers=headers).status_code == 401
+    # A fresh login carries the new token_version and works again
+    token = client.post("/api/login", json={"email": "revoked@example.com", "password": "password123"}).get_json()["token"]
+    assert client.get("/api/wishlist", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+def test_signed_revocation_and_suspension_survive_restart(make_app, signed_client):
+    app, client = signed_client
+    token = _token(client, email="restart@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    with app.app_context():
+        user_id = get_db().execute("SELECT id FROM users WHERE email = 'restart@example.com'").fetchone()[0]
+        revoke_user_tokens(user_id)
+
+    # A new process (or another worker) has no in-memory revocation state
+    restarted = make_app(**SIGNED_CONFIG)
+    assert restarted.test_client().get("/api/wishlist", headers=headers).status_code == 401
+
+    token = client.post("/api/login", json={"email": "restart@example.com", "password": "password123"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with app.app_context():
+        conn = get_db()
+        conn.execute("UPDATE users SET status = 'suspended' WHERE id = ?", (user_id,))
+        conn.commit()
+    restarted = make_app(**SIGNED_CONFIG)
+    res = restarted.test_client().get("/api/wishlist", headers=headers)
+    assert res.status_code == 403
+    assert res.get_json()["error"] == "Account suspended"
+
+def test_signed_mode_requires_secret_key(make_app):
+    with pytest.raises(RuntimeError):
+        make_app(AUTH_TOKEN_MODE="signed")
@@ -0,0 +1,44 @@
+"""
+test_benchmarks.py
+------------------
+Smoke test for the endpoint benchmark suite and its baseline comparison.
+"""
+import copy
+
+from backend.benchmarks.endpoints import compare_to_baseline, run_benchmarks, same_machine
+from backend.datagen import generate_database
+
+
+def test_benchmarks_run_every_scenario_cleanly(tmp_path):
+    db = tmp_path / "tiny.db"
+    generate_database(db, scale=0.001, seed=1, echo=lambda *_: None)
+
+    report = run_benchmarks(db, requests=3, warmup=1)
+    scenarios = report["scenarios"]
+    assert len([name for name in scenarios if name.startswith("list_products")]) == 8
+    assert {"get_product", "create_order", "list_orders", "vendor_overview",
+            "wishlist", "wishlist_add", "wishlist_remove", "login"} <= set(scenarios)
+    for name, stats in scenarios.items():
+        assert stats["errors"] == 0, name
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+        assert stats["queries_per_request"] >= 1, name
+    assert compare_to_baseline(report, report) == ([], [])
+    assert same_machine(report, report)
+
+
+def test_regressions_are_reported_against_baseline():
+    baseline = {"scenarios": {"get_product": {
+        "errors": 0, "throughput_rps": 1000.0, "p95_ms": 2.0, "queries_per_request": 3.0,
+    }}}
+    ok = copy.deepcopy(baseline)
+    ok["scenarios"]["get_product"]["p95_ms"] = 2.4
+    assert compare_to_baseline(ok, baseline, tolerance=0.25) == ([], [])
+
+    worse = copy.deepcopy(baseline)
+    worse["scenarios"]["get_product"].update(p95_ms=3.0, throughput_rps=600.0, queries_per_request=4.0)
+    regressions, slowdowns = compare_to_baseline(worse, baseline, tolerance=0.25)
+    # Only the query count is machine-independent; timings are reported separately
+    assert regressions == ["get_product: queries/request 3.0 -> 4.0"]
+    assert len(slowdowns) == 2
+    # The committed baseline records no host, so its timings are advisory
+    assert not same_machine({"meta": {"host": "ci"}}, baseline)
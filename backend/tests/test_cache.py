@@ -0,0 +1,55 @@
+"""
+test_cache.py
+--------------
+Tests for the in-process LRU/TTL caches.
+"""
+import sqlite3
+
+from backend.cache import CatalogCache, LRUCache, get_cache_coherency
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1     # "a" is now most recently used
+    cache.set("c", 3)              # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    clock.now = 11
+    assert cache.get("a") is None  # expired
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 2
+
+def test_catalog_version_bump_drops_entries():
+    cache = CatalogCache(maxsize=10, ttl=60)
+    version = cache.version
+    cache.set("k", "v", version)
+    assert cache.get("k") == "v"
+    cache.bump()
+    assert cache.get("k") is None
+    # A response computed before the bump is never served afterwards
+    cache.set("k", "stale", version)
+    assert cache.get("k") is None
+
+def test_other_worker_write_drops_local_cache(app, client, db_path):
+    assert client.get("/api/products/2").headers["X-Cache"] == "MISS"
+    assert client.get("/api/products/2").headers["X-Cache"] == "HIT"
+
+    # Simulate another worker process writing through its own connection
+    other = sqlite3.connect(db_path)
+    other.execute("UPDATE products SET stock = 0 WHERE id = 2")
+    other.commit()
+    other.close()
+
+    res = client.get("/api/products/2")
+    assert res.headers["X-Cache"] == "MISS"
+    assert res.get_json()["stock"] == 0
+    assert get_cache_coherency(app).invalidations == 1
@@ -0,0 +1,21 @@
+"""
+test_contention.py
+------------------
+Short run of the concurrent write-load harness: it must finish, record
+traffic for every operation, and find all of its invariants intact.
+"""
+from backend.benchmarks.contention import run_contention
+from backend.datagen import generate_database
+
+
+def test_mixed_write_load_keeps_invariants(tmp_path):
+    db = tmp_path / "load.db"
+    generate_database(db, scale=0.001, seed=2, echo=lambda *_: None)
+
+    report = run_contention(db, processes=2, threads=2, duration=1.0, seed=2)
+
+    summary = report["summary"]
+    assert set(summary["ops"]) == {"checkout", "stock", "review", "wishlist"}
+    assert all(op["ok"] > 0 for op in summary["ops"].values())
+    assert summary["other_errors"] == 0
+    assert report["invariants"] and all(problem is None for problem in report["invariants"].values())
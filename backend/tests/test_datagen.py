@@ -0,0 +1,68 @@
+"""
+test_datagen.py
+---------------
+Tests for the synthetic `init_db.py --scale` data generator.
+"""
+import sqlite3
+
+from backend.datagen import generate_database, scaled_counts
+from backend.migrations import MIGRATIONS
+
+CONTENT_QUERIES = (
+    "SELECT id, name, price, category, stock, vendor_id FROM products ORDER BY id",
+    "SELECT product_id, user_id, rating FROM reviews ORDER BY id",
+    "SELECT order_id, product_id, quantity, price_at_purchase FROM order_items ORDER BY id",
+    "SELECT user_id, product_id FROM wishlist ORDER BY user_id, product_id",
+)
+
+
+def _content(path):
+    conn = sqlite3.connect(path)
+    rows = [conn.execute(sql).fetchall() for sql in CONTENT_QUERIES]
+    conn.close()
+    return rows
+
+
+def test_generated_database_is_complete_and_consistent(tmp_path):
+    path = tmp_path / "scale.db"
+    stats = generate_database(path, scale=0.002, seed=3, echo=lambda *_: None)
+    counts = scaled_counts(0.002)
+
+    conn = sqlite3.connect(path)
+    count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    assert count("products") == counts["products"] == stats["tables"]["products"]["rows"]
+    assert count("reviews") == counts["reviews"]
+    assert count("orders") == counts["orders"]
+    assert count("wishlist") == counts["wishlist"]
+    # Wishlist pairs are sampled across all customers, not the lowest ids first
+    assert conn.execute("SELECT MAX(user_id) FROM wishlist").fetchone()[0] == \
+        conn.execute("SELECT MAX(id) FROM users WHERE role = 'customer'").fetchone()[0]
+    assert count("users") == counts["vendors"] + counts["customers"] + 1  # + admin
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # Order totals match their items; derived tables were backfilled
+    assert conn.execute("""
+        SELECT COUNT(*) FROM orders o
+        WHERE abs(o.total_amount - (SELECT SUM(quantity * price_at_purchase)
+                                    FROM order_items WHERE order_id = o.id)) > 0.01
+    """).fetchone()[0] == 0
+    assert conn.execute("SELECT SUM(review_count) FROM product_stats").fetchone()[0] == counts["reviews"]
+    assert conn.execute("SELECT SUM(total_products) FROM vendor_stats").fetchone()[0] == counts["products"]
+    assert conn.execute("SELECT COUNT(*) FROM products_fts WHERE products_fts MATCH 'Kettlebell'").fetchone()[0] > 0
+    conn.close()
+
+    # Same seed, same data
+    again = tmp_path / "again.db"
+    generate_database(again, scale=0.002, seed=3, echo=lambda *_: None)
+    assert _content(path) == _content(again)
+
+
+def test_generated_users_can_log_in(make_app, tmp_path):
+    path = tmp_path / "scale.db"
+    generate_database(path, scale=0.001, seed=0, echo=lambda *_: None)
+    with make_app(DATABASE=path).test_client() as client:
+        response = client.post("/api/login",
+                               json={"email": "vendor@example.com", "password": "password123"})
+        assert response.status_code == 200
+        assert response.get_json()["user"]["id"] == 2
@@ -0,0 +1,146 @@
+"""
+test_db.py
+-----------
+Tests for the pooled connection helpers in db_utils.
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from backend.db_utils import ConnectionPool, PoolTimeout, get_pool
+from backend.migrations import LATEST_VERSION, MIGRATIONS, apply_migrations
+
+def test_pool_reuses_connections(app, client):
+    for _ in range(5):
+        assert client.get("/api/health").status_code == 200
+    stats = get_pool(app).stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 4
+    assert stats["in_use"] == 0
+
+def test_pooled_connection_pragmas(db_path):
+    pool = ConnectionPool(db_path, max_size=1)
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+    pool.release(conn)
+    pool.close()
+
+def test_pool_rolls_back_on_release(db_path):
+    pool = ConnectionPool(db_path, max_size=1)
+    conn = pool.acquire()
+    conn.execute("UPDATE products SET stock = 12345 WHERE id = 1")
+    pool.release(conn)
+    conn = pool.acquire()
+    assert conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0] != 12345
+    pool.release(conn)
+    pool.close()
+
+def test_pool_waits_and_times_out(db_path):
+    pool = ConnectionPool(db_path, max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    threading.Timer(0.02, pool.release, args=(conn,)).start()
+    pool.timeout = 2.0
+    pool.release(pool.acquire())
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["wait_time_ms"] > 0
+    pool.close()
+
+def test_migrations_upgrade_in_place(app, db_path):
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    versions = [r[0] for r in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    assert versions == [v for v, _, _ in MIGRATIONS]
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_products_active_created", "idx_reviews_product_rating",
+            "idx_orders_user_created", "idx_order_items_order"} <= indexes
+    # Re-running is a no-op
+    assert apply_migrations(conn) == []
+    conn.close()
+
+def test_migrations_on_empty_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / "empty.db")
+    assert apply_migrations(conn) == [v for v, _, _ in MIGRATIONS]
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC", (1,)
+    ).fetchall()
+    assert any("idx_orders_user_created" in row[-1] for row in plan)
+    conn.close()
+
+def test_product_stats_match_reviews(app, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO reviews (product_id, user_id, rating) VALUES (?, 1, ?)",
+        [(3, 4), (3, 1), (5, 5), (5, 3)],
+    )
+    conn.execute("UPDATE reviews SET rating = 2 WHERE product_id = 3 AND rating = 4")
+    conn.execute("UPDATE reviews SET product_id = 6 WHERE product_id = 5 AND rating = 3")
+    conn.execute("DELETE FROM reviews WHERE product_id = 1")
+    conn.commit()
+
+    recomputed = conn.execute(
+        """SELECT product_id, COUNT(*), SUM(rating), SUM(rating = 1), SUM(rating = 2),
+                  SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+           FROM reviews GROUP BY product_id ORDER BY product_id"""
+    ).fetchall()
+    stored = conn.execute(
+        """SELECT product_id, review_count, rating_sum, rating_1, rating_2,
+                  rating_3, rating_4, rating_5
+           FROM product_stats WHERE review_count > 0 ORDER BY product_id"""
+    ).fetchall()
+    assert stored == recomputed
+    conn.close()
+
+def test_vendor_stats_match_orders_and_stock(app, client, db_path):
+    assert client.post("/api/orders", json={"items": [
+        {"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1},
+    ]}).status_code == 201
+    assert client.put("/api/vendor/products/1", json={"stock": 0, "low_stock_threshold": 5}).status_code == 200
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    last_order = conn.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+    conn.execute("UPDATE orders SET status = 'cancelled' WHERE id = ?", (last_order,))
+    conn.execute("UPDATE orders SET status = 'processing' WHERE id = ?", (last_order,))
+    conn.execute("UPDATE orders SET status = 'delivered' WHERE id = (SELECT MIN(id) FROM orders)")
+    conn.execute("DELETE FROM orders WHERE id = (SELECT MIN(id) FROM orders WHERE status = 'placed')")
+    conn.execute("UPDATE products SET vendor_id = 1 WHERE id = 2")
+    conn.execute("INSERT INTO products (name, price, stock, low_stock_threshold, vendor_id) VALUES ('Band', 5, 1, 3, 2)")
+    conn.execute("INSERT INTO products (name, price, stock, low_stock_threshold, vendor_id) VALUES ('Mat', 5, 0, 3, 2)")
+    conn.execute("DELETE FROM products WHERE name = 'Mat'")
+    conn.commit()
+
+    on_order = dict(conn.execute(
+        """SELECT oi.product_id, SUM(oi.quantity) FROM order_items oi
+           JOIN orders o ON o.id = oi.order_id
+           WHERE o.status IN ('placed', 'processing', 'shipped')
+           GROUP BY oi.product_id"""
+    ).fetchall())
+    stored = dict(conn.execute("SELECT product_id, on_order_qty FROM product_stats WHERE on_order_qty != 0").fetchall())
+    assert stored == on_order
+
+    recomputed = conn.execute(
+        """SELECT p.vendor_id, COUNT(*),
+                  SUM(COALESCE(p.stock, 0) <= COALESCE(p.low_stock_threshold, 0)
+                      AND COALESCE(p.low_stock_threshold, 0) > 0),
+                  COALESCE(SUM(ps.on_order_qty), 0)
+           FROM products p LEFT JOIN product_stats ps ON ps.product_id = p.id
+           GROUP BY p.vendor_id ORDER BY p.vendor_id"""
+    ).fetchall()
+    vendors = conn.execute(
+        """SELECT vendor_id, total_products, low_stock_count, on_order_total
+           FROM vendor_stats WHERE total_products > 0 ORDER BY vendor_id"""
+    ).fetchall()
+    assert vendors == recomputed
+    conn.close()
+
+    # get_current_vendor() is the seeded vendor (id 2)
+    summary = client.get("/api/vendor/overview").get_json()["summary"]
+    expected = next(row for row in vendors if row[0] == 2)
+    assert (summary["total_products"], summary["low_stock_count"], summary["on_order_total"]) == tuple(expected[1:])
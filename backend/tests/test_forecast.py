@@ -0,0 +1,62 @@
+"""
+test_forecast.py
+-----------------
+Tests for the stockout forecast batch job and its use in /api/vendor/overview.
+"""
+import sqlite3
+import warnings
+
+import numpy as np
+
+from backend.forecast import compute_velocities, ewma_weights, refresh_stock_forecasts
+
+def test_velocity_is_weighted_average_of_daily_units():
+    weights = ewma_weights(history_days=4, halflife_days=1)
+    assert np.isclose(weights.sum(), 1.0) and np.isclose(weights[0], 2 * weights[1])
+
+    product_ids = np.array([3.0, 7.0, 9.0])
+    sales = np.array([
+        [3, 0, 4], [3, 2, 8],   # product 3: 4 units today, 8 two days ago
+        [9, 1, 5],
+        [5, 0, 100],            # unknown product: ignored
+        [7, 10, 100],           # outside the history window: ignored
+    ], dtype=float)
+    velocity = compute_velocities(product_ids, sales, history_days=4, halflife_days=1)
+    assert np.allclose(velocity, [4 * weights[0] + 8 * weights[2], 0, 5 * weights[1]])
+
+def test_forecast_feeds_vendor_overview(client, db_path):
+    assert client.post("/api/orders", json={"items": [{"product_id": 1, "quantity": 5}]}).status_code == 201
+
+    conn = sqlite3.connect(db_path)
+    result = refresh_stock_forecasts(conn)
+    assert result["products"] == conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    velocity, stored_days = conn.execute(
+        "SELECT daily_velocity, days_until_stockout FROM stock_forecasts WHERE product_id = 1"
+    ).fetchone()
+    stock = conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0]
+    conn.close()
+    assert velocity > 0
+    assert abs(stored_days - stock / velocity) < 0.1
+
+    products = {p["id"]: p for p in client.get("/api/vendor/overview").get_json()["products"]}
+    assert products[1]["days_until_stockout"] == round(stock / velocity, 1)
+    unsold = [p for p in products.values() if not p["daily_velocity"]]
+    assert all(p["days_until_stockout"] is None for p in unsold)
+
+def test_out_of_stock_product_without_sales_has_no_forecast(client, db_path):
+    conn = sqlite3.connect(db_path)
+    unsold = conn.execute(
+        "SELECT id FROM products WHERE id NOT IN (SELECT product_id FROM order_items) LIMIT 1"
+    ).fetchone()[0]
+    conn.execute("UPDATE products SET stock = 0 WHERE id = ?", (unsold,))
+    conn.commit()
+
+    # 0 stock / 0 velocity must not raise NumPy's "invalid value" warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        refresh_stock_forecasts(conn)
+    row = conn.execute(
+        "SELECT daily_velocity, days_until_stockout FROM stock_forecasts WHERE product_id = ?", (unsold,)
+    ).fetchone()
+    conn.close()
+    assert row == (0, None)
@@ -0,0 +1,68 @@
+"""
+test_metrics.py
+----------------
+Tests for request metrics and the Prometheus /metrics endpoint.
+"""
+import json
+import os
+import time
+
+import pytest
+
+from backend.metrics import histogram_quantile
+
+@pytest.fixture
+def metrics_app(make_app, tmp_path):
+    return make_app(
+        METRICS_DIR=tmp_path / "metrics",
+        METRICS_FLUSH_INTERVAL=0,
+        METRICS_DB_TIME=True,
+    )
+
+def test_histogram_quantile_interpolates_within_bucket():
+    buckets = (0.1, 0.2, 0.4)
+    assert histogram_quantile(0.5, buckets, [0, 10, 0, 0]) == pytest.approx(0.15)
+    assert histogram_quantile(0.99, buckets, [50, 40, 0, 10]) == 0.4  # lands in the +Inf bucket
+    assert histogram_quantile(0.5, buckets, [0, 0, 0, 0]) is None
+
+def test_metrics_endpoint_reports_routes(client):
+    client.get("/api/products/1")
+    client.get("/api/products/1")
+    client.get("/api/products/999999")
+    text = client.get("/metrics").get_data(as_text=True)
+
+    labels = 'blueprint="products",endpoint="products.get_product",method="GET"'
+    assert f'http_request_duration_seconds_count{{{labels}}} 3' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f'http_request_duration_quantile_seconds{{{labels},quantile="0.99"}}' in text
+    assert "http_request_db_seconds_total" not in text  # METRICS_DB_TIME is off by default
+    assert 'http_requests_total{endpoint="products.get_product",method="GET",status="200"} 2' in text
+    assert 'http_requests_total{endpoint="products.get_product",method="GET",status="404"} 1' in text
+    assert 'http_requests_in_flight{endpoint="products.get_product"} 0' in text
+    assert "endpoint=\"metrics\"" not in text
+
+def test_metrics_merge_across_worker_files(metrics_app):
+    client = metrics_app.test_client()
+    client.get("/api/products/1")
+    directory = metrics_app.config["METRICS_DIR"]
+    own = json.loads((directory / f"metrics-{os.getpid()}.json").read_text())
+
+    # Pretend a second worker served the same route twice
+    other = dict(own, pid=999999, in_flight={"products.get_product": 3})
+    key = "products|products.get_product|GET"
+    other["routes"] = {key: dict(own["routes"][key], count=2, counts=[2] + [0] * (len(own["buckets"])))}
+    other["statuses"] = {"products.get_product|GET|200": 2}
+    other_path = directory / "metrics-999999.json"
+    other_path.write_text(json.dumps(other))
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{blueprint="products",endpoint="products.get_product",method="GET"} 3' in text
+    assert 'http_request_db_time_ratio{blueprint="products",endpoint="products.get_product",method="GET"}' in text
+    assert 'http_requests_total{endpoint="products.get_product",method="GET",status="200"} 3' in text
+    assert 'http_requests_in_flight{endpoint="products.get_product"} 3' in text  # fresh file: still serving
+
+    stale = time.time() - 3600
+    os.utime(other_path, (stale, stale))
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{blueprint="products",endpoint="products.get_product",method="GET"} 3' in text
+    assert 'http_requests_in_flight{endpoint="products.get_product"} 0' in text
@@ -0,0 +1,100 @@
+"""
+test_orders.py
+---------------
+Tests for /api/orders, including concurrent checkouts against one product.
+"""
+import sqlite3
+import threading
+
+def test_create_and_list_order(client):
+    res = client.post("/api/orders", json={"items": [
+        {"product_id": 1, "quantity": 2},
+        {"product_id": 2, "quantity": 1},
+        {"product_id": 1, "quantity": 1},
+    ]})
+    assert res.status_code == 201
+    order = res.get_json()["order"]
+    assert {i["product_id"]: i["quantity"] for i in order["items"]} == {1: 3, 2: 1}
+    assert round(order["total_amount"], 2) == round(3 * 29.99 + 89.99, 2)
+
+    listed = client.get("/api/orders").get_json()["items"]
+    assert listed[0]["id"] == order["id"]
+
+def test_insufficient_stock_leaves_nothing_behind(app, client, db_path):
+    conn = sqlite3.connect(db_path)
+    orders_before = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+    stock_before = conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0]
+
+    res = client.post("/api/orders", json={"items": [
+        {"product_id": 1, "quantity": 1},
+        {"product_id": 4, "quantity": 999},
+    ]})
+    assert res.status_code == 400
+    assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == orders_before
+    assert conn.execute("SELECT stock FROM products WHERE id = 1").fetchone()[0] == stock_before
+    conn.close()
+
+def test_invalid_items_rejected(client):
+    assert client.post("/api/orders", json={"items": []}).status_code == 400
+    assert client.post("/api/orders", json={"items": [{"product_id": 1, "quantity": 0}]}).status_code == 400
+    assert client.post("/api/orders", json={"items": [{"product_id": 999999, "quantity": 1}]}).status_code == 400
+
+def test_concurrent_checkouts_never_oversell(app, db_path):
+    stock, threads, attempts = 25, 12, 6
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE products SET stock = ? WHERE id = 5", (stock,))
+    conn.commit()
+    sold_before = conn.execute(
+        "SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = 5"
+    ).fetchone()[0]
+
+    results = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def shopper():
+        client = app.test_client()
+        start.wait()
+        for _ in range(attempts):
+            res = client.post("/api/orders", json={"items": [{"product_id": 5, "quantity": 1}]})
+            with lock:
+                results.append(res.status_code)
+
+    workers = [threading.Thread(target=shopper) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert results.count(201) == stock
+    assert set(results) <= {201, 400, 409}
+    assert conn.execute("SELECT stock FROM products WHERE id = 5").fetchone()[0] == 0
+    sold = conn.execute("SELECT SUM(quantity) FROM order_items WHERE product_id = 5").fetchone()[0]
+    assert sold - sold_before == stock
+    conn.close()
+
+def test_idempotency_key_replays_without_second_order(client, db_path):
+    conn = sqlite3.connect(db_path)
+    stock_before = conn.execute("SELECT stock FROM products WHERE id = 6").fetchone()[0]
+    body = {"items": [{"product_id": 6, "quantity": 2}]}
+    headers = {"Idempotency-Key": "checkout-abc-123"}
+
+    first = client.post("/api/orders", json=body, headers=headers)
+    retry = client.post("/api/orders", json=body, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json()
+    assert conn.execute("SELECT stock FROM products WHERE id = 6").fetchone()[0] == stock_before - 2
+
+    # Same key, different request body
+    other = client.post("/api/orders", json={"items": [{"product_id": 6, "quantity": 1}]}, headers=headers)
+    assert other.status_code == 422
+
+    # Expired keys are no longer replayed
+    conn.execute("UPDATE idempotency_keys SET expires_at = '2000-01-01T00:00:00'")
+    conn.commit()
+    again = client.post("/api/orders", json=body, headers=headers)
+    assert again.status_code == 201
+    assert again.get_json()["order"]["id"] != first.get_json()["order"]["id"]
+    assert conn.execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0] == 1
+    conn.close()
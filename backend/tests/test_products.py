@@ -3,6 +3,11 @@ test_products.py
 ----------------
 Tests for all product routes.
 """
+import sqlite3
+
+from backend.db_utils import get_db
+from backend.init_db import main as init_db_main
+from backend.routes.products import _encode_cursor
 
 def test_health_endpoint(client):
     res = client.get("/api/health")
@@ -33,3 +38,150 @@ def test_product_write_stubs(client):
     r3 = client.delete("/api/products/1")
     for r in (r1, r2, r3):
         assert r.status_code == 501
+
+def test_search_uses_full_text_index(client):
+    res = client.get("/api/products?search=yoga")
+    names = [p["name"] for p in res.get_json()["items"]]
+    assert names and names[0] == "Yoga Mat"
+    # Prefix matching while typing, case-insensitive
+    res = client.get("/api/products?search=DUMB")
+    assert [p["name"] for p in res.get_json()["items"]] == ["Dumbbells Set"]
+    # FTS operators in user input are treated as plain words
+    res = client.get('/api/products?search=" OR NEAR(')
+    assert res.status_code == 200
+
+def test_search_ranks_name_matches_first(client):
+    # "shirt" is in the Compression Shirt name; "moisture" only in its description
+    res = client.get("/api/products?search=shirt")
+    assert res.get_json()["items"][0]["name"] == "Compression Shirt"
+    res = client.get("/api/products?search=moisture")
+    assert [p["name"] for p in res.get_json()["items"]] == ["Compression Shirt"]
+
+def test_search_index_follows_product_updates(app, client):
+    with app.app_context():
+        conn = get_db()
+        conn.execute("UPDATE products SET name = 'Kettlebell Pro 20kg' WHERE name = 'Kettlebell 16kg'")
+        conn.commit()
+    names = [p["name"] for p in client.get("/api/products?search=kettlebell").get_json()["items"]]
+    assert names == ["Kettlebell Pro 20kg"]
+    assert client.get("/api/products?search=16kg").get_json()["items"] == []
+
+def test_list_products_keyset_pagination(client):
+    everything = client.get("/api/products?limit=200").get_json()
+    assert everything["next_cursor"] is None
+    expected = [p["id"] for p in everything["items"]]
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/products?limit=5" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        assert len(body["items"]) <= 5
+        seen += [p["id"] for p in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+def test_search_pagination_and_bad_cursor(client):
+    first = client.get("/api/products?search=s&limit=3").get_json()
+    assert len(first["items"]) == 3 and first["next_cursor"]
+    second = client.get(f"/api/products?search=s&limit=3&cursor={first['next_cursor']}").get_json()
+    assert not {p["id"] for p in first["items"]} & {p["id"] for p in second["items"]}
+    # A search cursor is not valid for the plain listing, and garbage is rejected
+    assert client.get(f"/api/products?cursor={first['next_cursor']}").status_code == 400
+    assert client.get("/api/products?cursor=not-a-cursor").status_code == 400
+    # Well-formed cursors whose key has the wrong types
+    for mode, key in (("search", ["0.5", 1]), ("search", [{"x": 1}, 1]), ("recent", [None, 1]),
+                      ("recent", ["2024-01-01 00:00:00", [1]]), ("search", [-1.5, True])):
+        bad = _encode_cursor(mode, key)
+        url = "/api/products?search=s&cursor=" if mode == "search" else "/api/products?cursor="
+        assert client.get(url + bad).status_code == 400
+    assert client.get("/api/products?limit=0").status_code == 400
+
+def _login(client, email="reviewer@example.com", password="password123"):
+    client.post("/api/register", json={"email": email, "password": password})
+    token = client.post("/api/login", json={"email": email, "password": password}).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_review_updates_rating_aggregates(client):
+    before = client.get("/api/products/1").get_json()
+    assert before["review_count"] == 1 and before["avg_rating"] == 5.0
+
+    headers = _login(client)
+    res = client.post("/api/products/1/reviews", json={"rating": 2, "comment": "meh"}, headers=headers)
+    assert res.status_code == 201
+
+    after = client.get("/api/products/1").get_json()
+    assert after["review_count"] == 2
+    assert after["avg_rating"] == 3.5
+    assert after["rating_histogram"] == {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1}
+    listed = {p["id"]: p for p in client.get("/api/products?limit=200").get_json()["items"]}
+    assert listed[1]["review_count"] == 2 and listed[1]["avg_rating"] == 3.5
+
+def test_catalog_cache_hits_and_invalidation(client):
+    first = client.get("/api/products/4")
+    assert first.headers["X-Cache"] == "MISS"
+    second = client.get("/api/products/4")
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == first.get_json()
+    assert client.get("/api/products?category=apparel").headers["X-Cache"] == "MISS"
+    assert client.get("/api/products?category=apparel").headers["X-Cache"] == "HIT"
+
+    # Placing an order changes stock, so cached catalog reads are dropped
+    res = client.post("/api/orders", json={"items": [{"product_id": 4, "quantity": 1}]})
+    assert res.status_code == 201
+    third = client.get("/api/products/4")
+    assert third.headers["X-Cache"] == "MISS"
+    assert third.get_json()["stock"] == first.get_json()["stock"] - 1
+    assert client.get("/api/products?category=apparel").headers["X-Cache"] == "MISS"
+
+def test_conditional_get_returns_304_until_catalog_changes(client):
+    first = client.get("/api/products?category=equipment")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "public, no-cache"
+
+    again = client.get("/api/products?category=equipment", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+    # Different filters have different tags
+    other = client.get("/api/products?category=apparel", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+    detail = client.get("/api/products/3")
+    assert client.get("/api/products/3", headers={"If-None-Match": detail.headers["ETag"]}).status_code == 304
+
+    client.post("/api/orders", json={"items": [{"product_id": 3, "quantity": 1}]})
+    changed = client.get("/api/products/3", headers={"If-None-Match": detail.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != detail.headers["ETag"]
+
+def test_etags_survive_a_restart_on_the_same_database(make_app, client, db_path):
+    seen = client.get("/api/products/3").headers["ETag"]
+    with make_app().test_client() as restarted:
+        assert restarted.get("/api/products/3", headers={"If-None-Match": seen}).status_code == 304
+
+    # A reset epoch (or missing row) gets a fresh one on the next start
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE cache_generation SET epoch = '' WHERE id = 1")
+    with make_app().test_client() as restarted:
+        assert restarted.get("/api/products/3").headers["ETag"] != seen
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT epoch FROM cache_generation").fetchone()[0] != ""
+
+def test_etags_do_not_repeat_after_restoring_a_backup(make_app, client, db_path, tmp_path):
+    backup_path = tmp_path / "backup.db"
+    with sqlite3.connect(db_path) as src, sqlite3.connect(backup_path) as dst:
+        src.backup(dst)
+
+    client.post("/api/orders", json={"items": [{"product_id": 3, "quantity": 1}]})
+    seen = client.get("/api/products/3").headers["ETag"]
+
+    # Restore the backup, renew its epoch, and let it reach the same generation with other content
+    init_db_main(["--renew-cache-epoch", "--db", str(backup_path)])
+    with make_app(DATABASE=backup_path).test_client() as other:
+        other.post("/api/orders", json={"items": [{"product_id": 3, "quantity": 2}]})
+        res = other.get("/api/products/3", headers={"If-None-Match": seen})
+        assert res.status_code == 200
+        assert res.headers["ETag"] != seen
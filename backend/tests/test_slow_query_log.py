@@ -0,0 +1,55 @@
+"""
+test_slow_query_log.py
+-----------------------
+Tests for the slow query log (SLOW_QUERY_THRESHOLD_MS).
+"""
+import json
+import sqlite3
+
+import pytest
+
+from backend.slow_query_log import SlowQueryLog, explain_query_plan, param_shapes
+from backend.sql_profiler import StatementRecord
+
+@pytest.fixture
+def slow_app(make_app, tmp_path):
+    return make_app(
+        SLOW_QUERY_THRESHOLD_MS=0,  # log everything
+        SLOW_QUERY_LOG=tmp_path / "slow.log",
+    )
+
+def test_param_shapes_hide_values():
+    assert param_shapes((1, "secret", None, 2.5)) == ["int", "str[6]", "null", "float"]
+    assert param_shapes({"email": "a@b.c"}) == {"email": "str[5]"}
+
+def test_explain_query_plan_marks_scans():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)")
+    assert explain_query_plan(conn, "SELECT * FROM t WHERE name = ?", ("x",)) == ["SCAN t"]
+    assert explain_query_plan(conn, "SELECT * FROM t WHERE id = ?", (1,))[0].startswith("SEARCH t")
+
+def test_slow_statements_logged_with_plan_once(slow_app, tmp_path):
+    client = slow_app.test_client()
+    client.get("/api/products/1")
+    client.get("/api/products/2")
+
+    entries = [json.loads(line) for line in (tmp_path / "slow.log").read_text().splitlines()]
+    product_reads = [e for e in entries if e["endpoint"] == "products.get_product" and "FROM products p" in e["sql"]]
+    assert len(product_reads) >= 2
+    first, second = product_reads[0], product_reads[1]
+    assert first["params"] == ["int"] and first["duration_ms"] >= 0
+    assert first["plan"] and first["full_scan"] is False
+    assert "plan" not in second  # captured once per statement shape
+
+def test_explained_shapes_are_bounded(tmp_path):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a, b, c)")
+    slow_log = SlowQueryLog(tmp_path / "slow.log", 0, explained_shapes=2)
+    for column in ("a", "b", "c", "a"):
+        slow_log.log(conn, StatementRecord(f"SELECT {column} FROM t"))
+    slow_log.close()
+
+    entries = [json.loads(line) for line in (tmp_path / "slow.log").read_text().splitlines()]
+    assert len(slow_log.explained) == 2
+    # "a" was evicted by "b" and "c", so its plan is captured again
+    assert ["plan" in e for e in entries] == [True, True, True, True]
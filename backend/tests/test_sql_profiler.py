@@ -0,0 +1,46 @@
+"""
+test_sql_profiler.py
+---------------------
+Tests for the opt-in per-request SQL profiler (SQL_PROFILING).
+"""
+import pytest
+from flask import g
+
+from backend.db_utils import get_db
+from backend.sql_profiler import get_sql_profiler, normalize_sql
+
+@pytest.fixture
+def profiled_app(make_app):
+    return make_app(SQL_PROFILING=True)
+
+def test_normalize_sql_groups_statement_shapes():
+    assert normalize_sql("SELECT *\n  FROM products WHERE id = 12") == "SELECT * FROM products WHERE id = ?"
+    assert normalize_sql("SELECT 1 FROM t WHERE name = 'it''s' AND id IN (?, ?, ?)") == \
+        "SELECT ? FROM t WHERE name = ? AND id IN (?...)"
+
+def test_profiler_headers_in_debug_mode(profiled_app):
+    profiled_app.config["SQL_PROFILING_HEADERS"] = True
+    res = profiled_app.test_client().get("/api/products/1")
+    assert res.status_code == 200
+    assert int(res.headers["X-SQL-Queries"]) >= 1
+    assert float(res.headers["X-SQL-Time-ms"]) > 0
+    assert "X-SQL-N-Plus-One" not in res.headers
+
+def test_profiler_flags_repeated_shapes_and_aggregates(profiled_app):
+    with profiled_app.test_request_context("/"):
+        conn = get_db()
+        for product_id in range(1, 7):
+            conn.execute("SELECT name FROM products WHERE id = ?", (product_id,)).fetchone()
+        list(conn.execute("SELECT id FROM products"))
+        repeated = g.sql_profile.repeated_shapes()
+        assert repeated == {"SELECT name FROM products WHERE id = ?": 6}
+        assert g.sql_profile.statements[-1].rows > 1
+
+    client = profiled_app.test_client()
+    client.get("/api/products/1")
+    client.get("/api/products/2")
+    with profiled_app.app_context():
+        stats = get_sql_profiler().stats()
+    endpoint = stats["endpoints"]["products.get_product"]
+    assert endpoint["requests"] == 2 and endpoint["queries"] >= 2
+    assert stats["top_shapes"]
@@ -0,0 +1,78 @@
+"""
+test_vendor_analytics.py
+-------------------------
+Tests for GET /api/vendor/analytics (sales time series for the seeded vendor).
+"""
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+def test_analytics_matches_order_lines(client, db_path):
+    for items in ([{"product_id": 1, "quantity": 2}], [{"product_id": 1, "quantity": 1}, {"product_id": 3, "quantity": 4}]):
+        assert client.post("/api/orders", json={"items": items}).status_code == 201
+
+    res = client.get("/api/vendor/analytics?interval=week&window=2&limit=50")
+    assert res.status_code == 200
+    data = res.get_json()
+    assert len(data["buckets"]) == len(data["totals"]["revenue"])
+    assert data["next_offset"] is None
+
+    conn = sqlite3.connect(db_path)
+    start = (datetime.now(timezone.utc).date() - timedelta(days=89)).isoformat()
+    expected = conn.execute(
+        """SELECT oi.product_id, SUM(oi.quantity), ROUND(SUM(oi.quantity * oi.price_at_purchase), 2),
+                  COUNT(DISTINCT oi.order_id)
+           FROM order_items oi JOIN orders o ON o.id = oi.order_id
+           JOIN products p ON p.id = oi.product_id
+           WHERE p.vendor_id = 2 AND o.created_at >= ? AND o.status != 'cancelled'
+           GROUP BY oi.product_id ORDER BY oi.product_id""",
+        (start,),
+    ).fetchall()
+    conn.close()
+
+    got = sorted((p["product_id"], sum(p["units"]), round(sum(p["revenue"]), 2), sum(p["orders"])) for p in data["products"])
+    assert got == [tuple(row) for row in expected]
+    # Ranked by revenue, and series only list buckets with something in them
+    revenues = [sum(p["revenue"]) for p in data["products"]]
+    assert revenues == sorted(revenues, reverse=True)
+    for p in data["products"]:
+        assert set(p["buckets"]) <= set(data["buckets"])
+        assert all(p["units"][i] or p["rolling_units"][i] or p["revenue"][i] or p["rolling_revenue"][i]
+                   for i in range(len(p["buckets"])))
+    # The latest rolling bucket covers this week's orders
+    assert data["totals"]["rolling_units"][-1] >= 7
+    assert data["totals"]["orders"][-1] >= 2
+
+def test_analytics_products_are_opt_in_and_paginated(client):
+    for product_id in (1, 3):
+        assert client.post("/api/orders", json={"items": [{"product_id": product_id, "quantity": 1}]}).status_code == 201
+
+    assert "products" not in client.get("/api/vendor/analytics").get_json()
+
+    ranked = client.get("/api/vendor/analytics?limit=50").get_json()["products"]
+    first = client.get("/api/vendor/analytics?limit=1").get_json()
+    assert [p["product_id"] for p in first["products"]] == [ranked[0]["product_id"]]
+    assert first["next_offset"] == 1
+    second = client.get("/api/vendor/analytics?limit=1&offset=1").get_json()
+    assert [p["product_id"] for p in second["products"]] == [ranked[1]["product_id"]]
+
+    one = client.get("/api/vendor/analytics?product_id=3").get_json()
+    assert [p["product_id"] for p in one["products"]] == [3]
+    assert one["totals"]["units"][-1] == one["products"][0]["units"][-1]
+    assert client.get("/api/vendor/analytics?product_id=999999").status_code == 404
+
+def test_analytics_default_range_ends_on_the_utc_day(client, db_path):
+    # created_at is stored in UTC, so the window must end on SQLite's date('now'), not local today
+    conn = sqlite3.connect(db_path)
+    utc_today = conn.execute("SELECT date('now')").fetchone()[0]
+    conn.close()
+    assert client.get("/api/vendor/analytics").get_json()["buckets"][-1] == utc_today
+
+def test_analytics_rejects_bad_parameters(client):
+    assert client.get("/api/vendor/analytics?start=2024-13-01").status_code == 400
+    assert client.get("/api/vendor/analytics?start=2024-02-01&end=2024-01-01").status_code == 400
+    assert client.get("/api/vendor/analytics?interval=month").status_code == 400
+    assert client.get("/api/vendor/analytics?start=2020-01-01&end=2024-01-01").status_code == 400
+    assert client.get("/api/vendor/analytics?limit=0").status_code == 400
+    assert client.get("/api/vendor/analytics?offset=-1").status_code == 400
+    empty = client.get("/api/vendor/analytics?start=2001-01-01&end=2001-01-10&limit=10").get_json()
+    assert empty["products"] == [] and empty["totals"]["units"] == [0] * 10
@@ -0,0 +1,220 @@
+"""
+test_write_queue.py
+-------------------
+Tests for the single-writer write queue: group commit, per-unit rollback,
+the routes that use it when WRITE_QUEUE_ENABLED is set, and batched login
+session inserts (SESSION_BATCHING).
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.secruity import get_current_user
+from backend.write_queue import WriteQueue, WriteQueueTimeout, get_session_queue, get_write_queue
+
+
+@pytest.fixture
+def queue_db(tmp_path):
+    path = tmp_path / "queue.db"
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _insert(conn, row_id, value="x"):
+    conn.execute("INSERT INTO t (id, value) VALUES (?, ?)", (row_id, value))
+    return row_id
+
+
+def test_queued_units_are_group_committed(queue_db):
+    write_queue = WriteQueue(queue_db)
+    release = threading.Event()
+    # Hold the writer on a first unit so the rest pile up behind it
+    blocker = write_queue.submit(lambda conn: release.wait(5))
+    futures = [write_queue.submit(_insert, i) for i in range(1, 21)]
+    release.set()
+    assert blocker.result(5) is True
+    assert [f.result(5) for f in futures] == list(range(1, 21))
+
+    stats = write_queue.stats()
+    write_queue.close()
+    assert stats["units"] == 21
+    assert stats["batches"] <= 2 and stats["max_batch"] >= 20
+    conn = sqlite3.connect(queue_db)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20
+    conn.close()
+
+
+def test_failing_unit_is_rolled_back_alone(queue_db):
+    write_queue = WriteQueue(queue_db)
+    release = threading.Event()
+    write_queue.submit(lambda conn: release.wait(5))
+    good = write_queue.submit(_insert, 1, "first")
+    duplicate = write_queue.submit(lambda conn: (_insert(conn, 2), _insert(conn, 1, "dupe")))
+    after = write_queue.submit(_insert, 3, "third")
+    release.set()
+
+    assert good.result(5) == 1 and after.result(5) == 3
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(5)
+    write_queue.close()
+
+    conn = sqlite3.connect(queue_db)
+    # Row 2 was part of the failing unit and went with it
+    assert conn.execute("SELECT id, value FROM t ORDER BY id").fetchall() == [(1, "first"), (3, "third")]
+    conn.close()
+
+
+def test_timed_out_unit_is_cancelled(queue_db):
+    write_queue = WriteQueue(queue_db, timeout=0.1)
+    release = threading.Event()
+    blocker = write_queue.submit(lambda conn: release.wait(5))
+    with pytest.raises(WriteQueueTimeout):
+        write_queue.run(_insert, 1)
+    release.set()
+    blocker.result(5)
+    write_queue.close()
+
+    # The caller got an error, so the unit must not be committed behind its back
+    conn = sqlite3.connect(queue_db)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+
+def test_writer_restarts_after_failing_to_open_database(tmp_path):
+    path = tmp_path / "missing" / "queue.db"  # parent dir does not exist yet
+    write_queue = WriteQueue(path, timeout=5)
+    with pytest.raises(sqlite3.OperationalError):
+        write_queue.submit(_insert, 1).result(2)  # fails fast instead of timing out
+    assert write_queue.stats()["failed_units"] == 1
+
+    path.parent.mkdir()
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.commit()
+    conn.close()
+    assert write_queue.run(_insert, 1) == 1  # next submit starts a new writer
+    write_queue.close()
+
+
+def test_login_returns_503_when_session_insert_times_out(make_app, db_path):
+    app = make_app(SESSION_BATCHING=True, WRITE_QUEUE_TIMEOUT=0.1)
+    credentials = {"email": "slowcommit@example.com", "password": "password123"}
+    release = threading.Event()
+    try:
+        with app.test_client() as client:
+            assert client.post("/api/register", json=credentials).status_code == 201
+            get_session_queue(app).submit(lambda conn: release.wait(5))  # stall the writer
+            res = client.post("/api/login", json=credentials)
+            assert res.status_code == 503
+            assert "token" not in res.get_json()
+    finally:
+        release.set()
+        get_session_queue(app).close()  # let the writer finish before checking
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute(
+        "SELECT COUNT(*) FROM sessions s JOIN users u ON u.id = s.user_id WHERE u.email = ?",
+        (credentials["email"],),
+    ).fetchone()[0] == 0
+    conn.close()
+
+
+def test_routes_write_through_the_queue(make_app, db_path):
+    app = make_app(WRITE_QUEUE_ENABLED=True)
+    with app.test_client() as client:
+        assert client.post("/api/register", json={"email": "queued@example.com", "password": "password123"}).status_code == 201
+        token = client.post("/api/login", json={"email": "queued@example.com", "password": "password123"}).get_json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert client.post("/api/wishlist/1", headers=headers).status_code == 201
+        assert [i["id"] for i in client.get("/api/wishlist", headers=headers).get_json()["items"]] == [1]
+        assert client.delete("/api/wishlist/1", headers=headers).status_code == 200
+        assert client.delete("/api/wishlist/1", headers=headers).status_code == 404
+
+        res = client.post("/api/products/1/reviews", json={"rating": 4}, headers=headers)
+        assert res.status_code == 201
+        review_id = res.get_json()["id"]
+
+    stats = get_write_queue(app).stats()
+    assert stats["units"] == 5  # session, wishlist add/remove/remove, review
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT rating FROM reviews WHERE id = ?", (review_id,)).fetchone() == (4,)
+    conn.close()
+
+
+def test_linger_is_bounded_by_commit_time_and_skipped_when_idle(queue_db):
+    write_queue = WriteQueue(queue_db, linger=0.01)
+    assert write_queue._linger_window() == 0.0  # no concurrent writers seen yet
+    write_queue._last_batch = 8
+    write_queue._commit_ewma = 0.002
+    assert write_queue._linger_window() == 0.002
+    write_queue._commit_ewma = 0.5
+    assert write_queue._linger_window() == 0.01
+
+
+def _staggered_batches(write_queue, units, gap):
+    """Batches used for `units` inserts submitted `gap` seconds apart, after a first natural batch."""
+    release = threading.Event()
+    write_queue.submit(lambda conn: release.wait(5))
+    # Two units pile up behind the blocker: a batch of two arms the linger
+    first = [write_queue.submit(_insert, i) for i in (1, 2)]
+    release.set()
+    [f.result(5) for f in first]
+    before = write_queue.stats()["batches"]
+
+    futures = []
+    for i in range(units):
+        futures.append(write_queue.submit(_insert, 100 + i))
+        time.sleep(gap)
+    [f.result(5) for f in futures]
+    batches = write_queue.stats()["batches"] - before
+    write_queue.close()
+    return batches
+
+
+def test_linger_collects_staggered_units_into_one_commit(queue_db, tmp_path):
+    # Without a linger each unit arriving 20 ms apart gets its own commit
+    assert _staggered_batches(WriteQueue(queue_db), units=5, gap=0.02) == 5
+
+    other_db = tmp_path / "linger.db"
+    conn = sqlite3.connect(other_db)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.close()
+    # With one, the writer waits for the later ones and commits them together
+    assert _staggered_batches(WriteQueue(other_db, linger=0.5), units=5, gap=0.02) <= 2
+
+
+def test_concurrent_logins_share_durable_session_commits(make_app):
+    app = make_app(LOGIN_RATE_PER_EMAIL=(100, 1.0), SESSION_BATCHING=True)
+    credentials = {"email": "storm@example.com", "password": "password123"}
+    tokens = []
+    with app.test_client() as client:
+        assert client.post("/api/register", json=credentials).status_code == 201
+
+    def login():
+        with app.test_client() as client:
+            res = client.post("/api/login", json=credentials)
+            assert res.status_code == 200
+            tokens.append(res.get_json()["token"])
+
+    threads = [threading.Thread(target=login) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    session_queue = get_session_queue(app)
+    assert ("synchronous", "FULL") in session_queue.pragmas
+    stats = session_queue.stats()
+    assert stats["units"] == 6 and 1 <= stats["batches"] <= 6
+    # Each token was committed before its login returned
+    with app.app_context():
+        assert all(get_current_user(token)["email"] == "storm@example.com" for token in tokens)
+    assert len(set(tokens)) == 6
@@ -0,0 +1,315 @@
+"""
+write_queue.py
+--------------
+Optional single-writer queue for small writes (WRITE_QUEUE_ENABLED = True).
+
+Instead of committing on their own pooled connections, request threads hand
+short write units -- functions called as fn(conn, *args) -- to one writer
+thread per process. The writer takes everything queued (up to
+WRITE_QUEUE_MAX_BATCH units) and runs it as one BEGIN IMMEDIATE transaction,
+each unit inside its own SAVEPOINT so a failing unit is rolled back alone.
+Callers' futures resolve only after the COMMIT. The writer uses the pool's
+pragmas (synchronous=NORMAL under WAL), so a returned result means the write
+is committed and visible, not that it survives power loss; only the session
+queue below, at synchronous=FULL, fsyncs every commit.
+
+Requests in one process then never contend with each other for the SQLite
+write lock, and N queued writes cost one commit. Writers in other processes
+still wait on busy_timeout as before. Units must not commit themselves.
+
+Login session inserts can get a queue of their own (SESSION_BATCHING = True)
+that lingers up to SESSION_BATCH_LINGER_MS after the first insert to gather
+a bigger batch, and commits with synchronous=FULL: a login storm becomes a
+few fsyncs per linger window instead of one per login, and every login still
+returns only after its session row is durable.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from flask import current_app
+
+from .db_utils import connection_pragmas, get_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_SESSION_BATCH_MAX = 256
+DEFAULT_SESSION_BATCH_LINGER_MS = 3.0
+
+_STOP = object()
+_init_lock = threading.Lock()
+
+
+class WriteQueueTimeout(sqlite3.OperationalError):
+    """
+    Raised when a unit is not committed within the timeout. A unit still
+    queued is cancelled; one its batch had already started may still commit.
+    """
+
+
+class WriteQueue:
+    """
+    One writer thread that group-commits queued write units.
+
+    With `linger` (seconds) it may wait after the first unit of a batch for
+    more to arrive, but never longer than recent commits have taken (waiting
+    longer than an fsync costs more than it saves) and not at all when the
+    previous batch had a single unit (nobody else is writing). Lingering
+    therefore only starts once concurrent submits have produced a batch of
+    two or more on their own.
+    """
+
+    def __init__(self, database, pragmas=(), max_batch=DEFAULT_MAX_BATCH, timeout=DEFAULT_TIMEOUT,
+                 linger=0.0, name="write-queue"):
+        self.database = str(database)
+        self.pragmas = tuple(pragmas)
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.linger = linger
+        self.name = name
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._closed = False
+        self._units = 0
+        self._failed_units = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._max_batch_seen = 0
+        self._commit_time = 0.0
+        self._queue_wait = 0.0
+        self._last_batch = 0
+        self._commit_ewma = self.linger
+
+    def _ensure_started(self):
+        # Caller holds self._lock
+        if self._pid != os.getpid():
+            # The writer thread does not survive a fork; start over in the child.
+            self._reset_state()
+        if self._closed:
+            raise RuntimeError("write queue is closed")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        """Queue fn(conn, *args); the future resolves once its batch has committed."""
+        future = Future()
+        with self._lock:
+            # Under the lock, so a dying writer either drains this unit or a new one is started
+            self._ensure_started()
+            self._queue.put((fn, args, future, time.perf_counter()))
+        return future
+
+    def run(self, fn, *args):
+        """Submit a unit and wait for its result (or exception)."""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()  # _run_batch skips it if it has not started yet
+            raise WriteQueueTimeout("Timed out waiting for the write queue") from None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, isolation_level=None)  # explicit BEGIN/COMMIT
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _next_batch(self):
+        """Block for one unit, then take whatever else arrives within the linger window."""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + self._linger_window()
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _linger_window(self) -> float:
+        if not self.linger or self._last_batch < 2:
+            return 0.0
+        return min(self.linger, self._commit_ewma)
+
+    def _loop(self):
+        conn = None
+        batch = []
+        try:
+            conn = self._connect()
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._run_batch(conn, batch)
+        except Exception as e:
+            # Bad path or pragma, or a broken connection: fail what is waiting
+            # and let the next submit() start a fresh writer.
+            logger.exception("%s writer thread failed", self.name)
+            self._abandon(batch, e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _abandon(self, batch, error):
+        with self._lock:
+            self._thread = None
+            pending = list(batch)
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    pending.append(item)
+            self._failed_units += len(pending)
+        for _, _, future, _ in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, conn, batch):
+        started = time.perf_counter()
+        outcomes = []  # (future, ok, result or exception)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT unit")
+                try:
+                    outcomes.append((future, True, fn(conn, *args)))
+                except Exception as e:
+                    outcomes.append((future, False, e))
+                    conn.execute("ROLLBACK TO unit")
+                conn.execute("RELEASE unit")
+            commit_started = time.perf_counter()
+            conn.execute("COMMIT")
+            commit_time = time.perf_counter() - commit_started
+        except Exception as e:
+            # BEGIN/COMMIT failed (e.g. locked by another process): nothing was applied
+            logger.warning("write queue batch of %d failed: %s", len(batch), e)
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                self._failed_batches += 1
+                self._failed_units += len(batch)
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        with self._lock:
+            self._batches += 1
+            self._units += len(outcomes)
+            self._failed_units += sum(not ok for _, ok, _ in outcomes)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_time += commit_time
+            self._queue_wait += sum(started - submitted for *_, submitted in batch)
+            self._last_batch = len(batch)
+            self._commit_ewma = 0.8 * self._commit_ewma + 0.2 * commit_time
+        for future, ok, value in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self, timeout=5.0):
+        """Finish queued units, then stop the writer thread."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "units": self._units,
+                "failed_units": self._failed_units,
+                "batches": self._batches,
+                "failed_batches": self._failed_batches,
+                "avg_batch": round(self._units / self._batches, 2) if self._batches else 0.0,
+                "max_batch": self._max_batch_seen,
+                "pending": self._queue.qsize(),
+                "commit_time_ms": round(self._commit_time * 1000, 3),
+                "avg_queue_wait_ms": round(self._queue_wait * 1000 / self._units, 3) if self._units else 0.0,
+            }
+
+
+def get_write_queue(app=None) -> WriteQueue | None:
+    """Return the app's WriteQueue, or None when WRITE_QUEUE_ENABLED is off."""
+    app = app or current_app._get_current_object()
+    if not app.config.get("WRITE_QUEUE_ENABLED"):
+        return None
+    write_queue = app.extensions.get("write_queue")
+    if write_queue is None:
+        with _init_lock:
+            write_queue = app.extensions.get("write_queue")
+            if write_queue is None:
+                write_queue = app.extensions["write_queue"] = WriteQueue(
+                    app.config["DATABASE"],
+                    pragmas=connection_pragmas(app.config),
+                    max_batch=app.config.get("WRITE_QUEUE_MAX_BATCH", DEFAULT_MAX_BATCH),
+                    timeout=app.config.get("WRITE_QUEUE_TIMEOUT", DEFAULT_TIMEOUT),
+                )
+    return write_queue
+
+
+def get_session_queue(app=None) -> WriteQueue | None:
+    """Return the app's session insert queue, or None when SESSION_BATCHING is off."""
+    app = app or current_app._get_current_object()
+    if not app.config.get("SESSION_BATCHING"):
+        return None
+    session_queue = app.extensions.get("session_queue")
+    if session_queue is None:
+        with _init_lock:
+            session_queue = app.extensions.get("session_queue")
+            if session_queue is None:
+                pragmas = dict(connection_pragmas(app.config))
+                pragmas["synchronous"] = app.config.get("SESSION_BATCH_SYNCHRONOUS", "FULL")
+                session_queue = app.extensions["session_queue"] = WriteQueue(
+                    app.config["DATABASE"],
+                    pragmas=pragmas.items(),
+                    max_batch=app.config.get("SESSION_BATCH_MAX", DEFAULT_SESSION_BATCH_MAX),
+                    timeout=app.config.get("WRITE_QUEUE_TIMEOUT", DEFAULT_TIMEOUT),
+                    linger=app.config.get("SESSION_BATCH_LINGER_MS", DEFAULT_SESSION_BATCH_LINGER_MS) / 1000,
+                    name="session-queue",
+                )
+    return session_queue
+
+
+def run_write(fn, *args):
+    """
+    Run the write unit fn(conn, *args) and commit it: through the write queue
+    when enabled, otherwise on the request's own connection.
+    """
+    write_queue = get_write_queue()
+    if write_queue is not None:
+        return write_queue.run(fn, *args)
+    conn = get_db()
+    try:
+        result = fn(conn, *args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result